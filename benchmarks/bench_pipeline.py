@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+核心流水线热点路径基准。
+
+用固定种子生成逼真的中文岗位数据 (标题、薪资字符串、相对更新时间、数 KB 的 JD、
+带维度分前缀的理由)，按 10k / 100k / 1M 行灌入本地 Postgres 的独立 schema，
+依次计时 job_filter、apply_static_filters_globally、export_top_jobs 渲染与 /api/jobs，
+记录吞吐、峰值 RSS 与 SQL 语句数，结果写入 JSON 便于跨 commit 对比。
+
+每个阶段在独立的 spawn 子进程里运行，峰值 RSS 互不干扰；
+通过 search_path 指向基准 schema，业务代码原样调用，不会碰到正式数据。
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "dashboard", "backend"))
+
+import psycopg2
+import psycopg2.extensions
+
+# /api/jobs 写死了 liepin_jobs，基准表沿用同名，靠 schema 隔离
+TABLE_NAME = "liepin_jobs"
+DEFAULT_SCHEMA = "bench_jobs"
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+STAGES = ["filter", "static", "export", "api"]
+COPY_CHUNK = 10_000
+
+TABLE_DDL = f"""
+CREATE TABLE {TABLE_NAME} (
+    id                   SERIAL PRIMARY KEY,
+    keyword              TEXT,
+    title                TEXT,
+    company              TEXT,
+    location             TEXT,
+    salary               TEXT,
+    link                 TEXT UNIQUE,
+    job_description      TEXT,
+    update_time          TEXT,
+    fetched_at           TIMESTAMP,
+    match_score          INTEGER,
+    rationale            TEXT,
+    match_score_qwen3_8b INTEGER,
+    rationale_qwen3_8b   TEXT,
+    match_score_glm5     INTEGER,
+    rationale_glm5       TEXT,
+    user_score           INTEGER,
+    user_notes           TEXT
+)
+"""
+COPY_COLUMNS = ["keyword", "title", "company", "location", "salary", "link", "job_description", "update_time",
+                "fetched_at", "match_score", "rationale", "match_score_glm5", "rationale_glm5"]
+
+# ---------------- 合成数据 ----------------
+
+KEYWORDS = ["AI算法工程师", "大模型", "数据分析", "后端开发", "产品经理"]
+TITLE_LEVELS = ["", "", "高级", "资深", "中级", "初级", "首席", "专家级"]
+TITLE_ROLES = ["算法工程师", "机器学习工程师", "大模型应用工程师", "NLP算法研究员", "推荐算法工程师",
+               "数据分析师", "数据开发工程师", "后端开发工程师", "AI产品经理", "测试开发工程师",
+               "大客户销售", "管培生", "客服专员", "AI训练师"]
+TITLE_SUFFIXES = ["", "", "", "（LLM方向）", "（实习）", "（急招）", "-多模态", "（base北京）"]
+COMPANY_CORES = ["星云", "深度", "智源", "云启", "极光", "量子", "数澜", "元象", "灵犀", "百川", "天工", "明略"]
+COMPANY_TYPES = ["科技", "智能", "数据", "网络", "信息技术", "人工智能"]
+CITIES = ["北京-朝阳区", "北京-海淀区", "北京-昌平区", "北京", "上海-浦东新区", "上海-徐汇区",
+          "深圳-南山区", "杭州-西湖区", "广州-天河区", "成都-高新区", "武汉-洪山区"]
+TECH_TERMS = ["PyTorch", "Transformer", "RAG", "向量检索", "Spark", "Flink", "Kubernetes", "vLLM",
+              "LoRA 微调", "特征工程", "A/B 实验", "知识图谱", "CUDA", "PostgreSQL", "Go", "Java"]
+DUTIES = [
+    "负责{t}相关模块的设计、开发与线上优化，保障核心链路的稳定性与性能。",
+    "参与公司大模型平台建设，基于{t}搭建训练、评估与推理一体化流程。",
+    "与产品、业务团队紧密协作，将{t}能力落地到搜索、推荐与智能客服等场景。",
+    "跟踪业界前沿进展，调研并复现{t}方向的论文，推动技术方案在业务中验证。",
+    "负责数据清洗、标注体系与质量评估，构建面向{t}的高质量训练数据集。",
+    "主导{t}服务的容量规划与成本优化，持续提升吞吐并降低延迟。",
+    "编写技术文档，沉淀{t}最佳实践，指导初级工程师完成模块开发。",
+]
+REQUIREMENTS = [
+    "计算机、数学、统计等相关专业本科及以上学历，{y}年以上相关工作经验。",
+    "熟练掌握 Python，熟悉{t}，具备扎实的数据结构与算法基础。",
+    "有大规模分布式系统或{t}项目经验者优先，能独立解决复杂工程问题。",
+    "具备良好的沟通能力与团队协作精神，对技术有热情，学习能力强。",
+    "熟悉 Linux 开发环境，了解 Docker 与{t}者优先。",
+    "有顶会论文或知名开源项目贡献者优先，熟悉{t}的原理与调优方法。",
+]
+BENEFITS = ["五险一金，补充商业医疗保险。", "弹性工作制，免费三餐与下午茶。", "年度体检，带薪年假 15 天起。",
+            "股票期权激励，年终奖 2~6 个月。", "技术氛围浓厚，定期内部分享与外部大会名额。"]
+ANALYSES = [
+    "候选人在{t}方向有完整的项目经验，与岗位核心职责高度吻合。",
+    "岗位对{t}的要求较高，候选人相关经历偏少，存在一定能力缺口。",
+    "公司处于快速扩张期，业务场景与候选人过往的行业背景契合度中等。",
+    "硬性指标方面学历与年限均满足要求，薪资区间与期望基本一致。",
+    "JD 中提到的{t}属于候选人的强项，可在面试中重点展示相关成果。",
+]
+
+class JobGenerator:
+    """固定种子下逐行产出岗位，小规模数据集恰好是大规模数据集的前缀。"""
+
+    def __init__(self, seed=42):
+        self.rng = random.Random(seed)
+        self.base_time = datetime(2026, 10, 1, 9, 0, 0)
+
+    def title(self):
+        r = self.rng
+        return f"{r.choice(TITLE_LEVELS)}{r.choice(TITLE_ROLES)}{r.choice(TITLE_SUFFIXES)}"
+
+    def company(self):
+        r = self.rng
+        return f"{r.choice(['北京', '上海', '深圳', '杭州', ''])}{r.choice(COMPANY_CORES)}{r.choice(COMPANY_TYPES)}有限公司"
+
+    def salary(self):
+        r = self.rng
+        kind = r.random()
+        if kind < 0.08:
+            return "面议"
+        lo = r.randint(5, 50)
+        hi = lo + r.randint(3, 30)
+        if kind < 0.15:
+            return f"{lo}-{hi}千"
+        if kind < 0.55:
+            return f"{lo}-{hi}k·{r.choice([13, 14, 15, 16])}薪"
+        return f"{lo}-{hi}k"
+
+    def update_time(self):
+        r = self.rng
+        kind = r.random()
+        if kind < 0.05:
+            return None
+        if kind < 0.30:
+            return r.choice(["今日在线", "刚刚活跃", "本周活跃", f"{r.randint(1, 23)}小时前在线"])
+        if kind < 0.75:
+            return f"{r.randint(1, 90)}天前在线"
+        return f"{r.randint(1, 12)}月{r.randint(1, 28)}日"
+
+    def job_description(self):
+        r = self.rng
+        kind = r.random()
+        if kind < 0.10:
+            return None
+        if kind < 0.12:
+            return "[UNAVAILABLE] 该职位已暂停招聘"
+        parts = ["岗位职责："]
+        for i in range(r.randint(5, 9)):
+            parts.append(f"{i + 1}. " + r.choice(DUTIES).format(t=r.choice(TECH_TERMS)) * r.randint(1, 3))
+        parts.append("\n任职要求：")
+        for i in range(r.randint(5, 9)):
+            parts.append(f"{i + 1}. " + r.choice(REQUIREMENTS).format(t=r.choice(TECH_TERMS), y=r.randint(1, 8)) * r.randint(1, 2))
+        parts.append("\n福利待遇：")
+        parts.extend(r.sample(BENEFITS, r.randint(2, len(BENEFITS))))
+        return "\n".join(parts)
+
+    def rationale(self):
+        r = self.rng
+        dims = [r.randint(0, 20), r.randint(0, 30), r.randint(0, 30), r.randint(0, 20)]
+        analysis = "".join(r.choice(ANALYSES).format(t=r.choice(TECH_TERMS)) for _ in range(r.randint(4, 10)))
+        reason = r.choice(ANALYSES).format(t=r.choice(TECH_TERMS))
+        full = (f"[hard_indicators: {dims[0]} | domain_relevance: {dims[1]} | technical_skills: {dims[2]} | "
+                f"project_scenario: {dims[3]}]\n思考链路: {analysis}\n总结: {reason}")
+        return sum(dims), full
+
+    def row(self, i):
+        r = self.rng
+        desc = self.job_description()
+        gemma = glm = (None, None)
+        if desc and not desc.startswith("[UNAVAILABLE"):
+            if r.random() < 0.7:
+                glm = self.rationale()
+            if r.random() < 0.4:
+                gemma = self.rationale()
+        fetched_at = self.base_time - timedelta(minutes=r.randint(0, 60 * 24 * 90))
+        return [r.choice(KEYWORDS), self.title(), self.company(), r.choice(CITIES), self.salary(),
+                f"https://www.liepin.com/job/{1_900_000_000 + i}.shtml", desc, self.update_time(),
+                fetched_at.isoformat(sep=" "), gemma[0], gemma[1], glm[0], glm[1]]
+
+def load_corpus(conn, n_rows, seed):
+    """重建基准表并用 COPY 分块灌入 n_rows 行。返回耗时与数据量。"""
+    cur = conn.cursor()
+    cur.execute(f"DROP TABLE IF EXISTS {TABLE_NAME}")
+    cur.execute(TABLE_DDL)
+    conn.commit()
+
+    gen = JobGenerator(seed)
+    started = time.perf_counter()
+    total_bytes = 0
+    for start in range(0, n_rows, COPY_CHUNK):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for i in range(start, min(start + COPY_CHUNK, n_rows)):
+            writer.writerow(gen.row(i))
+        total_bytes += buf.tell()
+        buf.seek(0)
+        cur.copy_expert(f"COPY {TABLE_NAME} ({', '.join(COPY_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buf)
+    conn.commit()
+    cur.execute(f"ANALYZE {TABLE_NAME}")
+    cur.execute(f"SELECT pg_total_relation_size('{TABLE_NAME}')")
+    table_bytes = cur.fetchone()[0]
+    conn.commit()
+    cur.close()
+    seconds = time.perf_counter() - started
+    return {"seconds": round(seconds, 3), "rows_per_sec": round(n_rows / seconds, 1),
+            "csv_mb": round(total_bytes / 1e6, 1), "table_mb": round(table_bytes / 1e6, 1)}
+
+# ---------------- 阶段 (在子进程中执行) ----------------
+
+def stage_filter():
+    from src.core import job_filter, settings
+    conn = psycopg2.connect(**settings.db_config())
+    conn.autocommit = True
+    counts = job_filter.filter_table(conn, TABLE_NAME)
+    conn.close()
+    return {"filtered": counts["filtered"], "restored": counts["restored"]}
+
+def stage_static():
+    from src.core import job_evaluator
+    conn = job_evaluator.get_db_connection()
+    updates = job_evaluator.apply_static_filters_globally(conn, table_name=TABLE_NAME)
+    conn.close()
+    return {"updated": len(updates)}
+
+def stage_export():
+    from src.core import obsidian_exporter, settings
+    with tempfile.TemporaryDirectory() as notes_dir:
+        settings.user_config().setdefault("storage", {})["notes_dir"] = notes_dir
+        obsidian_exporter.export_top_jobs(threshold=80, include_jd=True, model="glm5", table_name=TABLE_NAME)
+        output_bytes = sum(os.path.getsize(os.path.join(notes_dir, f)) for f in os.listdir(notes_dir))
+    return {"output_mb": round(output_bytes / 1e6, 2)}
+
+def stage_api():
+    from fastapi.encoders import jsonable_encoder
+    import main as backend
+    jobs = backend.get_jobs(threshold=70, model="glm5")
+    # 与 FastAPI 默认响应一致：jsonable_encoder 后再序列化
+    body = json.dumps(jsonable_encoder(jobs), ensure_ascii=False)
+    return {"jobs": len(jobs), "response_mb": round(len(body.encode("utf-8")) / 1e6, 2)}
+
+STAGE_FUNCS = {"filter": stage_filter, "static": stage_static, "export": stage_export, "api": stage_api}
+
+def install_query_counter(counter):
+    """让之后创建的所有连接 (含连接池) 使用计数游标，统计发往数据库的语句数。"""
+    class CountingCursor(psycopg2.extensions.cursor):
+        def execute(self, query, vars=None):
+            counter[0] += 1
+            return super().execute(query, vars)
+
+        def executemany(self, query, vars_list):
+            counter[0] += 1
+            return super().executemany(query, vars_list)
+
+        def copy_expert(self, sql, file, size=8192):
+            counter[0] += 1
+            return super().copy_expert(sql, file, size)
+
+    original_connect = psycopg2.connect
+
+    def counting_connect(*args, **kwargs):
+        kwargs.setdefault("cursor_factory", CountingCursor)
+        return original_connect(*args, **kwargs)
+
+    psycopg2.connect = counting_connect
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def run_stage_child(stage, result_queue):
+    counter = [0]
+    install_query_counter(counter)
+    baseline_rss = current_rss_mb()
+    try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            started = time.perf_counter()
+            extra = STAGE_FUNCS[stage]()
+            seconds = time.perf_counter() - started
+    except Exception as e:
+        result_queue.put({"error": f"{type(e).__name__}: {e}"})
+        return
+    result_queue.put({
+        "seconds": round(seconds, 3),
+        "queries": counter[0],
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "baseline_rss_mb": round(baseline_rss, 1) if baseline_rss is not None else None,
+        **extra
+    })
+
+def run_stage(stage, n_rows):
+    ctx = multiprocessing.get_context("spawn")
+    result_queue = ctx.Queue()
+    proc = ctx.Process(target=run_stage_child, args=(stage, result_queue))
+    proc.start()
+    while True:
+        try:
+            result = result_queue.get(timeout=1)
+            break
+        except queue.Empty:
+            if not proc.is_alive():
+                result = {"error": f"子进程异常退出 (exit code {proc.exitcode})"}
+                break
+    proc.join()
+    if "seconds" in result:
+        result["rows_per_sec"] = round(n_rows / result["seconds"], 1) if result["seconds"] else None
+    return result
+
+# ---------------- 报告与对比 ----------------
+
+def environment_info(conn):
+    def git(*cmd):
+        try:
+            return subprocess.check_output(["git", *cmd], cwd=ROOT, text=True, stderr=subprocess.DEVNULL).strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    cur = conn.cursor()
+    cur.execute("SHOW server_version")
+    server_version = cur.fetchone()[0]
+    cur.close()
+    return {
+        "commit": git("rev-parse", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "postgres": server_version,
+    }
+
+def print_result(n_rows, stage, result):
+    if "error" in result:
+        print(f"  {stage:<8} 失败: {result['error']}")
+        return
+    extra = {k: v for k, v in result.items()
+             if k not in ("seconds", "queries", "peak_rss_mb", "baseline_rss_mb", "rows_per_sec")}
+    print(f"  {stage:<8} {result['seconds']:>9.2f}s | {result['rows_per_sec'] or 0:>10.0f} 行/s | "
+          f"峰值 RSS {result['peak_rss_mb']:>7.1f} MB | SQL {result['queries']:>8} 条 | {extra}")
+
+def compare(base_path, current):
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    print(f"\n================= 对比 {base['meta'].get('commit', '?')[:10]} -> {current['meta'].get('commit', '?')[:10]} ==================")
+    for size, stages in current["results"].items():
+        base_stages = base["results"].get(size)
+        if not base_stages:
+            continue
+        for stage, result in stages.items():
+            old = base_stages.get(stage)
+            if not old or "seconds" not in old or "seconds" not in result:
+                continue
+            ratio = result["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+            flag = "⚠️ " if ratio > 1.10 else ("✅" if ratio < 0.90 else "  ")
+            print(f"{flag} {size:>8} 行 {stage:<8} {old['seconds']:>9.2f}s -> {result['seconds']:>9.2f}s ({ratio:.2f}x) | "
+                  f"RSS {old.get('peak_rss_mb')} -> {result.get('peak_rss_mb')} MB | "
+                  f"SQL {old.get('queries')} -> {result.get('queries')}")
+    print("==============================================================\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the core pipeline hot paths on a synthetic corpus")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="Corpus sizes to load (rows)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to time, in pipeline order")
+    parser.add_argument("--seed", type=int, default=42, help="Generator seed; keep it fixed when comparing commits")
+    parser.add_argument("--schema", type=str, default=DEFAULT_SCHEMA, help="Scratch schema holding the benchmark table")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema after the run")
+    parser.add_argument("--output", type=str, default=None, help="Result JSON path (default: benchmarks/results/bench_<commit>.json)")
+    parser.add_argument("--compare", type=str, default=None, metavar="BASE.json", help="Print per-stage deltas against an earlier result file")
+    args = parser.parse_args()
+
+    # 所有连接 (含子进程与连接池) 都只看得到基准 schema
+    os.environ["PGOPTIONS"] = f"-c search_path={args.schema}"
+    from src.core import settings
+
+    admin = psycopg2.connect(**settings.db_config())
+    cur = admin.cursor()
+    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {args.schema}")
+    admin.commit()
+    cur.close()
+
+    report = {"meta": {**environment_info(admin), "seed": args.seed, "stages": args.stages}, "results": {}}
+    try:
+        for n_rows in args.sizes:
+            print(f"\n[{n_rows} 行] 生成并灌入合成数据...")
+            load = load_corpus(admin, n_rows, args.seed)
+            print(f"  {'load':<8} {load['seconds']:>9.2f}s | {load['rows_per_sec']:>10.0f} 行/s | "
+                  f"CSV {load['csv_mb']} MB -> 表 {load['table_mb']} MB")
+            results = {"load": load}
+            for stage in args.stages:
+                results[stage] = run_stage(stage, n_rows)
+                print_result(n_rows, stage, results[stage])
+            report["results"][str(n_rows)] = results
+    finally:
+        if not args.keep:
+            cur = admin.cursor()
+            cur.execute(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE")
+            admin.commit()
+            cur.close()
+        admin.close()
+
+    output = args.output or os.path.join(ROOT, "benchmarks", "results",
+                                         f"bench_{(report['meta']['commit'] or 'unknown')[:10]}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 基准结果已写入 {output}")
+
+    if args.compare:
+        compare(args.compare, report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+评估器压测驱动。
+
+启动 (或连接) 模拟 LLM 服务，用 bench_pipeline 的合成岗位在不同并发下调用
+job_evaluator.evaluate_job()，走与正式评估相同的 prompt 构建、结构化输出、重试、
+AIMD 限流与熔断逻辑，报告每档并发的 jobs/min、单岗位延迟分位数与重试情况。
+不连接数据库，也不写入分数。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from bench_pipeline import JobGenerator
+# 导入 src.core 不读取环境变量与配置，模型配置在压测端点覆盖之后才取用
+from src.core.job_evaluator import STRUCTURED_MODES
+
+ENV_PREFIXES = {"gemma3": "GEMMA", "qwen3_8b": "QWEN", "glm5": "GLM"}
+
+SYNTHETIC_PROFILE = (
+    "姓名：张三\n求职意向：大模型应用 / 算法工程师，base 北京，期望 40-60k。\n"
+    "工作经历：5 年机器学习经验，负责过推荐系统召回与排序、RAG 问答平台与 vLLM 推理服务优化。\n"
+    "技能：Python、PyTorch、Transformer、LoRA 微调、向量检索、Spark、Kubernetes、PostgreSQL。\n"
+) * 8
+
+def wait_for_server(base_url, timeout=15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/models", timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def server_stats(base_url):
+    try:
+        with urllib.request.urlopen(base_url.rsplit("/v1", 1)[0] + "/stats", timeout=2) as resp:
+            return json.loads(resp.read())
+    except OSError:
+        return {}
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run_level(job_evaluator, config, jobs, concurrency, base_url):
+    client = job_evaluator.make_llm_client(config, max_concurrency=concurrency)
+    stats = job_evaluator.new_run_stats()
+    before = server_stats(base_url)
+
+    def evaluate_one(job):
+        started = time.monotonic()
+        score, reason = job_evaluator.evaluate_job(client, config["model_name"], SYNTHETIC_PROFILE,
+                                                   job["title"], job["company"], job["salary"], job["desc"], stats=stats)
+        return score is not None and reason is not None, time.monotonic() - started
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(evaluate_one, jobs))
+    wall = time.monotonic() - started
+    after = server_stats(base_url)
+
+    latencies = [lat for ok, lat in outcomes if ok]
+    ok = len(latencies)
+    return {
+        "concurrency": concurrency,
+        "jobs": len(jobs),
+        "ok": ok,
+        "failed": len(jobs) - ok,
+        "wall_seconds": round(wall, 2),
+        "jobs_per_min": round(ok / wall * 60, 1) if wall else None,
+        "p50_job_seconds": round(percentile(latencies, 50), 2) if latencies else None,
+        "p95_job_seconds": round(percentile(latencies, 95), 2) if latencies else None,
+        "retries": stats["structured_retries"] + stats["fallback_retries"],
+        "llm_calls": stats["calls"],
+        "final_limit": int(client.limiter.limit),
+        "server_429": after.get("rejected_429", 0) - before.get("rejected_429", 0),
+        "server_500": after.get("errors_500", 0) - before.get("errors_500", 0),
+        "server_malformed": after.get("malformed", 0) - before.get("malformed", 0),
+        "client": client.report(),
+    }
+
+def mock_model_name(server_args):
+    """模拟服务在 /v1/models 列出的第一个模型 id (--models，默认 mock-llm)。"""
+    if "--models" in server_args:
+        idx = server_args.index("--models") + 1
+        if idx < len(server_args) and not server_args[idx].startswith("--"):
+            return server_args[idx]
+    return "mock-llm"
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test evaluate_job() against the mock LLM server")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="Concurrency levels to sweep")
+    parser.add_argument("--jobs", type=int, default=200, help="Synthetic jobs per level")
+    parser.add_argument("--model", type=str, choices=list(ENV_PREFIXES), default="glm5", help="Model config whose client/prompt settings are used")
+    parser.add_argument("--structured", type=str, default=None, choices=STRUCTURED_MODES, help="Override the structured-output mode (e.g. off to exercise JSON retries)")
+    parser.add_argument("--base-url", type=str, default=None, help="Use an already running server instead of starting the mock")
+    parser.add_argument("--output", type=str, default=None, help="Write the per-level results to this JSON file")
+    args, server_args = parser.parse_known_args()
+
+    base_url = args.base_url
+    server = None
+    if base_url is None:
+        # 未识别的参数 (--latency-ms、--max-concurrency 等) 原样转交给模拟服务
+        port = 8100
+        if "--port" in server_args:
+            port = int(server_args[server_args.index("--port") + 1])
+        else:
+            server_args += ["--port", str(port)]
+        base_url = f"http://127.0.0.1:{port}/v1"
+        server = subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, "mock_llm_server.py"), *server_args])
+        if not wait_for_server(base_url):
+            server.terminate()
+            print("模拟 LLM 服务启动失败。")
+            return
+    elif server_args:
+        parser.error(f"unrecognized arguments: {' '.join(server_args)}")
+
+    # 让所选模型指向压测端点，其它配置 (tokenizer、上下文、结构化模式) 沿用 .env；
+    # 先加载 .env 再覆盖，模型配置在第一次取用时才读取环境变量。
+    # 自带模拟服务时端点、密钥与模型名全部换成模拟值，真实密钥与模型名不会出现在请求里；
+    # --base-url 指定的服务只替换端点，密钥与模型名缺省时才用模拟值
+    from src.core import job_evaluator, settings
+    settings.load_env()
+    prefix = ENV_PREFIXES[args.model]
+    mock_values = {"API_KEY": "mock", "MODEL_NAME": mock_model_name(server_args)}
+    os.environ[f"{prefix}_API_BASE"] = base_url
+    for key, value in mock_values.items():
+        if server is not None:
+            os.environ[f"{prefix}_{key}"] = value
+        else:
+            os.environ.setdefault(f"{prefix}_{key}", value)
+    os.environ.pop(f"{prefix}_HEDGE_API_BASE", None)
+    job_evaluator.STRUCTURED_OVERRIDE = args.structured
+    config = job_evaluator.MODEL_CONFIGS[args.model]
+
+    gen = JobGenerator(seed=7)
+    jobs = []
+    while len(jobs) < args.jobs:
+        row = gen.row(len(jobs))
+        if row[6] and not row[6].startswith("[UNAVAILABLE"):
+            jobs.append({"title": row[1], "company": row[2], "salary": row[4], "desc": row[6]})
+
+    results = []
+    try:
+        print(f"\n================= 压测 {base_url} ({args.model}, {args.jobs} 岗位/档) ==================")
+        for concurrency in args.concurrency:
+            result = run_level(job_evaluator, config, jobs, concurrency, base_url)
+            results.append(result)
+            print(f"并发 {concurrency:>3}: {result['jobs_per_min']:>8} 岗位/分钟 | 成功 {result['ok']}/{result['jobs']} | "
+                  f"p50 {result['p50_job_seconds']}s p95 {result['p95_job_seconds']}s | 重试 {result['retries']} | "
+                  f"429 {result['server_429']} 500 {result['server_500']} 坏JSON {result['server_malformed']}")
+            print(f"         {result['client']}")
+        print("=========================================================================\n")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"model": args.model, "base_url": base_url, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"✅ 压测结果已写入 {args.output}")
+
+if __name__ == "__main__":
+    main()
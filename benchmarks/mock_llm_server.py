@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+本地 OpenAI 兼容的模拟 LLM 服务，用于在不占用 GPU 服务器的情况下压测评估器与简历定制。
+
+- 延迟 = 对数正态分布的首 token 时间 + completion_tokens / tokens_per_sec
+- 超过并发上限直接返回 429，按比例注入 500 错误
+- 未请求结构化输出时按比例返回损坏的 JSON，用于触发评估器的重试路径
+- 分数由 prompt 的哈希决定，同一岗位每次得到相同结果
+- 同一 system 消息再次出现时回报 cached_tokens，模拟前缀缓存
+"""
+import argparse
+import asyncio
+import collections
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from src.core.prompt_builder import TokenCounter
+
+STRUCTURED_MODES = ["json_schema", "json_object", "guided_json"]
+PREFIX_CACHE_SIZE = 64
+CACHE_BLOCK_TOKENS = 16
+
+DIMENSIONS = [("hard_indicators", 20), ("domain_relevance", 30), ("technical_skills", 30), ("project_scenario", 20)]
+
+class MockState:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.counter = TokenCounter()
+        self.inflight = 0
+        self.prefix_cache = collections.OrderedDict()
+        self.stats = collections.Counter()
+
+    def latency(self, completion_tokens):
+        ttft = self.args.latency_ms / 1000 * math.exp(self.rng.gauss(0, self.args.latency_sigma))
+        return ttft + completion_tokens / self.args.tokens_per_sec
+
+    def cached_tokens(self, system_text):
+        """同一 system 前缀再次出现时，按 KV block 粒度回报命中的 token 数。"""
+        if not system_text:
+            return 0
+        key = hashlib.sha1(system_text.encode("utf-8")).hexdigest()
+        hit = key in self.prefix_cache
+        self.prefix_cache[key] = True
+        self.prefix_cache.move_to_end(key)
+        while len(self.prefix_cache) > PREFIX_CACHE_SIZE:
+            self.prefix_cache.popitem(last=False)
+        if not hit:
+            return 0
+        return self.counter.count(system_text) // CACHE_BLOCK_TOKENS * CACHE_BLOCK_TOKENS
+
+def requested_structured_mode(body):
+    if body.get("guided_json") is not None:
+        return "guided_json"
+    fmt = (body.get("response_format") or {}).get("type")
+    if fmt in ("json_schema", "json_object"):
+        return fmt
+    return None
+
+def deterministic_evaluation(user_text):
+    """由 prompt 哈希得到稳定的维度分与总分。"""
+    digest = hashlib.sha256(user_text.encode("utf-8")).digest()
+    dims = {name: digest[i] % (cap + 1) for i, (name, cap) in enumerate(DIMENSIONS)}
+    score = sum(dims.values())
+    return {
+        "score": score,
+        "analysis": f"模拟评估：该岗位与候选人画像的匹配度为 {score} 分，各维度得分由 prompt 哈希确定。",
+        "reason": "模拟服务返回的确定性结果，仅用于压测。",
+        "dimension_scores": dims
+    }
+
+def malformed(content):
+    """模拟小模型常见的坏输出：前后缀废话、截断或未加引号的键。"""
+    kind = int(hashlib.md5(content.encode("utf-8")).hexdigest(), 16) % 3
+    if kind == 0:
+        return "好的，下面是评估结果：\n" + content[:len(content) // 2]
+    if kind == 1:
+        return content.replace('"score"', "score").replace('"reason"', "reason")
+    return "```json\n" + content.rstrip("}") + "\n```"
+
+def error_response(status, message, err_type):
+    return JSONResponse(status_code=status, content={"error": {"message": message, "type": err_type, "code": status}})
+
+def create_app(args):
+    app = FastAPI(title="Mock OpenAI-compatible LLM")
+    state = MockState(args)
+    supported = set(args.structured_support)
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": name, "object": "model", "owned_by": "mock"} for name in args.models]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return {**state.stats, "inflight": state.inflight}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        state.stats["requests"] += 1
+
+        if state.inflight >= args.max_concurrency:
+            state.stats["rejected_429"] += 1
+            return error_response(429, "Too many concurrent requests", "rate_limit_error")
+
+        mode = requested_structured_mode(body)
+        if mode is not None and mode not in supported:
+            state.stats["rejected_400"] += 1
+            return error_response(400, f"{mode} is not supported by this server", "invalid_request_error")
+
+        messages = body.get("messages") or []
+        system_text = "".join(m.get("content") or "" for m in messages if m.get("role") == "system")
+        user_text = "".join(m.get("content") or "" for m in messages if m.get("role") != "system")
+
+        if "JSON" in system_text or mode is not None:
+            content = json.dumps(deterministic_evaluation(user_text), ensure_ascii=False)
+            # 请求了结构化输出时服务端保证 JSON 合法，不注入坏输出
+            if mode is None and state.rng.random() < args.malformed_rate:
+                content = malformed(content)
+                state.stats["malformed"] += 1
+        else:
+            # 简历定制等自由文本请求：返回固定长度的 Markdown
+            content = "# 定制简历 (模拟)\n\n" + "- 与岗位要求对齐的项目经历要点。\n" * args.markdown_lines
+
+        prompt_tokens = state.counter.count(system_text) + state.counter.count(user_text)
+        completion_tokens = state.counter.count(content)
+        max_tokens = body.get("max_tokens")
+        if max_tokens and completion_tokens > max_tokens:
+            completion_tokens = max_tokens
+
+        state.inflight += 1
+        state.stats["max_inflight"] = max(state.stats["max_inflight"], state.inflight)
+        try:
+            await asyncio.sleep(state.latency(completion_tokens))
+            if state.rng.random() < args.error_rate:
+                state.stats["errors_500"] += 1
+                return error_response(500, "Injected server error", "server_error")
+        finally:
+            state.inflight -= 1
+
+        state.stats["completed"] += 1
+        return {
+            "id": f"chatcmpl-mock-{state.stats['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model") or args.models[0],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+                "prompt_tokens_details": {"cached_tokens": state.cached_tokens(system_text)}
+            }
+        }
+
+    return app
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible mock LLM server for load testing")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--models", nargs="+", default=["mock-llm"], help="Model ids listed by /v1/models (any model name is accepted)")
+    parser.add_argument("--latency-ms", type=float, default=800, help="Median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="Log-normal spread of time to first token (0 = fixed)")
+    parser.add_argument("--tokens-per-sec", type=float, default=40, help="Decode speed per request")
+    parser.add_argument("--max-concurrency", type=int, default=8, help="In-flight requests above this get HTTP 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with HTTP 500")
+    parser.add_argument("--malformed-rate", type=float, default=0.05, help="Fraction of unconstrained JSON replies that are broken")
+    parser.add_argument("--structured-support", nargs="*", choices=STRUCTURED_MODES, default=STRUCTURED_MODES,
+                        help="Structured-output modes accepted; others get HTTP 400 (exercises the auto downgrade)")
+    parser.add_argument("--markdown-lines", type=int, default=40, help="Length of free-text (resume tailor) replies")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser
+
+def main():
+    args = build_parser().parse_args()
+    print(f"模拟 LLM 服务: http://{args.host}:{args.port}/v1 | 延迟中位 {args.latency_ms}ms | "
+          f"{args.tokens_per_sec} tokens/s | 并发上限 {args.max_concurrency} | "
+          f"错误率 {args.error_rate} | 坏 JSON 率 {args.malformed_rate}")
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
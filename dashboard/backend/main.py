@@ -1,53 +1,43 @@
+import csv
+import io
 import os
+import sys
+import threading
+import uuid
+from contextlib import asynccontextmanager
 import psycopg2
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from datetime import datetime
-try:
-    from dotenv import load_dotenv
-    # Load .env if it exists
-    load_dotenv()
-except ImportError:
-    pass
-
-app = FastAPI(title="Job Dashboard API")
-
-# Helper for strict env loading
-def get_env_strict(key):
-    val = os.getenv(key)
-    if val is None:
-        raise EnvironmentError(f"Missing required environment variable: {key}")
-    return val
-
-# DB Config from environment variables (Strict)
-DB_CONFIG = {
-    "dbname": get_env_strict("DB_NAME"),
-    "user": get_env_strict("DB_USER"),
-    "password": os.getenv("DB_PASSWORD", ""),
-    "host": get_env_strict("DB_HOST"),
-    "port": int(get_env_strict("DB_PORT"))
-}
-
-# Connection pooling
-try:
-    from psycopg2 import pool
-    db_pool = pool.SimpleConnectionPool(1, 10, **DB_CONFIG)
-except Exception as e:
-    print(f"Error initializing connection pool: {e}")
-    db_pool = None
 
+# Run in-process against the core library (filter rules, categorization, stats) from the repo root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from src.core import job_stats, obsidian_exporter, settings
+
+def prepare_ingest_schema():
+    for table_name in DATASET_TABLES.values():
+        try:
+            ensure_ingest_schema(table_name)
+        except Exception as e:
+            print(f"⚠️  {table_name} ingest schema not ready, will retry on first ingest: {e}")
+
+@asynccontextmanager
+async def lifespan(app):
+    # Ingest DDL is committed once here instead of inside a request transaction
+    await run_in_threadpool(prepare_ingest_schema)
+    yield
+
+app = FastAPI(title="Job Dashboard API", lifespan=lifespan)
+
+# Env (.env), config.json and the connection pool are loaded lazily by src.core.settings on first use
 def get_db_connection():
-    if db_pool:
-        return db_pool.getconn()
-    return psycopg2.connect(**DB_CONFIG)
+    return settings.get_pool().getconn()
 
 def release_db_connection(conn):
-    if db_pool:
-        db_pool.putconn(conn)
-    else:
-        conn.close()
+    settings.get_pool().putconn(conn)
 
 app.add_middleware(
     CORSMiddleware,
@@ -65,10 +55,8 @@ import json
 @app.get("/api/config")
 def get_config():
     try:
-        config_path = os.path.join(os.path.dirname(__file__), "..", "..", "config.json")
-        with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
-        return config.get("ui", {})
+        # Cached; re-read when config.json changes on disk
+        return settings.user_config().get("ui", {})
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -90,11 +78,14 @@ def get_jobs(threshold: int = 70, model: str = "glm5"):
             FROM liepin_jobs
             WHERE {score_col} >= %s
               AND job_description NOT LIKE '[UNAVAILABLE%%'
+              AND {settings.own_score_sql(settings.MODEL_COLUMNS["glm5"])}
             ORDER BY {score_col} DESC, update_time DESC NULLS LAST
         """, (threshold,))
         
         jobs = []
         rows = cur.fetchall()
+        # Same cluster/activity rules as the Obsidian export
+        rules = obsidian_exporter.categorization_rules()
         for row in rows:
             jobs.append({
                 "id": row[0],
@@ -108,7 +99,9 @@ def get_jobs(threshold: int = 70, model: str = "glm5"):
                 "update_time": row[8],
                 "jd": row[9],
                 "user_score": row[10],
-                "user_notes": row[11]
+                "user_notes": row[11],
+                "cluster": obsidian_exporter.smart_categorize(row[1], row[9], rules=rules),
+                "tier": obsidian_exporter.categorize_activity(row[8])
             })
             
         cur.close()
@@ -139,8 +132,217 @@ def update_feedback(job_id: int, feedback: JobFeedback):
         if conn:
             release_db_connection(conn)
 
+DATASET_TABLES = {"liepin": "liepin_jobs", "boss": "boss_jobs"}
+
+@app.get("/api/stats")
+def get_stats(dataset: str = "liepin"):
+    """
+    Precomputed rollups from the job_stats table (refreshed by the filter/evaluator runs
+    or `python -m src.core.job_stats`): {metric: {bucket: count}}.
+    """
+    table_name = DATASET_TABLES.get(dataset)
+    if table_name is None:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset: {dataset}")
+    conn = None
+    try:
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass(%s)", (job_stats.STATS_TABLE,))
+        exists = cur.fetchone()[0] is not None
+        cur.close()
+        if not exists:
+            return {"dataset": dataset, "refreshed_at": None, "stats": {}}
+        stats, refreshed_at = job_stats.load_stats(conn, table_name)
+        return {"dataset": dataset, "refreshed_at": refreshed_at, "stats": stats}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            release_db_connection(conn)
+
+# ---------------- Bulk ingest ----------------
+
+STAGING_TABLE = "ingest_staging"
+# Fields a list record (keyword/title/salary/...) or a detail record (job_description/update_time) may carry
+INGEST_FIELDS = ["link", "keyword", "title", "company", "location", "salary", "job_description", "update_time", "fetched_at"]
+# Columns whose change counts as an update; fetched_at/keyword alone only touch the row
+CONTENT_FIELDS = ["title", "company", "location", "salary", "job_description", "update_time"]
+
+def salary_bound_sql(col, upper):
+    """Monthly salary bound in k from "20-40k·14薪", "8-12千" or "1.5-2万"."""
+    num = r"\d+(?:\.\d+)?"
+    k_pattern = r"\d+-(\d+)\s*[k千]" if upper else r"(\d+)-\d+\s*[k千]"
+    wan_pattern = rf"{num}-({num})\s*万" if upper else rf"({num})-{num}\s*万"
+    return f"""CASE
+        WHEN lower({col}) ~ '{k_pattern}' THEN substring(lower({col}) from '{k_pattern}')::int
+        WHEN {col} ~ '{wan_pattern}' THEN round(substring({col} from '{wan_pattern}')::numeric * 10)::int
+        END"""
+
+_ingest_ready = set()
+_ingest_lock = threading.Lock()
+
+def ensure_ingest_schema(table_name):
+    """
+    Creates the staging table and derived columns in its own committed transaction.
+    ALTER TABLE takes an exclusive lock even when the column exists, so this runs once per process
+    (at startup, or on the first ingest if the database was down then).
+    """
+    if table_name in _ingest_ready:
+        return
+    with _ingest_lock:
+        if table_name in _ingest_ready:
+            return
+        conn = get_db_connection()
+        try:
+            cur = conn.cursor()
+            cur.execute(f"""
+                CREATE UNLOGGED TABLE IF NOT EXISTS {STAGING_TABLE} (
+                    batch_id        TEXT NOT NULL,
+                    seq             BIGSERIAL,
+                    link            TEXT NOT NULL,
+                    keyword         TEXT,
+                    title           TEXT,
+                    company         TEXT,
+                    location        TEXT,
+                    salary          TEXT,
+                    job_description TEXT,
+                    update_time     TEXT,
+                    fetched_at      TIMESTAMP
+                )
+            """)
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {STAGING_TABLE}_batch_idx ON {STAGING_TABLE} (batch_id)")
+            for col, col_type in [("salary_min_k", "INTEGER"), ("salary_max_k", "INTEGER"), ("activity_tier", "TEXT"), ("content_hash", "TEXT")]:
+                cur.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {col} {col_type}")
+            conn.commit()
+            cur.close()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            release_db_connection(conn)
+        # Only remember the table once the DDL is committed, so a failure is retried on the next ingest
+        _ingest_ready.add(table_name)
+
+def parse_ndjson(body, batch_id):
+    """Returns CSV text for COPY and the record count; raises HTTPException on bad lines."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    count = 0
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="body must be UTF-8 NDJSON")
+    for line_no, line in enumerate(text.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"line {line_no}: invalid JSON ({e.msg})")
+        if not isinstance(record, dict) or not record.get("link"):
+            raise HTTPException(status_code=400, detail=f"line {line_no}: record must be an object with a link")
+        unknown = set(record) - set(INGEST_FIELDS)
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"line {line_no}: unknown fields {sorted(unknown)}")
+        # An empty CSV field is NULL for COPY, so missing fields leave the stored value alone
+        writer.writerow([batch_id] + [record.get(f) if record.get(f) is not None else "" for f in INGEST_FIELDS])
+        count += 1
+    buf.seek(0)
+    return buf, count
+
+def merge_batch(table_name, batch_id, buf):
+    merged = {f: f"COALESCE(s.{f}, t.{f})" for f in INGEST_FIELDS if f != "link"}
+    merged["fetched_at"] = "COALESCE(s.fetched_at, now())"
+    content_hash = "md5(concat_ws(chr(31), " + ", ".join(f"coalesce({merged[f]}, '')" for f in CONTENT_FIELDS) + "))"
+    insert_cols = INGEST_FIELDS + ["salary_min_k", "salary_max_k", "activity_tier", "content_hash"]
+    updates = ", ".join(f"{c} = EXCLUDED.{c}" for c in insert_cols if c != "link")
+    staged_fields = [f"(array_agg({f} ORDER BY seq DESC) FILTER (WHERE {f} IS NOT NULL))[1] AS {f}"
+                     for f in INGEST_FIELDS if f != "link"]
+
+    conn = None
+    try:
+        ensure_ingest_schema(table_name)
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.copy_expert(f"COPY {STAGING_TABLE} (batch_id, {', '.join(INGEST_FIELDS)}) FROM STDIN WITH (FORMAT csv)", buf)
+        cur.execute(f"""
+            WITH staged AS (
+                -- one row per link: each field takes the last non-NULL value in the batch
+                -- (seq follows line order within a COPY), so a later partial record keeps earlier fields
+                SELECT link,
+                       {", ".join(staged_fields)}
+                FROM {STAGING_TABLE}
+                WHERE batch_id = %(batch_id)s
+                GROUP BY link
+            ), src AS (
+                SELECT s.link,
+                       {", ".join(f"{expr} AS {f}" for f, expr in merged.items())},
+                       {content_hash} AS content_hash,
+                       t.content_hash AS old_hash,
+                       t.link IS NOT NULL AS existing
+                FROM staged s
+                LEFT JOIN {table_name} t ON t.link = s.link
+            ), upserted AS (
+                INSERT INTO {table_name} ({", ".join(insert_cols)})
+                SELECT link, {", ".join(f for f in INGEST_FIELDS if f != "link")},
+                       {salary_bound_sql("salary", upper=False)},
+                       {salary_bound_sql("salary", upper=True)},
+                       {job_stats.ACTIVITY_SQL},
+                       content_hash
+                FROM src
+                WHERE NOT existing OR old_hash IS DISTINCT FROM content_hash
+                ON CONFLICT (link) DO UPDATE SET {updates}
+                RETURNING (xmax = 0) AS inserted
+            ), touched AS (
+                -- unchanged content: only record that the job was seen again
+                UPDATE {table_name} t SET fetched_at = src.fetched_at, keyword = src.keyword
+                FROM src
+                WHERE t.link = src.link AND src.existing AND src.old_hash = src.content_hash
+                RETURNING 1
+            )
+            SELECT (SELECT count(*) FROM upserted WHERE inserted),
+                   (SELECT count(*) FROM upserted WHERE NOT inserted),
+                   (SELECT count(*) FROM touched),
+                   (SELECT count(*) FROM {STAGING_TABLE} WHERE batch_id = %(batch_id)s)
+        """, {"batch_id": batch_id})
+        inserted, updated, unchanged, staged = cur.fetchone()
+        cur.execute(f"DELETE FROM {STAGING_TABLE} WHERE batch_id = %s", (batch_id,))
+        conn.commit()
+        cur.close()
+        return {"inserted": inserted, "updated": updated, "unchanged": unchanged,
+                "duplicates": staged - inserted - updated - unchanged}
+    except psycopg2.DataError as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
+    except Exception as e:
+        if conn:
+            conn.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            release_db_connection(conn)
+
+@app.post("/api/ingest/{dataset}")
+async def ingest_jobs(dataset: str, request: Request):
+    """
+    Bulk upsert of list or detail records, one JSON object per line (NDJSON).
+    Records are COPYed into an unlogged staging table and merged into *_jobs in one statement.
+    """
+    table_name = DATASET_TABLES.get(dataset)
+    if table_name is None:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset: {dataset}")
+    batch_id = uuid.uuid4().hex
+    buf, received = parse_ndjson(await request.body(), batch_id)
+    if received == 0:
+        return {"batch_id": batch_id, "received": 0, "inserted": 0, "updated": 0, "unchanged": 0, "duplicates": 0}
+    counts = await run_in_threadpool(merge_batch, table_name, batch_id, buf)
+    return {"batch_id": batch_id, "received": received, **counts}
+
 if __name__ == "__main__":
     import uvicorn
-    host = os.getenv("BACKEND_HOST", "0.0.0.0")
-    port = int(os.getenv("BACKEND_PORT", 8888))
+    host = settings.get_env("BACKEND_HOST", "0.0.0.0")
+    port = int(settings.get_env("BACKEND_PORT", 8888))
     uvicorn.run(app, host=host, port=port)
@@ -217,8 +217,9 @@ function App() {
   const processedJobs = useMemo(() => {
     return jobs.map(job => ({
       ...job,
-      _cluster: smartCategorize(job.title, job.jd),
-      _tier: categorizeActivity(job.update_time),
+      // The backend categorizes with the exporter's rules; fall back for data without those fields
+      _cluster: job.cluster ?? smartCategorize(job.title, job.jd),
+      _tier: job.tier ?? categorizeActivity(job.update_time),
       _isRated: (job.user_score || 0) > 0
     }));
   }, [jobs, smartCategorize, categorizeActivity]);
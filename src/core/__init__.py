@@ -0,0 +1,7 @@
+"""
+求职流水线的 Python 核心库。
+
+导入任何子模块都不会读取 config.json、校验环境变量或连接数据库 (见 settings)，
+仪表盘后端与守护进程可以直接在进程内调用过滤、聚类与评分逻辑。
+各 CLI 从仓库根目录以 `python -m src.core.<module>` 运行。
+"""
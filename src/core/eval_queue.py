@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+多机评估的租约队列。
+
+每个 worker 用 `FOR UPDATE SKIP LOCKED` 批量认领待评估岗位，并在
+job_eval_leases 中登记带过期时间的租约：评估期间心跳续约，失败即释放，
+worker 崩溃后租约自然过期，其它节点会重新认领，保证同一岗位不会被重复调用 LLM。
+"""
+import threading
+
+import psycopg2
+
+LEASE_TABLE = "job_eval_leases"
+
+def ensure_lease_table(conn):
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {LEASE_TABLE} (
+            table_name   TEXT        NOT NULL,
+            job_id       INTEGER     NOT NULL,
+            model        TEXT        NOT NULL,
+            worker_id    TEXT        NOT NULL,
+            leased_until TIMESTAMPTZ NOT NULL,
+            attempts     INTEGER     NOT NULL DEFAULT 1,
+            PRIMARY KEY (table_name, job_id, model)
+        )
+    """)
+    conn.commit()
+    cur.close()
+
+class LeaseQueue:
+    def __init__(self, conn, db_config, table_name, model_key, score_col, worker_id,
+                 lease_ttl=300, max_attempts=3, extra_where="", order_by="j.fetched_at DESC",
+                 extra_params=None):
+        self.conn = conn
+        self.db_config = db_config
+        self.table_name = table_name
+        self.model_key = model_key
+        self.score_col = score_col
+        self.worker_id = worker_id
+        self.lease_ttl = lease_ttl
+        self.max_attempts = max_attempts
+        # 认领顺序与附加过滤 (如相关度排序/剪枝)，extra_where 使用 %(name)s 命名占位符
+        self.extra_where = extra_where
+        self.order_by = order_by
+        self.extra_params = extra_params or {}
+
+        self._stop = threading.Event()
+        self._heartbeat = None
+
+    def claim(self, batch_size):
+        """
+        认领一批岗位，返回 [(id, title, company, salary, job_description), ...]。
+        已有未过期租约、或失败次数达到上限的岗位会被跳过。
+        """
+        cur = self.conn.cursor()
+        try:
+            cur.execute(f"""
+                WITH candidates AS (
+                    SELECT j.id
+                    FROM {self.table_name} j
+                    WHERE j.job_description IS NOT NULL AND j.{self.score_col} IS NULL
+                      AND NOT EXISTS (
+                          SELECT 1 FROM {LEASE_TABLE} l
+                          WHERE l.table_name = %(table)s AND l.model = %(model)s AND l.job_id = j.id
+                            AND (l.leased_until > now() OR l.attempts >= %(max_attempts)s)
+                      )
+                      {self.extra_where}
+                    ORDER BY {self.order_by}
+                    LIMIT %(limit)s
+                    FOR UPDATE OF j SKIP LOCKED
+                )
+                INSERT INTO {LEASE_TABLE} (table_name, job_id, model, worker_id, leased_until)
+                SELECT %(table)s, id, %(model)s, %(worker)s, now() + make_interval(secs => %(ttl)s)
+                FROM candidates
+                ON CONFLICT (table_name, job_id, model) DO UPDATE
+                    SET worker_id = EXCLUDED.worker_id,
+                        leased_until = EXCLUDED.leased_until,
+                        attempts = {LEASE_TABLE}.attempts + 1
+                    WHERE {LEASE_TABLE}.leased_until <= now()
+                RETURNING job_id
+            """, {**self.extra_params, "table": self.table_name, "model": self.model_key, "worker": self.worker_id,
+                  "ttl": self.lease_ttl, "limit": batch_size, "max_attempts": self.max_attempts})
+            ids = [r[0] for r in cur.fetchall()]
+            self.conn.commit()
+            if not ids:
+                return []
+
+            cur.execute(f"""
+                SELECT j.id, j.title, j.company, j.salary, j.job_description
+                FROM {self.table_name} j
+                WHERE j.id = ANY(%s)
+                ORDER BY {self.order_by}
+            """, (ids,))
+            return cur.fetchall()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    def complete(self, job_id):
+        """在调用方写入分数的同一事务里删除租约并提交。"""
+        cur = self.conn.cursor()
+        cur.execute(f"""
+            DELETE FROM {LEASE_TABLE}
+            WHERE table_name = %s AND job_id = %s AND model = %s AND worker_id = %s
+        """, (self.table_name, job_id, self.model_key, self.worker_id))
+        self.conn.commit()
+        cur.close()
+
+    def release(self, job_id):
+        """评估失败：立即让租约过期，保留 attempts 计数以免毒岗位无限重试。"""
+        cur = self.conn.cursor()
+        cur.execute(f"""
+            UPDATE {LEASE_TABLE} SET leased_until = now()
+            WHERE table_name = %s AND job_id = %s AND model = %s AND worker_id = %s
+        """, (self.table_name, job_id, self.model_key, self.worker_id))
+        self.conn.commit()
+        cur.close()
+
+    # ---------------- 心跳续约 ----------------
+
+    def start_heartbeat(self):
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat:
+            self._heartbeat.join()
+
+    def _heartbeat_loop(self):
+        # psycopg2 连接不宜跨线程共用，心跳单独开一条
+        conn = psycopg2.connect(**self.db_config)
+        conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            while not self._stop.wait(self.lease_ttl / 3):
+                try:
+                    cur.execute(f"""
+                        UPDATE {LEASE_TABLE}
+                        SET leased_until = now() + make_interval(secs => %s)
+                        WHERE worker_id = %s AND table_name = %s AND model = %s
+                          AND leased_until > now()
+                    """, (self.lease_ttl, self.worker_id, self.table_name, self.model_key))
+                except psycopg2.Error as e:
+                    print(f"  [Lease] 续约失败: {e}")
+            cur.close()
+        finally:
+            conn.close()
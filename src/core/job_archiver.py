@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+冷热分离：把已死亡或已过滤的岗位从 *_jobs 移到 *_jobs_archive。
+
+- 搬迁：DELETE ... RETURNING 直接写入归档表，按批提交，热表的全表扫描只剩有效岗位
+- link 唯一：同一 link 只会存在于热表或归档表之一，归档表同样对 link 建唯一索引
+- 复活：热表上的 BEFORE INSERT 触发器在爬虫重新插入同一 link 时把归档行搬回，
+  保留原 id、分数与用户反馈；因 [UNAVAILABLE / [FILTERED: 归档的岗位正文只剩标记，复活时正文与分数清空，
+  交给过滤、详情抓取与评估重做；全 0 分 (zero_score) 归档的岗位复活时清空分数与版本号，按当前档案重新评估
+- 过滤规则调整后，--restore-filtered 用 job_filter.classify_job 复核归档中的过滤岗位，放行的搬回热表
+"""
+import argparse
+
+from . import job_evaluator
+from . import job_filter
+from . import settings
+
+ARCHIVE_SUFFIX = "_archive"
+ARCHIVE_REASONS = ["unavailable", "filtered", "zero_score", "stale"]
+
+# 这些原因归档的行正文已被标记覆盖，复活时需要重新抓取/评估
+RESET_ON_REVIVAL = ("unavailable", "filtered")
+# 全 0 分归档的行正文完好，但分数可能来自旧的简历档案/黑名单，复活时只清空分数重新评估
+RESET_SCORES_ON_REVIVAL = ("zero_score",)
+
+def score_columns(columns):
+    reset = set()
+    for config in job_evaluator.MODEL_COLUMNS.values():
+        reset.update([config["score_col"], config["rationale_col"], config["version_col"]])
+    return reset & set(columns)
+
+def revival_reset_columns(columns):
+    return score_columns(columns) | ({"job_description", "relevance_score", "relevance_version"} & set(columns))
+
+def table_columns(cur, table_name):
+    cur.execute("""
+        SELECT a.attname, format_type(a.atttypid, a.atttypmod)
+        FROM pg_attribute a
+        WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+        ORDER BY a.attnum
+    """, (table_name,))
+    return cur.fetchall()
+
+def ensure_archive_table(conn, table_name):
+    """创建归档表并补齐热表后来新增的列 (如相关度列)。返回热表列名列表。"""
+    archive = f"{table_name}{ARCHIVE_SUFFIX}"
+    cur = conn.cursor()
+    cur.execute(f"CREATE TABLE IF NOT EXISTS {archive} (LIKE {table_name} INCLUDING DEFAULTS)")
+    cur.execute(f"ALTER TABLE {archive} ADD COLUMN IF NOT EXISTS archived_at TIMESTAMPTZ NOT NULL DEFAULT now()")
+    cur.execute(f"ALTER TABLE {archive} ADD COLUMN IF NOT EXISTS archive_reason TEXT")
+    cur.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS {archive}_link_key ON {archive} (link)")
+
+    hot_columns = table_columns(cur, table_name)
+    archive_names = {name for name, _ in table_columns(cur, archive)}
+    for name, col_type in hot_columns:
+        if name not in archive_names:
+            cur.execute(f'ALTER TABLE {archive} ADD COLUMN "{name}" {col_type}')
+    conn.commit()
+    cur.close()
+    return [name for name, _ in hot_columns]
+
+def install_restore_trigger(conn, table_name, columns):
+    """BEFORE INSERT：新插入的 link 若在归档表中，则把归档行的内容并回 NEW。"""
+    archive = f"{table_name}{ARCHIVE_SUFFIX}"
+    reset = revival_reset_columns(columns)
+    reset_scores = score_columns(columns)
+    keep = [c for c in columns if c not in ("id", "link")]
+
+    def merge(cols):
+        return "\n".join(f'        NEW."{c}" := COALESCE(NEW."{c}", rec."{c}");' for c in cols) or "        NULL;"
+
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE OR REPLACE FUNCTION {table_name}_restore_archived() RETURNS trigger AS $$
+        DECLARE
+            rec {archive}%ROWTYPE;
+        BEGIN
+            DELETE FROM {archive} WHERE link = NEW.link RETURNING * INTO rec;
+            IF NOT FOUND THEN
+                RETURN NEW;
+            END IF;
+            NEW.id := rec.id;
+            IF rec.archive_reason IN ({", ".join(f"'{r}'" for r in RESET_ON_REVIVAL)}) THEN
+{merge([c for c in keep if c not in reset])}
+            ELSIF rec.archive_reason IN ({", ".join(f"'{r}'" for r in RESET_SCORES_ON_REVIVAL)}) THEN
+{merge([c for c in keep if c not in reset_scores])}
+            ELSE
+{merge(keep)}
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    cur.execute(f"DROP TRIGGER IF EXISTS {table_name}_restore_archived ON {table_name}")
+    cur.execute(f"""
+        CREATE TRIGGER {table_name}_restore_archived
+        BEFORE INSERT ON {table_name}
+        FOR EACH ROW EXECUTE FUNCTION {table_name}_restore_archived()
+    """)
+    conn.commit()
+    cur.close()
+
+def archive_conditions(columns, reasons, inactive_days):
+    """返回 (WHERE 条件, 归档原因 CASE 表达式, 参数)。"""
+    score_cols = [c for c in job_evaluator.MODEL_COLUMNS.values() if c["score_col"] in columns]
+    # 每个模型都亲自打了 0 分才算：只有快模型给了 0、强模型尚未评 (或只是级联初筛复制的分数) 的岗位留在热表
+    all_zero = " AND ".join(f"({c['score_col']} = 0 AND {settings.own_score_sql(c)})" for c in score_cols)
+    rules = {
+        "unavailable": "(job_description LIKE '[UNAVAILABLE%%' OR job_description LIKE '[JD_UNAVAILABLE%%')",
+        "filtered": "job_description LIKE '[FILTERED:%%'",
+        "zero_score": f"({all_zero})" if score_cols else "FALSE",
+        "stale": "fetched_at < now() - make_interval(days => %(inactive_days)s)",
+    }
+    where = " OR ".join(rules[r] for r in reasons)
+    # 用户标注过的岗位留在热表，仪表盘上仍可见
+    if "user_notes" in columns and "user_score" in columns:
+        where = f"({where}) AND user_notes IS NULL AND user_score IS NULL"
+    case = "CASE " + " ".join(f"WHEN {rules[r]} THEN '{r}'" for r in reasons) + " END"
+    return where, case, {"inactive_days": inactive_days}
+
+def count_candidates(conn, table_name, where, case, params):
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT {case} AS reason, count(*)
+        FROM {table_name}
+        WHERE {where}
+        GROUP BY 1 ORDER BY 1
+    """, params)
+    rows = dict(cur.fetchall())
+    cur.close()
+    return rows
+
+def archive_jobs(conn, table_name, columns, reasons, inactive_days=90, batch_size=5000):
+    """按批把命中规则的岗位搬到归档表，每批一个事务。返回各原因的搬迁数。"""
+    archive = f"{table_name}{ARCHIVE_SUFFIX}"
+    where, case, params = archive_conditions(columns, reasons, inactive_days)
+    col_list = ", ".join(f'"{c}"' for c in columns)
+    updates = ", ".join(f'"{c}" = EXCLUDED."{c}"' for c in columns + ["archived_at", "archive_reason"] if c != "link")
+    moved = {}
+    cur = conn.cursor()
+    while True:
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM {table_name}
+                WHERE id IN (
+                    SELECT id FROM {table_name}
+                    WHERE {where}
+                    LIMIT %(batch)s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING {col_list}, now() AS archived_at, {case} AS archive_reason
+            )
+            INSERT INTO {archive} ({col_list}, archived_at, archive_reason)
+            SELECT * FROM moved
+            ON CONFLICT (link) DO UPDATE SET {updates}
+            RETURNING archive_reason
+        """, {**params, "batch": batch_size})
+        batch = cur.fetchall()
+        conn.commit()
+        for (reason,) in batch:
+            moved[reason] = moved.get(reason, 0) + 1
+        if len(batch) < batch_size:
+            break
+    cur.close()
+    return moved
+
+def restore_filtered_jobs(conn, table_name, dry_run=False):
+    """
+    用当前过滤规则复核归档中的过滤岗位：不再命中的搬回热表，
+    正文与分数清空 (同 job_filter 的洗白逻辑)，以便重新抓取与评估。
+    """
+    archive = f"{table_name}{ARCHIVE_SUFFIX}"
+    cur = conn.cursor()
+    cur.execute(f"SELECT id, title, salary, location FROM {archive} WHERE archive_reason = 'filtered'")
+    rules = job_filter.filter_rules()
+    passed = [job_id for job_id, title, salary, location in cur.fetchall()
+              if job_filter.classify_job(title, salary, location, rules=rules)[0] is None]
+    if dry_run or not passed:
+        cur.close()
+        return len(passed)
+
+    # 只插入 link，由 BEFORE INSERT 触发器完成搬回与列合并 (正文与分数清空)
+    cur.execute(f"""
+        INSERT INTO {table_name} (link)
+        SELECT link FROM {archive} WHERE id = ANY(%s)
+        ON CONFLICT (link) DO NOTHING
+    """, (passed,))
+    conn.commit()
+    cur.close()
+    return len(passed)
+
+def archive_stats(conn, table_name):
+    cur = conn.cursor()
+    cur.execute(f"SELECT count(*) FROM {table_name}")
+    hot = cur.fetchone()[0]
+    cur.execute(f"SELECT archive_reason, count(*) FROM {table_name}{ARCHIVE_SUFFIX} GROUP BY 1 ORDER BY 1")
+    cold = dict(cur.fetchall())
+    cur.close()
+    return hot, cold
+
+def main():
+    parser = argparse.ArgumentParser(description="Move dead and filtered jobs into *_jobs_archive and revive them on reappearance")
+    parser.add_argument("--dataset", type=str, choices=["liepin", "boss"], default="liepin", help="Select which job dataset to process")
+    parser.add_argument("--reasons", nargs="+", choices=ARCHIVE_REASONS, default=ARCHIVE_REASONS, help="Which kinds of dead rows to archive")
+    parser.add_argument("--inactive-days", type=int, default=90, help="Archive rows the scrapers have not seen for this many days (reason: stale)")
+    parser.add_argument("--batch-size", type=int, default=5000, help="Rows moved per transaction")
+    parser.add_argument("--restore-filtered", action="store_true", help="Re-check archived [FILTERED rows against the current filter rules and revive those that pass")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM ANALYZE the hot table after moving rows")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    args = parser.parse_args()
+
+    table_name = f"{args.dataset}_jobs"
+    conn = job_evaluator.get_db_connection()
+    try:
+        columns = ensure_archive_table(conn, table_name)
+        install_restore_trigger(conn, table_name, columns)
+
+        if args.restore_filtered:
+            revived = restore_filtered_jobs(conn, table_name, dry_run=args.dry_run)
+            print(f"✅ 过滤规则复核: {'(模拟)' if args.dry_run else ''}从归档恢复了 {revived} 个不再命中规则的岗位。")
+
+        where, case, params = archive_conditions(columns, args.reasons, args.inactive_days)
+        if args.dry_run:
+            moved = count_candidates(conn, table_name, where, case, params)
+        else:
+            moved = archive_jobs(conn, table_name, columns, args.reasons,
+                                 inactive_days=args.inactive_days, batch_size=args.batch_size)
+        hot, cold = archive_stats(conn, table_name)
+
+        print("\n================= 归档报告 ==================")
+        print(f"✅ {'(模拟)' if args.dry_run else ''}归档 {sum(moved.values())} 个岗位: " +
+              (", ".join(f"{k} {v}" for k, v in moved.items()) or "无"))
+        print(f"📦 热表 {table_name}: {hot} 行 | 归档 {table_name}{ARCHIVE_SUFFIX}: {sum(cold.values())} 行 " +
+              (f"({', '.join(f'{k} {v}' for k, v in cold.items())})" if cold else ""))
+        print("=============================================\n")
+
+        if args.vacuum and not args.dry_run:
+            conn.autocommit = True
+            cur = conn.cursor()
+            cur.execute(f"VACUUM (ANALYZE) {table_name}")
+            cur.close()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,73 +1,92 @@
 #!/usr/bin/env python3
+from . import profiling
+from . import settings
+import hashlib
 import json
 import os
 import psycopg2
 import argparse
-from openai import OpenAI
+from .llm_control import CircuitOpenError, ControlledClient, Endpoint
+from .prompt_builder import SYSTEM_PROMPT, get_prompt_builder, new_prompt_stats, record_job, record_usage, format_prompt_report
+from .llm_telemetry import error_outcome, record_call, start_recording, stop_recording
 import time
 import re
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-# Load environment variables if available
-try:
-    from dotenv import load_dotenv
-    # Load .env if it exists
-    load_dotenv()
-except ImportError:
-    pass
-
-def get_env_strict(key):
-    val = os.getenv(key)
-    if val is None:
-        raise EnvironmentError(f"Missing required environment variable: {key}")
-    return val
-
-# 数据库配置
-DB_CONFIG = {
-    "dbname": get_env_strict("DB_NAME"),
-    "user": get_env_strict("DB_USER"),
-    "password": os.getenv("DB_PASSWORD", ""),
-    "host": get_env_strict("DB_HOST"),
-    "port": get_env_strict("DB_PORT")
-}
+# 模型配置集：按需校验环境变量，只需列名时用 MODEL_COLUMNS
+MODEL_CONFIGS = settings.MODEL_CONFIGS
+MODEL_COLUMNS = settings.MODEL_COLUMNS
 
-# 模型配置集
-MODEL_CONFIGS = {
-    "gemma3": {
-        "api_base": get_env_strict("GEMMA_API_BASE"),
-        "api_key": get_env_strict("GEMMA_API_KEY"),
-        "model_name": get_env_strict("GEMMA_MODEL_NAME"),
-        "score_col": "match_score",
-        "rationale_col": "rationale"
-    },
-    "qwen3_8b": {
-        "api_base": get_env_strict("QWEN_API_BASE"),
-        "api_key": get_env_strict("QWEN_API_KEY"),
-        "model_name": get_env_strict("QWEN_MODEL_NAME"),
-        "score_col": "match_score_qwen3_8b",
-        "rationale_col": "rationale_qwen3_8b"
+def evaluator_config():
+    return settings.user_config().get("strategy", {}).get("evaluator", {})
+
+def prompt_template():
+    return evaluator_config().get("prompt_template", "")
+
+def _compile_hard_blacklist(config):
+    toxics = config.get("strategy", {}).get("evaluator", {}).get("hard_blacklist", [])
+    return [(toxic, toxic.upper()) for toxic in toxics]
+
+# 结构化输出：auto 依次尝试 json_schema -> json_object，服务端都不支持时回退到正则解析
+STRUCTURED_MODES = ["auto", "json_schema", "guided_json", "json_object", "off"]
+AUTO_STRUCTURED_LADDER = ["json_schema", "json_object", "off"]
+STRUCTURED_OVERRIDE = None
+_AUTO_STRUCTURED_STATE = {}
+_AUTO_STRUCTURED_LOCK = threading.Lock()
+# 400 错误信息含这些词时才认为是服务端不支持所请求的结构化输出 (而非上下文超长等)
+STRUCTURED_REJECTION_MARKERS = ["response_format", "json_schema", "guided_json", "json_object", "guided decoding"]
+_RUN_STATS_LOCK = threading.Lock()
+
+EVAL_JSON_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "integer", "minimum": 0, "maximum": 100},
+        "analysis": {"type": "string"},
+        "reason": {"type": "string"},
+        "dimension_scores": {
+            "type": "object",
+            "properties": {
+                "hard_indicators": {"type": "integer"},
+                "domain_relevance": {"type": "integer"},
+                "technical_skills": {"type": "integer"},
+                "project_scenario": {"type": "integer"}
+            },
+            "required": ["hard_indicators", "domain_relevance", "technical_skills", "project_scenario"],
+            "additionalProperties": False
+        }
     },
-    "glm5": {
-        "api_base": get_env_strict("GLM_API_BASE"),
-        "api_key": get_env_strict("GLM_API_KEY"),
-        "model_name": get_env_strict("GLM_MODEL_NAME"),
-        "score_col": "match_score_glm5",
-        "rationale_col": "rationale_glm5"
-    }
+    "required": ["score", "analysis", "reason", "dimension_scores"],
+    "additionalProperties": False
 }
 
-# Load user config
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "config.json")
-with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-    USER_CONFIG = json.load(f)
+MAX_OUTPUT_TOKENS = 2000
+
+# 级联模式下未升级给强模型的岗位，在强模型理由列以此前缀标记 (读取分数时用 settings.own_score_sql 排除)
+CASCADE_SKIP_PREFIX = settings.CASCADE_SKIP_PREFIX
+# 规则打出的分数 (LIKE 模式)，不依赖 prompt，既不参与相关度基准也不会过期
+RULE_RATIONALE_PATTERNS = ["后置过滤，%", "前置规则过滤", f"{CASCADE_SKIP_PREFIX}%"]
 
-HARD_BLACKLIST = USER_CONFIG.get("strategy", {}).get("evaluator", {}).get("hard_blacklist", [])
-PROMPT_TEMPLATE = USER_CONFIG.get("strategy", {}).get("evaluator", {}).get("prompt_template", "")
+# 与 obsidian_exporter.categorize_activity 相同的活跃度分档，数值越小越活跃
+ACTIVITY_RANK_SQL = r"""CASE
+    WHEN update_time ~ '今日|本周|刚刚|小时' THEN 1
+    WHEN update_time ~ '\d+天前' THEN CASE
+        WHEN substring(update_time from '(\d+)天前')::int <= 15 THEN 1
+        WHEN substring(update_time from '(\d+)天前')::int <= 30 THEN 2
+        ELSE 4 END
+    WHEN update_time ~ '\d+月\d+日' THEN 2
+    ELSE 3 END"""
+
+_LLM_CLIENTS = {}
+_LLM_CLIENTS_LOCK = threading.Lock()
 
 def get_db_connection():
-    return psycopg2.connect(**DB_CONFIG)
+    return psycopg2.connect(**settings.db_config())
 
 def check_model_availability(api_key, base_url):
     try:
+        from openai import OpenAI
         client = OpenAI(
             api_key=api_key,
             base_url=base_url
@@ -76,78 +95,380 @@ def check_model_availability(api_key, base_url):
     except Exception as e:
         return None
 
+def make_llm_client(config, max_concurrency=1):
+    """
+    构建带 AIMD 并发控制、熔断与对冲的客户端 (接口同 OpenAI 客户端)。
+    SDK 自带重试关闭，429/5xx 交给控制器感知；配置了 *_HEDGE_API_BASE 时启用对冲端点，
+    配置了 *_LATENCY_TARGET (秒) 时单次调用超过该延迟也会收缩并发上限。
+    """
+    from openai import OpenAI
+
+    def probe(api_key, base_url):
+        return lambda: check_model_availability(api_key, base_url) is not None
+
+    primary = Endpoint(
+        config["model_name"],
+        OpenAI(api_key=config["api_key"], base_url=config["api_base"], timeout=settings.llm_timeout(), max_retries=0),
+        config["model_name"],
+        probe=probe(config["api_key"], config["api_base"])
+    )
+    secondary = None
+    if config.get("hedge_api_base"):
+        hedge_key = config.get("hedge_api_key") or config["api_key"]
+        secondary = Endpoint(
+            f"{config['model_name']}@hedge",
+            OpenAI(api_key=hedge_key, base_url=config["hedge_api_base"], timeout=settings.llm_timeout(), max_retries=0),
+            config.get("hedge_model_name") or config["model_name"],
+            probe=probe(hedge_key, config["hedge_api_base"])
+        )
+    return ControlledClient(primary, secondary, max_concurrency=max_concurrency,
+                            latency_target=config.get("latency_target"))
+
+def get_llm_client(model_key, max_concurrency=1):
+    """进程内按 (模型, 并发上限) 复用客户端，AIMD 与熔断状态在调用方之间共享。"""
+    with _LLM_CLIENTS_LOCK:
+        client = _LLM_CLIENTS.get((model_key, max_concurrency))
+        if client is None:
+            client = make_llm_client(settings.model_config(model_key), max_concurrency=max_concurrency)
+            _LLM_CLIENTS[(model_key, max_concurrency)] = client
+        return client
+
+def preflight_llm_client(client, config, action="评估"):
+    """
+    运行前用 check_model_availability 探测主端点。不可用时：有对冲端点则熔断主端点继续，
+    否则返回 False 让调用方直接退出，而不是对每个岗位白白重试三次。
+    """
+    if check_model_availability(config["api_key"], config["api_base"]) is not None:
+        return True
+    if client.secondary is not None:
+        print(f"⚠️  主端点 {config['api_base']} 不可用，已熔断，改走对冲端点 {config['hedge_api_base']}。")
+        client.primary.breaker.trip()
+        return True
+    print(f"❌ 模型端点 {config['api_base']} 不可用，本次跳过{action}。")
+    return False
+
 def load_profile(path):
     with open(path, 'r', encoding='utf-8') as f:
         return f.read()
 
-def evaluate_job(client, model_name, profile_text, job_title, job_company, job_salary, job_desc):
-    # Use dynamic prompt from config
-    prompt = PROMPT_TEMPLATE.format(
-        profile_text=profile_text,
-        job_title=job_title,
-        job_company=job_company,
-        job_salary=job_salary,
-        job_desc=job_desc
-    )
+def collect_profile_text():
+    # From config.json (identity.profiles)
+    config_paths = settings.user_config().get("identity", {}).get("profiles", [])
+    
+    # Combine (deduplicate while preserving order)
+    all_paths = []
+    seen = set()
+    for p in config_paths:
+        abs_p = os.path.expanduser(p)
+        if abs_p not in seen:
+            all_paths.append(abs_p)
+            seen.add(abs_p)
+
+    profile_text = ""
+    for p in all_paths:
+        if os.path.exists(p):
+            profile_text += f"\n--- {os.path.basename(p)} ---\n"
+            profile_text += load_profile(p)
+    return profile_text
+
+def config_for_model_name(model_name):
+    key = settings.model_key_for_name(model_name)
+    return MODEL_CONFIGS[key] if key else {}
+
+def build_prompt(model_name, profile_text, job_title, job_company, job_salary, job_desc):
+    """
+    用 prompt_builder 组装消息：system + 档案为稳定前缀，JD 按模型上下文预算截断。
+    """
+    model_config = config_for_model_name(model_name)
+    with profiling.stage("compute"):
+        builder = get_prompt_builder(
+            prompt_template(), profile_text,
+            tokenizer_path=model_config.get("tokenizer"),
+            context_tokens=model_config.get("context_tokens", 16384),
+            max_output_tokens=MAX_OUTPUT_TOKENS,
+            profile_max_tokens=evaluator_config().get("profile_max_tokens", 6000)
+        )
+        return builder.build(job_title, job_company, job_salary, job_desc)
+
+def structured_request_kwargs(mode):
+    """按结构化输出模式生成额外的请求参数。"""
+    if mode == "json_schema":
+        return {"response_format": {"type": "json_schema", "json_schema": {
+            "name": "job_evaluation", "schema": EVAL_JSON_SCHEMA, "strict": True
+        }}}
+    if mode == "guided_json":
+        # vLLM guided decoding
+        return {"extra_body": {"guided_json": EVAL_JSON_SCHEMA}}
+    if mode == "json_object":
+        return {"response_format": {"type": "json_object"}}
+    return {}
+
+def resolve_structured_mode(model_name):
+    mode = STRUCTURED_OVERRIDE or config_for_model_name(model_name).get("structured_output", "auto")
+    if mode == "auto":
+        return _AUTO_STRUCTURED_STATE.get(model_name, AUTO_STRUCTURED_LADDER[0])
+    return mode
+
+def is_structured_rejection(e):
+    """400 错误是否指向结构化输出参数本身。"""
+    message = f"{e} {getattr(e, 'body', '') or ''}".lower()
+    return any(marker in message for marker in STRUCTURED_REJECTION_MARKERS)
+
+def downgrade_structured_mode(model_name, mode):
+    """
+    auto 模式下服务端拒绝当前 response_format 时，沿 AUTO_STRUCTURED_LADDER 降级并记住结果。
+    显式指定的模式不降级，返回 None。并发 worker 同时失败时只降一级：
+    其它 worker 已经降过级则直接返回当前模式。
+    """
+    configured = STRUCTURED_OVERRIDE or config_for_model_name(model_name).get("structured_output", "auto")
+    if configured != "auto" or mode not in AUTO_STRUCTURED_LADDER:
+        return None
+    idx = AUTO_STRUCTURED_LADDER.index(mode)
+    with _AUTO_STRUCTURED_LOCK:
+        current = _AUTO_STRUCTURED_STATE.get(model_name, AUTO_STRUCTURED_LADDER[0])
+        if AUTO_STRUCTURED_LADDER.index(current) > idx:
+            return current
+        if idx + 1 >= len(AUTO_STRUCTURED_LADDER):
+            return None
+        next_mode = AUTO_STRUCTURED_LADDER[idx + 1]
+        _AUTO_STRUCTURED_STATE[model_name] = next_mode
+        return next_mode
+
+def parse_evaluation_content(content):
+    """
+    解析模型输出，返回 (score, full_reason)。无法解析为 JSON 时抛出 ValueError。
+    """
+    content = (content or "").strip()
+    # 提取第一个 { 到最后一个 } 之间的内容
+    match = re.search(r'(\{.*\})', content, re.DOTALL)
+    json_str = match.group(1) if match else content
+    result = json.loads(json_str, strict=False)
+    if not isinstance(result, dict):
+        raise ValueError("LLM 输出不是 JSON 对象")
+
+    score = result.get("score")
+    analysis = result.get("analysis", "")
+    reason = result.get("reason", "")
+
+    # Combine dimension scores into the rationale if available
+    dim_scores = result.get("dimension_scores")
+    if dim_scores and isinstance(dim_scores, dict):
+        breakdown = " | ".join([f"{k}: {v}" for k, v in dim_scores.items()])
+        full_reason = f"[{breakdown}]\n思考链路: {analysis}\n总结: {reason}"
+    else:
+        full_reason = f"思考: {analysis}\n总结: {reason}"
+    return score, full_reason
+
+def new_run_stats():
+    stats = new_prompt_stats()
+    stats.update({"structured_jobs": 0, "structured_retries": 0, "fallback_jobs": 0, "fallback_retries": 0,
+                  "failed_jobs": 0, "crashed_jobs": 0})
+    return stats
+
+def record_parse_outcome(stats, mode, retries):
+    if stats is None:
+        return
+    with _RUN_STATS_LOCK:
+        if mode == "off":
+            stats["fallback_jobs"] += 1
+            stats["fallback_retries"] += retries
+        else:
+            stats["structured_jobs"] += 1
+            stats["structured_retries"] += retries
+
+def format_structured_report(stats, baseline_retry_rate=None):
+    """
+    结构化输出节省估算：以回退(正则)路径的每岗重试率为基线，
+    乘以结构化岗位数即为避免的重试次数，再按平均 completion tokens 折算。
+    """
+    if not stats or not stats.get("structured_jobs"):
+        return None
+    jobs = stats["structured_jobs"]
+    line = f"🧩 结构化输出: {jobs} 个岗位，解析重试 {stats['structured_retries']} 次"
+
+    rate = baseline_retry_rate
+    if rate is None and stats["fallback_jobs"]:
+        rate = stats["fallback_retries"] / stats["fallback_jobs"]
+    if rate is None:
+        return line + " (无正则路径基线，可用 --baseline-retry-rate 指定)"
+
+    avoided = max(jobs * rate - stats["structured_retries"], 0.0)
+    avg_completion = stats["completion_tokens"] / stats["calls"] if stats["calls"] else 0.0
+    saved_tokens = avoided * avg_completion
+    return (line + f"；按基线 {rate:.2f} 次重试/岗估算，避免约 {avoided:.1f} 次重试，"
+            f"节省约 {saved_tokens / jobs:.0f} tokens/岗")
+
+def format_failure_report(stats):
+    if not stats.get("failed_jobs"):
+        return None
+    return f"❌ 评估失败 {stats['failed_jobs']} 个岗位 (其中异常中断 {stats['crashed_jobs']} 个)，下次运行会重新选中。"
+
+def print_llm_report(stats, prefix="", baseline_retry_rate=None):
+    for line in [format_prompt_report(stats), format_structured_report(stats, baseline_retry_rate),
+                 format_failure_report(stats)]:
+        if line:
+            print(f"{prefix}{line}")
+
+def eval_request_kwargs(model_name, messages, attempt=0, mode="off"):
+    """evaluate_job 与批量导出共用的 chat.completions 请求参数。"""
+    # First attempt: strict temperature. Later attempts: inject randomness to escape collapse
+    temp = 0.1 if attempt == 0 else (0.5 + attempt * 0.2)
+    pres_pen = 0.0 if attempt == 0 else 0.5
+    return {
+        "model": model_name,
+        "messages": messages,
+        "temperature": temp,
+        "presence_penalty": pres_pen,
+        "max_tokens": MAX_OUTPUT_TOKENS,
+        **structured_request_kwargs(mode)
+    }
+
+def evaluate_job(client, model_name, profile_text, job_title, job_company, job_salary, job_desc, stats=None,
+                 job_id=None, table_name=None):
+    messages, meta = build_prompt(model_name, profile_text, job_title, job_company, job_salary, job_desc)
+    record_job(stats, meta)
+    mode = resolve_structured_mode(model_name)
 
     max_retries = 3
-    for attempt in range(max_retries):
+    attempt = 0
+    while attempt < max_retries:
+        request = eval_request_kwargs(model_name, messages, attempt, mode)
+        call = {"job_id": job_id, "table_name": table_name, "attempt": attempt, "temperature": request["temperature"]}
+        started = time.monotonic()
         try:
-            # First attempt: strict temperature. Later attempts: inject randomness to escape collapse
-            temp = 0.1 if attempt == 0 else (0.5 + attempt * 0.2)
-            pres_pen = 0.0 if attempt == 0 else 0.5
-            
-            response = client.chat.completions.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": "你是一个只输出 JSON 格式的高级 HR 匹配评估引擎。"},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temp,
-                presence_penalty=pres_pen,
-                max_tokens=2000,
-            )
-            
-            import re
-            content = response.choices[0].message.content.strip()
-            
-            # 提取第一个 { 到最后一个 } 之间的内容
-            match = re.search(r'(\{.*\})', content, re.DOTALL)
-            if match:
-                json_str = match.group(1)
-            else:
-                json_str = content
-                
-            try:
-                result = json.loads(json_str, strict=False)
-            except Exception as json_e:
-                if attempt < max_retries - 1:
-                    print(f"  [Attempt {attempt+1}] JSON解析异常，正使用更高 temperature 重试...")
-                    continue
-                else:
-                    print(f"[JSON Decode Error] Raw Content from LLM:\n{content}\n")
-                    raise json_e
-            
-            score = result.get("score")
-            analysis = result.get("analysis", "")
-            reason = result.get("reason", "")
-            
-            # Combine dimension scores into the rationale if available
-            dim_scores = result.get("dimension_scores")
-            if dim_scores and isinstance(dim_scores, dict):
-                breakdown = " | ".join([f"{k}: {v}" for k, v in dim_scores.items()])
-                full_reason = f"[{breakdown}]\n思考链路: {analysis}\n总结: {reason}"
-            else:
-                full_reason = f"思考: {analysis}\n总结: {reason}"
-                
-            return score, full_reason
-            
+            with profiling.stage("llm"):
+                response = client.chat.completions.create(**request)
+        except CircuitOpenError as e:
+            record_call(model_name, time.monotonic() - started, "circuit_open", error=e, **call)
+            print(f"  [Circuit] {e}，跳过该岗位。")
+            return None, None
         except Exception as e:
+            outcome = error_outcome(e)
+            record_call(model_name, time.monotonic() - started, outcome, error=e, **call)
+            next_mode = None
+            if outcome == "bad_request" and is_structured_rejection(e):
+                next_mode = downgrade_structured_mode(model_name, mode)
+            if next_mode is not None:
+                # 服务端不支持该 response_format：降级后重发，不计入重试次数
+                print(f"  [Structured] {model_name} 不支持 {mode}，降级为 {next_mode}。")
+                mode = next_mode
+                continue
             if attempt < max_retries - 1:
                 print(f"  [Attempt {attempt+1}] API调用异常 ({e})，正在重试...")
-            else:
-                print(f"LLM 评估出错: {e}")
-                return None, None
+                if outcome == "overloaded":
+                    # 端点过载时退避，避免重试继续加压
+                    time.sleep((2 ** attempt) + random.random())
+                attempt += 1
+                continue
+            print(f"LLM 评估出错: {e}")
+            return None, None
+
+        latency = time.monotonic() - started
+        record_usage(stats, response, meta)
+        content = (response.choices[0].message.content or "").strip()
+        try:
+            score, full_reason = parse_evaluation_content(content)
+        except Exception as json_e:
+            record_call(model_name, latency, "parse_error", response=response, error=json_e, **call)
+            if attempt < max_retries - 1:
+                print(f"  [Attempt {attempt+1}] JSON解析异常，正使用更高 temperature 重试...")
+                attempt += 1
+                continue
+            print(f"[JSON Decode Error] Raw Content from LLM:\n{content}\n")
+            print(f"LLM 评估出错: {json_e}")
+            return None, None
+
+        record_call(model_name, latency, "ok", response=response, **call)
+        record_parse_outcome(stats, mode, attempt)
+        return score, full_reason
+    return None, None
+
+def static_filter_decision(title, job_desc):
+    """
+    后置静态过滤的决策树。命中时返回 (0, 理由)，否则返回 (None, None)。
+    """
+    desc_upper = (job_desc or "").upper()
+    title_upper = (title or "").upper()
+
+    if any(mark in desc_upper for mark in ["[UNAVAILABLE", "[JD_UNAVAILABLE"]):
+        return 0, "后置过滤，暂停招聘"
+    for toxic, toxic_upper in settings.compiled(_compile_hard_blacklist):
+        if toxic_upper in title_upper or toxic_upper in desc_upper:
+            return 0, f"后置过滤，根据具体过滤关键词：{toxic}"
+    return None, None
+
+def prompt_version(config, profile_text):
+    """
+    打分输入的指纹：prompt 模板、system 提示、简历档案与模型名。
+    任一变化后已有分数即视为过期，可用 --rescore-stale 按优先级重评。
+    """
+    payload = "\x1f".join([prompt_template(), SYSTEM_PROMPT, profile_text, config["model_name"]])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+def ensure_version_columns(conn, table_name):
+    cur = conn.cursor()
+    for config in MODEL_COLUMNS.values():
+        cur.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {config['version_col']} TEXT")
+    conn.commit()
+    cur.close()
+
+def save_evaluation(cur, table_name, config, job_id, score, reason, version=None):
+    """version 为 None 表示规则分数 (静态过滤、级联跳过)，不参与过期判定。"""
+    with profiling.stage("write"):
+        cur.execute(
+            f"UPDATE {table_name} SET {config['score_col']} = %s, {config['rationale_col']} = %s, "
+            f"{config['version_col']} = %s WHERE id = %s",
+            (score, reason, version, job_id)
+        )
+
+def stale_where(config):
+    """已有 LLM 分数、但版本与当前 %(version)s 不符的岗位。返回 (条件, 参数)。"""
+    rules = " ".join(f"AND {config['rationale_col']} NOT LIKE %(rule_{i})s" for i in range(len(RULE_RATIONALE_PATTERNS)))
+    where = (f"job_description IS NOT NULL AND job_description NOT LIKE '[FILTERED:%%' "
+             f"AND {config['score_col']} IS NOT NULL AND {config['version_col']} IS DISTINCT FROM %(version)s {rules}")
+    return where, {f"rule_{i}": pattern for i, pattern in enumerate(RULE_RATIONALE_PATTERNS)}
+
+def fetch_stale_jobs(conn, table_name, config, version, limit):
+    """
+    按重评优先级取过期岗位：当前分数高的分档在前，同档内越活跃、越新越靠前。
+    """
+    where, params = stale_where(config)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT id, title, company, salary, job_description
+        FROM {table_name}
+        WHERE {where}
+        ORDER BY floor({config['score_col']} / 10.0) DESC, {ACTIVITY_RANK_SQL}, fetched_at DESC
+        LIMIT %(limit)s
+    """, {**params, "version": version, "limit": limit})
+    jobs = cur.fetchall()
+    cur.close()
+    return jobs
+
+def adopt_current_version(conn, table_name, config, version, dry_run=False):
+    """
+    一次性把尚无版本号的已有分数 (版本列上线前打的分) 认作当前版本，
+    避免首次 --rescore-stale 把整个存量积压都当成过期。返回涉及的行数。
+    """
+    where = f"{config['score_col']} IS NOT NULL AND {config['version_col']} IS NULL"
+    cur = conn.cursor()
+    if dry_run:
+        cur.execute(f"SELECT count(*) FROM {table_name} WHERE {where}")
+        count = cur.fetchone()[0]
+    else:
+        cur.execute(f"UPDATE {table_name} SET {config['version_col']} = %s WHERE {where}", (version,))
+        count = cur.rowcount
+        conn.commit()
+    cur.close()
+    return count
+
+def count_stale_jobs(conn, table_name, config, version):
+    where, params = stale_where(config)
+    cur = conn.cursor()
+    cur.execute(f"SELECT count(*) FROM {table_name} WHERE {where}", {**params, "version": version})
+    count = cur.fetchone()[0]
+    cur.close()
+    return count
 
 def apply_static_filters_globally(conn, dry_run=False, table_name="liepin_jobs"):
     """
@@ -157,62 +478,50 @@ def apply_static_filters_globally(conn, dry_run=False, table_name="liepin_jobs")
     
     # 动态构建查询列，确保包含所有配置的列
     cols_to_select = ["id", "title", "job_description"]
-    model_keys = list(MODEL_CONFIGS.keys())
+    model_keys = list(MODEL_COLUMNS.keys())
     for key in model_keys:
-        cols_to_select.append(MODEL_CONFIGS[key]["score_col"])
-        cols_to_select.append(MODEL_CONFIGS[key]["rationale_col"])
+        cols_to_select.append(MODEL_COLUMNS[key]["score_col"])
+        cols_to_select.append(MODEL_COLUMNS[key]["rationale_col"])
     
     query = f"SELECT {', '.join(cols_to_select)} FROM {table_name} WHERE job_description IS NOT NULL"
-    cur.execute(query)
-    all_jobs = cur.fetchall()
+    with profiling.stage("query"):
+        cur.execute(query)
+    with profiling.stage("fetch"):
+        all_jobs = cur.fetchall()
     
-    updates = []
-    for row in all_jobs:
-        j_id = row[0]
-        title = row[1]
-        job_desc = row[2]
-        # 模型数据从索引 3 开始，成对出现 (score, rationale)
-        model_data = row[3:]
+    with profiling.stage("compute"):
+        updates = []
+        for row in all_jobs:
+            j_id = row[0]
+            title = row[1]
+            job_desc = row[2]
+            # 模型数据从索引 3 开始，成对出现 (score, rationale)
+            model_data = row[3:]
         
-        desc_upper = job_desc.upper()
-        title_upper = title.upper()
+            target_score, target_rationale = static_filter_decision(title, job_desc)
         
-        target_score = None
-        target_rationale = None
-        
-        # --- 决策树 ---
-        if any(mark in desc_upper for mark in ["[UNAVAILABLE", "[JD_UNAVAILABLE"]):
-            target_score = 0
-            target_rationale = "后置过滤，暂停招聘"
-        else:
-            for toxic in HARD_BLACKLIST:
-                if toxic.upper() in title_upper or toxic.upper() in desc_upper:
-                    target_score = 0
-                    target_rationale = f"后置过滤，根据具体过滤关键词：{toxic}"
-                    break
-        
-        # --- 同步逻辑 (针对全量模型列) ---
-        needs_update = False
-        if target_score == 0:
-            # 只要任意一个模型的列没有同步为 0 或理由不符，就更新全部
-            for i in range(0, len(model_data), 2):
-                if model_data[i] != 0 or model_data[i+1] != target_rationale:
-                    needs_update = True
-                    break
-        else:
-            # 只要任意一个模型列之前是被“后置过滤”标记的，就全部重置
-            for i in range(1, len(model_data), 2):
-                if model_data[i] and model_data[i].startswith("后置过滤，"):
-                    needs_update = True
-                    break
+            # --- 同步逻辑 (针对全量模型列) ---
+            needs_update = False
+            if target_score == 0:
+                # 只要任意一个模型的列没有同步为 0 或理由不符，就更新全部
+                for i in range(0, len(model_data), 2):
+                    if model_data[i] != 0 or model_data[i+1] != target_rationale:
+                        needs_update = True
+                        break
+            else:
+                # 只要任意一个模型列之前是被“后置过滤”标记的，就全部重置
+                for i in range(1, len(model_data), 2):
+                    if model_data[i] and model_data[i].startswith("后置过滤，"):
+                        needs_update = True
+                        break
 
-        if needs_update:
-            # 构建更新参数列表: [score1, rationale1, score2, rationale2, ..., id]
-            update_row = []
-            for _ in model_keys:
-                update_row.extend([target_score, target_rationale])
-            update_row.append(j_id)
-            updates.append(tuple(update_row))
+            if needs_update:
+                # 构建更新参数列表: [score1, rationale1, score2, rationale2, ..., id]
+                update_row = []
+                for _ in model_keys:
+                    update_row.extend([target_score, target_rationale])
+                update_row.append(j_id)
+                updates.append(tuple(update_row))
                 
     if updates:
         if dry_run:
@@ -221,75 +530,562 @@ def apply_static_filters_globally(conn, dry_run=False, table_name="liepin_jobs")
             # 动态构建 UPDATE 语句
             set_clauses = []
             for key in model_keys:
-                set_clauses.append(f"{MODEL_CONFIGS[key]['score_col']} = %s")
-                set_clauses.append(f"{MODEL_CONFIGS[key]['rationale_col']} = %s")
+                set_clauses.append(f"{MODEL_COLUMNS[key]['score_col']} = %s")
+                set_clauses.append(f"{MODEL_COLUMNS[key]['rationale_col']} = %s")
             
             update_query = f"UPDATE {table_name} SET {', '.join(set_clauses)} WHERE id = %s"
             
             import psycopg2.extras
-            psycopg2.extras.execute_batch(cur, update_query, updates)
-            conn.commit()
+            with profiling.stage("write"):
+                psycopg2.extras.execute_batch(cur, update_query, updates)
+                conn.commit()
     cur.close()
     return updates
 
+def pending_queue_clauses(args, alias=""):
+    """
+    LLM 待评队列的附加过滤与排序。开启 --rank 时按相关度优先，可选按下限剪枝。
+    返回 (extra_where, order_by, params)，extra_where 使用命名占位符。
+    """
+    if not args.rank:
+        return "", f"{alias}fetched_at DESC", {}
+    order_by = f"{alias}relevance_score DESC NULLS LAST, {alias}fetched_at DESC"
+    if args.min_relevance is None:
+        return "", order_by, {}
+    return f"AND {alias}relevance_score >= %(min_relevance)s", order_by, {"min_relevance": args.min_relevance}
+
+def export_batch(conn, args, config, profile_text, table_name, output_path, batch_limit=None):
+    """
+    把待评岗位写成 OpenAI batch / `vllm run_batch` 兼容的 JSONL，每行一个请求。
+    prompt 与 evaluate_job 首次尝试完全一致；custom_id 编码了表、岗位与模型以便回灌。
+    """
+    queue_where, queue_order, queue_params = pending_queue_clauses(args)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT id, title, company, salary, job_description
+        FROM {table_name}
+        WHERE job_description IS NOT NULL AND {config['score_col']} IS NULL {queue_where}
+        ORDER BY {queue_order} LIMIT %(limit)s
+    """, {**queue_params, "limit": batch_limit})
+    jobs = cur.fetchall()
+    cur.close()
+
+    mode = resolve_structured_mode(config["model_name"])
+    version = prompt_version(config, profile_text)
+    truncated = 0
+    with open(output_path, "w", encoding="utf-8") as f:
+        for job_id, title, company, salary, desc in jobs:
+            messages, meta = build_prompt(config["model_name"], profile_text, title, company, salary, desc)
+            truncated += meta["jd_truncated"]
+            body = eval_request_kwargs(config["model_name"], messages, attempt=0, mode=mode)
+            # 离线批处理没有 SDK 的 extra_body，直接并入请求体
+            body.update(body.pop("extra_body", {}))
+            f.write(json.dumps({
+                "custom_id": f"{table_name}:{job_id}:{args.model}:{version}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body
+            }, ensure_ascii=False) + "\n")
+
+    print(f"✅ 已导出 {len(jobs)} 个待评估请求至 {output_path} (模型 {config['model_name']}，结构化模式 {mode}，JD 截断 {truncated} 个)。")
+    if jobs:
+        print(f"   示例: vllm run_batch -i {output_path} -o results.jsonl --model {config['model_name']}")
+    return len(jobs)
+
+def import_batch(conn, input_path, dry_run=False):
+    """
+    解析 batch 结果 JSONL，用与 evaluate_job 相同的 JSON 提取逻辑得到分数与理由，
+    按 custom_id 写回对应表的模型列 (含导出时的 prompt 版本)，全部在一个事务中提交。
+    """
+    import psycopg2.extras
+
+    groups = {}
+    stats = {"lines": 0, "ok": 0, "api_errors": 0, "parse_errors": 0, "unknown": 0, "bad_lines": [],
+             "prompt_tokens": 0, "completion_tokens": 0}
+    with open(input_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            stats["lines"] += 1
+            # 截断或损坏的行 (如供应商中途断流) 跳过并记录行号，不中断整批回灌
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                stats["bad_lines"].append(line_no)
+                continue
+            if not isinstance(record, dict):
+                stats["bad_lines"].append(line_no)
+                continue
+            try:
+                # 旧文件的 custom_id 没有版本段，回灌后按过期处理
+                parts = record["custom_id"].split(":")
+                table_name, job_id, model_key = parts[:3]
+                version = parts[3] if len(parts) == 4 else None
+                job_id = int(job_id)
+            except (KeyError, ValueError):
+                stats["unknown"] += 1
+                continue
+            if model_key not in MODEL_COLUMNS or table_name not in ("liepin_jobs", "boss_jobs"):
+                stats["unknown"] += 1
+                continue
+
+            response = record.get("response") or {}
+            body = response.get("body") or {}
+            if record.get("error") or response.get("status_code", 200) != 200 or not body.get("choices"):
+                stats["api_errors"] += 1
+                continue
+
+            usage = body.get("usage") or {}
+            stats["prompt_tokens"] += usage.get("prompt_tokens") or 0
+            stats["completion_tokens"] += usage.get("completion_tokens") or 0
+            try:
+                content = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                stats["bad_lines"].append(line_no)
+                continue
+            try:
+                score, reason = parse_evaluation_content(content)
+            except Exception:
+                stats["parse_errors"] += 1
+                continue
+            if score is None:
+                stats["parse_errors"] += 1
+                continue
+            groups.setdefault((table_name, model_key), []).append((score, reason, version, job_id))
+            stats["ok"] += 1
+
+    if dry_run:
+        print(f"[DRY RUN] Would write {stats['ok']} batch results.")
+    elif groups:
+        for table_name in {table_name for table_name, _ in groups}:
+            ensure_version_columns(conn, table_name)
+        cur = conn.cursor()
+        try:
+            for (table_name, model_key), rows in groups.items():
+                config = MODEL_COLUMNS[model_key]
+                psycopg2.extras.execute_batch(
+                    cur,
+                    f"UPDATE {table_name} SET {config['score_col']} = %s, {config['rationale_col']} = %s, "
+                    f"{config['version_col']} = %s WHERE id = %s",
+                    rows, page_size=500
+                )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+    print("\n================= 批量回灌报告 ==================")
+    print(f"✅ {'(模拟)' if dry_run else ''}写入 {stats['ok']}/{stats['lines']} 条结果。")
+    for (table_name, model_key), rows in groups.items():
+        print(f"   - {table_name} [{model_key}]: {len(rows)} 条")
+    print(f"⚠️  接口错误 {stats['api_errors']} | JSON 解析失败 {stats['parse_errors']} | 无法识别 custom_id {stats['unknown']}")
+    if stats["bad_lines"]:
+        shown = ", ".join(str(n) for n in stats["bad_lines"][:10])
+        more = " ..." if len(stats["bad_lines"]) > 10 else ""
+        print(f"⚠️  跳过损坏行 {len(stats['bad_lines'])} 行 (行号 {shown}{more})")
+    if stats["ok"]:
+        print(f"📏 Tokens: prompt {stats['prompt_tokens']} | completion {stats['completion_tokens']}")
+    print("=================================================\n")
+    stats["tables"] = sorted({table_name for table_name, _ in groups})
+    return stats
+
+def run_worker(args, conn, client, config, profile_text, table_name):
+    """
+    租约队列模式：多个实例可同时运行，按批认领、评估、提交，互不重复。
+    """
+    import socket
+    from .eval_queue import LeaseQueue, ensure_lease_table
+
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    ensure_lease_table(conn)
+    queue_where, queue_order, queue_params = pending_queue_clauses(args, alias="j.")
+    lease_queue = LeaseQueue(conn, settings.db_config(), table_name, args.model, config["score_col"], worker_id,
+                             lease_ttl=args.lease_ttl, extra_where=queue_where, order_by=queue_order,
+                             extra_params=queue_params)
+    lease_queue.start_heartbeat()
+
+    version = prompt_version(config, profile_text)
+    print(f"\n[Worker {worker_id}] 使用模型: {args.model} ({config['model_name']})，队列表: {table_name}")
+    success_count = 0
+    static_count = 0
+    failed_count = 0
+    prompt_stats = new_run_stats()
+    try:
+        while True:
+            jobs = lease_queue.claim(args.claim_batch)
+            if not jobs:
+                if not args.follow:
+                    break
+                time.sleep(args.poll_interval)
+                continue
+
+            cur = conn.cursor()
+            for job_id, title, company, salary, desc in jobs:
+                # 全表静态同步交给单机模式，这里只对认领到的岗位做同样的判定
+                static_score, static_reason = static_filter_decision(title, desc)
+                if static_score is not None:
+                    for model_config in MODEL_COLUMNS.values():
+                        save_evaluation(cur, table_name, model_config, job_id, static_score, static_reason)
+                    lease_queue.complete(job_id)
+                    static_count += 1
+                    continue
+
+                print(f"[{worker_id}] 正在评估 [{job_id}] {company} - {title} ...")
+                score, reason = evaluate_job(client, config["model_name"], profile_text, title, company, salary, desc, stats=prompt_stats,
+                                             job_id=job_id, table_name=table_name)
+                if score is None or reason is None:
+                    print(" -> 失败，释放租约。")
+                    lease_queue.release(job_id)
+                    failed_count += 1
+                    continue
+
+                try:
+                    save_evaluation(cur, table_name, config, job_id, score, reason, version=version)
+                    lease_queue.complete(job_id)
+                    success_count += 1
+                    print(f" -> 分数: {score}")
+                except Exception as e:
+                    conn.rollback()
+                    lease_queue.release(job_id)
+                    failed_count += 1
+                    print(f" -> 更新失败: {e}")
+            cur.close()
+    except KeyboardInterrupt:
+        print(f"\n[Worker {worker_id}] 收到中断，未完成的租约将在 {args.lease_ttl}s 内过期并被其它节点接管。")
+    finally:
+        lease_queue.stop_heartbeat()
+
+    print("\n================= 运行报告 ==================")
+    print(f"✅ [Worker {worker_id}] 后置静态过滤: {static_count} 个岗位。")
+    print(f"✅ [{args.model}] 评估: 处理了 {success_count} 个新岗位，失败释放 {failed_count} 个。")
+    print_llm_report(prompt_stats, baseline_retry_rate=args.baseline_retry_rate)
+    print(client.report())
+    print("=============================================\n")
+
+def numeric_score(value):
+    """分数转为 float，NULL 或无法解析时返回 None。"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def run_cascade(args, conn, profile_text, table_name, batch_limit, dry_run=False):
+    """
+    级联评分：先用快模型给所有待评岗位打分，只有落在升级线附近或以上的岗位才交给强模型。
+    未升级的岗位在强模型列写入快模型分数与 CASCADE_SKIP_PREFIX 标记，避免被下次全量评估重复计费；
+    按分数读取强模型列时用 settings.own_score_sql 排除这些行。
+    """
+    fast_config = MODEL_CONFIGS[args.fast_model]
+    strong_config = MODEL_CONFIGS[args.model]
+    fast_client = get_llm_client(args.fast_model)
+    strong_client = get_llm_client(args.model)
+    escalate_line = args.escalate_threshold - args.escalate_band
+    fast_version = prompt_version(fast_config, profile_text)
+    strong_version = prompt_version(strong_config, profile_text)
+
+    stats = {"total": 0, "fast_calls": 0, "fast_reused": 0, "escalated": 0, "skipped": 0, "failed": 0,
+             "strong_high": 0, "audited": 0, "audit_missed": [],
+             "fast_prompt": new_run_stats(), "strong_prompt": new_run_stats(),
+             "fast_client": fast_client, "strong_client": strong_client}
+    if not preflight_llm_client(fast_client, fast_config) or not preflight_llm_client(strong_client, strong_config):
+        return stats
+
+    queue_where, queue_order, queue_params = pending_queue_clauses(args)
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT id, title, company, salary, job_description, {fast_config['score_col']}
+        FROM {table_name}
+        WHERE job_description IS NOT NULL AND {strong_config['score_col']} IS NULL {queue_where}
+        ORDER BY {queue_order} LIMIT %(limit)s
+    """, {**queue_params, "limit": batch_limit})
+    jobs = cur.fetchall()
+
+    if not jobs:
+        print(f"目前没有待 [{args.model}] 评估的新鲜职位。")
+        cur.close()
+        return stats
+
+    print(f"\n级联模式: {args.fast_model} ({fast_config['model_name']}) -> {args.model} ({strong_config['model_name']})，升级线 {escalate_line} 分")
+    if dry_run: print("[DRY RUN MODE] Changes will not be saved to database.")
+    print(f"找到本批次 {len(jobs)} 个待评估职位...")
+
+    def persist(model_config, job_id, score, reason, version=None):
+        if dry_run:
+            return
+        try:
+            save_evaluation(cur, table_name, model_config, job_id, score, reason, version=version)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f" -> 更新失败: {e}")
+
+    skipped_jobs = []
+    for job_id, title, company, salary, desc, fast_score in jobs:
+        stats["total"] += 1
+
+        # 1. 快模型初筛 (已有快模型分数则直接复用)
+        if fast_score is None:
+            print(f"[{args.fast_model}] 正在初筛 [{job_id}] {company} - {title} ...")
+            fast_score, fast_reason = evaluate_job(fast_client, fast_config["model_name"], profile_text, title, company, salary, desc,
+                                                   stats=stats["fast_prompt"], job_id=job_id, table_name=table_name)
+            if fast_score is None or fast_reason is None:
+                print(" -> 失败，跳过。")
+                stats["failed"] += 1
+                continue
+            stats["fast_calls"] += 1
+            persist(fast_config, job_id, fast_score, fast_reason, version=fast_version)
+        else:
+            stats["fast_reused"] += 1
+
+        fast_value = numeric_score(fast_score)
+        if fast_value is None:
+            print(f" -> [{job_id}] 快模型分数 {fast_score!r} 无法解析，跳过。")
+            stats["failed"] += 1
+            continue
+
+        # 2. 只有有希望的岗位才升级给强模型
+        if fast_value >= escalate_line:
+            print(f" -> 初筛 {fast_score} 分，升级至 [{args.model}] ...")
+            score, reason = evaluate_job(strong_client, strong_config["model_name"], profile_text, title, company, salary, desc,
+                                         stats=stats["strong_prompt"], job_id=job_id, table_name=table_name)
+            if score is None or reason is None:
+                print(" -> 失败，跳过。")
+                stats["failed"] += 1
+                continue
+            stats["escalated"] += 1
+            if (numeric_score(score) or 0) >= args.escalate_threshold:
+                stats["strong_high"] += 1
+            print(f" -> 分数: {score}")
+            persist(strong_config, job_id, score, reason, version=strong_version)
+        else:
+            print(f" -> 初筛 {fast_score} 分，低于升级线，不调用 [{args.model}]。")
+            stats["skipped"] += 1
+            skipped_jobs.append((job_id, title, company, salary, desc, fast_score))
+            persist(strong_config, job_id, fast_score,
+                    f"{CASCADE_SKIP_PREFIX}{args.fast_model} 初筛 {fast_score} 分，低于升级线 {escalate_line} 分，未调用 {args.model}")
+
+    # 3. 抽样审计：强模型复核部分未升级岗位，检验是否漏掉高分岗位
+    if args.audit_sample > 0 and skipped_jobs:
+        sample = random.sample(skipped_jobs, min(args.audit_sample, len(skipped_jobs)))
+        print(f"\n抽样审计: 用 [{args.model}] 复核 {len(sample)} 个未升级岗位...")
+        for job_id, title, company, salary, desc, fast_score in sample:
+            score, reason = evaluate_job(strong_client, strong_config["model_name"], profile_text, title, company, salary, desc,
+                                         stats=stats["strong_prompt"], job_id=job_id, table_name=table_name)
+            if score is None or reason is None:
+                continue
+            stats["audited"] += 1
+            if (numeric_score(score) or 0) >= args.escalate_threshold:
+                stats["audit_missed"].append((job_id, title, fast_score, score))
+            # 审计结果是真实的强模型分数，覆盖级联跳过标记
+            persist(strong_config, job_id, score, reason, version=strong_version)
+
+    cur.close()
+    return stats
+
+def print_cascade_report(args, stats):
+    scored = stats["escalated"] + stats["skipped"]
+    rate = stats["escalated"] / scored * 100 if scored else 0.0
+    print(f"✅ [{args.fast_model}] 初筛: 新调用 {stats['fast_calls']} 次，复用已有分数 {stats['fast_reused']} 个。")
+    print(f"✅ [{args.model}] 升级: {stats['escalated']}/{scored} 个岗位 (升级率 {rate:.1f}%)，"
+          f"其中 {stats['strong_high']} 个 ≥ {args.escalate_threshold} 分；节省强模型调用 {stats['skipped']} 次。")
+    if stats["failed"]:
+        print(f"⚠️  失败跳过: {stats['failed']} 个岗位。")
+    for model_key, key in [(args.fast_model, "fast_prompt"), (args.model, "strong_prompt")]:
+        print_llm_report(stats[key], prefix=f"[{model_key}] ", baseline_retry_rate=args.baseline_retry_rate)
+    for model_key, key in [(args.fast_model, "fast_client"), (args.model, "strong_client")]:
+        print(f"[{model_key}] {stats[key].report()}")
+    if stats["audited"]:
+        missed = stats["audit_missed"]
+        print(f"🔍 抽样审计: 复核 {stats['audited']} 个未升级岗位，强模型 ≥ {args.escalate_threshold} 分的漏检 {len(missed)} 个。")
+        for job_id, title, fast_score, score in missed:
+            print(f"   - [{job_id}] {title}: {args.fast_model} {fast_score} -> {args.model} {score}")
+
+def score_jobs(args, conn, cur, client, config, profile_text, table_name, jobs, prompt_stats, version, dry_run=False, label="评估"):
+    """
+    并发调用 LLM 为一批岗位打分，完成一个提交一个，返回成功数。
+    重评失败时保留旧分数，下次运行仍会被选中。
+    """
+    success_count = 0
+
+    def evaluate_one(job_id, title, company, salary, desc):
+        print(f"正在{label} [{job_id}] {company} - {title} ...")
+        return evaluate_job(client, config["model_name"], profile_text, title, company, salary, desc, stats=prompt_stats,
+                            job_id=job_id, table_name=table_name)
+
+    # 在途请求数由 client 的 AIMD 限流器按延迟与 429/5xx 动态调节，--concurrency 为上限
+    executor = ThreadPoolExecutor(max_workers=args.concurrency)
+    futures = {executor.submit(evaluate_one, *job): job[0] for job in jobs}
+    for future in as_completed(futures):
+        job_id = futures[future]
+        try:
+            score, reason = future.result()
+        except Exception as e:
+            # 单个岗位的意外异常不影响同批其它岗位的结果
+            print(f" -> [{job_id}] 评估异常: {e}")
+            prompt_stats["crashed_jobs"] += 1
+            score, reason = None, None
+
+        if score is not None and reason is not None:
+            print(f" -> [{job_id}] 分数: {score}")
+            if not dry_run:
+                try:
+                    save_evaluation(cur, table_name, config, job_id, score, reason, version=version)
+                    with profiling.stage("write"):
+                        conn.commit()
+                    success_count += 1
+                except Exception as e:
+                    conn.rollback()
+                    print(f" -> 更新失败: {e}")
+            else:
+                success_count += 1
+        else:
+            print(f" -> [{job_id}] 失败，跳过。")
+            prompt_stats["failed_jobs"] += 1
+    executor.shutdown()
+    return success_count
+
 def main():
     parser = argparse.ArgumentParser(description="Evaluate jobs using local LLM")
     parser.add_argument("--dry-run", action="store_true", help="Run without writing to database")
     parser.add_argument("--test-run", type=int, default=0, help="Evaluate N jobs for testing (implies --dry-run)")
     parser.add_argument("--model", type=str, default="glm5", choices=["gemma3", "qwen3_8b", "glm5"], help="Select evaluation model")
     parser.add_argument("--dataset", type=str, choices=["liepin", "boss"], default="liepin", help="Select which job dataset to process")
+    parser.add_argument("--worker", action="store_true", help="Work-queue mode: claim jobs via leases so several evaluators can run in parallel")
+    parser.add_argument("--worker-id", type=str, default=None, help="Worker identity for leases (default: hostname-pid)")
+    parser.add_argument("--claim-batch", type=int, default=5, help="Jobs claimed per lease round in --worker mode")
+    parser.add_argument("--lease-ttl", type=int, default=300, help="Lease lifetime in seconds; renewed every ttl/3 while evaluating")
+    parser.add_argument("--follow", action="store_true", help="In --worker mode, keep polling for new work instead of exiting when the queue is empty")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="Seconds between polls in --follow mode")
+    parser.add_argument("--cascade", action="store_true", help="Cascade mode: score with --fast-model first, escalate only promising jobs to --model")
+    parser.add_argument("--fast-model", type=str, default="qwen3_8b", choices=["gemma3", "qwen3_8b", "glm5"], help="Cheap first-pass model for --cascade")
+    parser.add_argument("--escalate-threshold", type=int, default=70, help="Score line the strong model decides on (dashboard threshold, default 70)")
+    parser.add_argument("--escalate-band", type=int, default=10, help="Also escalate fast scores within this many points below --escalate-threshold")
+    parser.add_argument("--structured", type=str, default=None, choices=STRUCTURED_MODES, help="Structured-output mode (default: *_STRUCTURED_OUTPUT env or auto)")
+    parser.add_argument("--baseline-retry-rate", type=float, default=None, help="JSON retries per job without structured output, for the savings estimate")
+    parser.add_argument("--export-batch", type=str, default=None, metavar="OUT.jsonl", help="Write pending jobs as OpenAI-batch / vllm run_batch requests instead of calling the LLM")
+    parser.add_argument("--import-batch", type=str, default=None, metavar="RESULTS.jsonl", help="Bulk-write scores from a batch results file")
+    parser.add_argument("--concurrency", type=int, default=1, help="Max in-flight LLM requests; the actual limit adapts (AIMD) to latency and 429/5xx")
+    parser.add_argument("--rank", action="store_true", help="Order the LLM queue by local TF-IDF relevance to the profile (see relevance_ranker.py)")
+    parser.add_argument("--min-relevance", type=float, default=None, help="With --rank, skip jobs whose relevance is below this floor (0~1)")
+    parser.add_argument("--audit-sample", type=int, default=0, help="In --cascade mode, re-score N non-escalated jobs with the strong model to measure misses")
+    parser.add_argument("--rescore-stale", action="store_true", help="After new jobs, re-score rows whose prompt/profile/model version changed (highest score, most active first)")
+    parser.add_argument("--rescore-budget", type=int, default=50, help="Max stale rows re-scored per run with --rescore-stale")
+    parser.add_argument("--adopt-current-version", action="store_true", help="One-shot: stamp existing scores that have no version with the current prompt version, then exit")
+    profiling.add_profile_args(parser)
     args = parser.parse_args()
 
+    if args.worker and (args.dry_run or args.test_run > 0):
+        parser.error("--worker 模式会写入租约与分数，不支持 --dry-run / --test-run")
+    if args.cascade and args.fast_model == args.model:
+        parser.error("--cascade 需要 --fast-model 与 --model 不同")
+    if args.rescore_stale and (args.worker or args.cascade or args.export_batch or args.import_batch):
+        parser.error("--rescore-stale 只用于单机直接评估模式")
+    if args.adopt_current_version and (args.worker or args.cascade or args.export_batch or args.import_batch or args.rescore_stale):
+        parser.error("--adopt-current-version 是一次性操作，不能与其它运行模式同时使用")
+
+    with profiling.session(args):
+        run_evaluator(args)
+
+def run_evaluator(args):
+    global STRUCTURED_OVERRIDE
+    STRUCTURED_OVERRIDE = args.structured
+
     # Aliasing --test-run logic to use dry-run internally
     dry_run = args.dry_run or args.test_run > 0
     batch_limit = args.test_run if args.test_run > 0 else 500
     table_name = f"{args.dataset}_jobs"
 
-    config = MODEL_CONFIGS[args.model]
+    from .job_stats import refresh_quietly
 
-    # 1. From config.json (Now in identity.profiles)
-    config_paths = USER_CONFIG.get("identity", {}).get("profiles", [])
-    
-    # Combine (deduplicate while preserving order)
-    all_paths = []
-    seen = set()
-    for p in config_paths:
-        abs_p = os.path.expanduser(p)
-        if abs_p not in seen:
-            all_paths.append(abs_p)
-            seen.add(abs_p)
+    if args.import_batch:
+        conn = get_db_connection()
+        try:
+            stats = import_batch(conn, args.import_batch, dry_run=dry_run)
+            if not dry_run:
+                for table in stats["tables"]:
+                    refresh_quietly(conn, table)
+        finally:
+            conn.close()
+        return
 
-    profile_text = ""
-    for p in all_paths:
-        if os.path.exists(p):
-            profile_text += f"\n--- {os.path.basename(p)} ---\n"
-            profile_text += load_profile(p)
-            
+    profile_text = collect_profile_text()
     if not profile_text.strip():
         print("没有找到简历文件。")
         return
-    
-    profile_text = profile_text[:15000]
 
-    client = OpenAI(api_key=config["api_key"], base_url=config["api_base"])
+    config = MODEL_CONFIGS[args.model]
+    if args.adopt_current_version:
+        conn = get_db_connection()
+        try:
+            ensure_version_columns(conn, table_name)
+            version = prompt_version(config, profile_text)
+            adopted = adopt_current_version(conn, table_name, config, version, dry_run=dry_run)
+            print(f"✅ [{args.model}] {'(模拟)' if dry_run else ''}把 {adopted} 个无版本号的已有分数认作当前版本 {version}。")
+        finally:
+            conn.close()
+        return
+
+    client = get_llm_client(args.model, max_concurrency=args.concurrency)
+    if not args.cascade and not args.export_batch and not preflight_llm_client(client, config):
+        return
     conn = get_db_connection()
+    ensure_version_columns(conn, table_name)
+    if not dry_run and not args.export_batch:
+        start_recording(settings.db_config(), "evaluator")
+
+    if args.rank:
+        from .relevance_ranker import refresh_relevance
+        ranked = refresh_relevance(conn, table_name, profile_text, dry_run=dry_run)
+        print(f"[Ranker] {'(模拟)' if dry_run else ''}补算了 {ranked} 个岗位的相关度。")
+
+    if args.worker:
+        try:
+            run_worker(args, conn, client, config, profile_text, table_name)
+            refresh_quietly(conn, table_name)
+        finally:
+            stop_recording()
+            conn.close()
+        return
 
     try:
         # 1. 同步全量静态过滤
         static_updates = apply_static_filters_globally(conn, dry_run=dry_run, table_name=table_name)
         
+        if args.export_batch:
+            export_batch(conn, args, config, profile_text, table_name, args.export_batch,
+                         batch_limit=args.test_run if args.test_run > 0 else None)
+            return
+
+        if args.cascade:
+            cascade_stats = run_cascade(args, conn, profile_text, table_name, batch_limit, dry_run=dry_run)
+            if not dry_run:
+                refresh_quietly(conn, table_name)
+            print("\n================= 运行报告 ==================")
+            print(f"✅ 后置静态同步: {'(模拟)' if dry_run else ''}更新了 {len(static_updates)} 个岗位。")
+            print_cascade_report(args, cascade_stats)
+            print("=============================================\n")
+            return
+
         cur = conn.cursor()
         # 2. 查找所选模型尚未评估的岗位
         score_col = config["score_col"]
-        cur.execute(f"""
-            SELECT id, title, company, salary, job_description 
-            FROM {table_name}
-            WHERE job_description IS NOT NULL AND {score_col} IS NULL 
-            ORDER BY fetched_at DESC LIMIT %s
-        """, (batch_limit,))
+        queue_where, queue_order, queue_params = pending_queue_clauses(args)
+        with profiling.stage("query"):
+            cur.execute(f"""
+                SELECT id, title, company, salary, job_description 
+                FROM {table_name}
+                WHERE job_description IS NOT NULL AND {score_col} IS NULL {queue_where}
+                ORDER BY {queue_order} LIMIT %(limit)s
+            """, {**queue_params, "limit": batch_limit})
         
-        jobs = cur.fetchall()
+        with profiling.stage("fetch"):
+            jobs = cur.fetchall()
         
+        prompt_stats = new_run_stats()
+        version = prompt_version(config, profile_text)
         success_count = 0
         if not jobs:
             print(f"目前没有待 [{args.model}] 评估的新鲜职位。")
@@ -297,35 +1093,35 @@ def main():
             print(f"\n使用模型: {args.model} ({config['model_name']})")
             if dry_run: print("[DRY RUN MODE] Changes will not be saved to database.")
             print(f"找到本批次 {len(jobs)} 个待评估职位...")
-            
-            for job_id, title, company, salary, desc in jobs:
-                print(f"正在评估 [{job_id}] {company} - {title} ...")
-                short_desc = desc[:3000] if desc else ""
-                score, reason = evaluate_job(client, config["model_name"], profile_text, title, company, salary, short_desc)
-                
-                if score is not None and reason is not None:
-                    print(f" -> 分数: {score}")
-                    if not dry_run:
-                        try:
-                            cur.execute(f"UPDATE {table_name} SET {score_col} = %s, {config['rationale_col']} = %s WHERE id = %s", (score, reason, job_id))
-                            conn.commit()
-                            success_count += 1
-                        except Exception as e:
-                            conn.rollback()
-                            print(f" -> 更新失败: {e}")
-                    else:
-                        success_count += 1
-                else:
-                    print(" -> 失败，跳过。")
+            success_count = score_jobs(args, conn, cur, client, config, profile_text, table_name, jobs,
+                                       prompt_stats, version, dry_run=dry_run)
+
+        # 3. 新岗位处理完后，用剩余预算按优先级重评 prompt/档案/模型变更后过期的分数
+        rescored, stale_jobs, stale_left = 0, [], 0
+        if args.rescore_stale:
+            stale_jobs = fetch_stale_jobs(conn, table_name, config, version, args.rescore_budget)
+            if stale_jobs:
+                print(f"\n找到 {len(stale_jobs)} 个过期分数 (当前版本 {version})，按分数与活跃度优先重评...")
+                rescored = score_jobs(args, conn, cur, client, config, profile_text, table_name, stale_jobs,
+                                      prompt_stats, version, dry_run=dry_run, label="重评")
+            stale_left = count_stale_jobs(conn, table_name, config, version)
 
         cur.close()
+        if not dry_run:
+            with profiling.stage("write"):
+                refresh_quietly(conn, table_name)
 
         print("\n================= 运行报告 ==================")
         print(f"✅ 后置静态同步: {'(模拟)' if dry_run else ''}更新了 {len(static_updates)} 个岗位。")
         print(f"✅ [{args.model}] 评估: {'(模拟)' if dry_run else ''}处理了 {success_count} 个新岗位。")
+        if args.rescore_stale:
+            print(f"♻️  [{args.model}] 重评: {'(模拟)' if dry_run else ''}{rescored}/{len(stale_jobs)} 个过期分数，剩余过期 {stale_left} 个。")
+        print_llm_report(prompt_stats, baseline_retry_rate=args.baseline_retry_rate)
+        print(client.report())
         print("=============================================\n")
 
     finally:
+        stop_recording()
         conn.close()
 
 if __name__ == "__main__":
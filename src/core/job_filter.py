@@ -1,158 +1,185 @@
 #!/usr/bin/env python3
+from . import profiling
+from . import settings
 import psycopg2
-import json
-import os
-
-# Load environment variables if available
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
-
-def get_env_strict(key):
-    val = os.getenv(key)
-    if val is None:
-        raise EnvironmentError(f"Missing required environment variable: {key}")
-    return val
-
-# Load user config
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "config.json")
-with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-    USER_CONFIG = json.load(f)
-
-BLACK_KEYWORDS = USER_CONFIG.get("strategy", {}).get("filtration", {}).get("black_keywords", [])
-MIN_SALARY = USER_CONFIG.get("strategy", {}).get("filtration", {}).get("min_salary", 0)
-TARGET_CITIES = USER_CONFIG.get("strategy", {}).get("filtration", {}).get("target_cities", [])
-
-def is_low_salary(salary_str):
+import re
+
+_SALARY_K_RE = re.compile(r'(\d+)-(\d+)k')
+_SALARY_QIAN_RE = re.compile(r'(\d+)-(\d+)千')
+
+def _compile_filter_rules(config):
+    """config.json 的 strategy.filtration 预处理结果，随 config.json 变化重建。"""
+    filtration = config.get("strategy", {}).get("filtration", {})
+    keywords = [(w.lower(), w) for w in filtration.get("black_keywords", []) if w]
+    return {
+        "black_keywords": keywords,
+        # 先用一条正则判断是否命中任意黑名单词，绝大多数放行的岗位无需逐词比较
+        "black_re": re.compile("|".join(re.escape(lower) for lower, _ in keywords)) if keywords else None,
+        "min_salary": filtration.get("min_salary", 0),
+        "target_cities": filtration.get("target_cities", []),
+    }
+
+def filter_rules():
+    return settings.compiled(_compile_filter_rules)
+
+def is_low_salary(salary_str, rules=None):
     """
     判断薪资是否极低。 
     """
     if not salary_str or salary_str == '面议':
         return False
-    
-    import re
+    min_salary = (rules or filter_rules())["min_salary"]
+
     # 例如： "5-8k" -> matches "5", "8"
-    match = re.search(r'(\d+)-(\d+)k', salary_str.lower())
+    match = _SALARY_K_RE.search(salary_str.lower())
     if match:
         high_end = int(match.group(2))
-        return high_end < MIN_SALARY
+        return high_end < min_salary
     
-    match_2 = re.search(r'(\d+)-(\d+)千', salary_str)
+    match_2 = _SALARY_QIAN_RE.search(salary_str)
     if match_2:
         high_end = int(match_2.group(2))
-        return high_end < MIN_SALARY
+        return high_end < min_salary
 
     return False
 
-# Database configuration
-DB_CONFIG = {
-    "dbname": get_env_strict("DB_NAME"),
-    "user": get_env_strict("DB_USER"),
-    "password": os.getenv("DB_PASSWORD", ""), # Password remains optional
-    "host": get_env_strict("DB_HOST"),
-    "port": get_env_strict("DB_PORT")
-}
-
-def contains_black_keyword(title, salary_str=""):
+def contains_black_keyword(title, salary_str="", rules=None):
+    rules = rules or filter_rules()
     combined_text = (title + " " + (salary_str or "")).lower()
-    for w in BLACK_KEYWORDS:
-        if w.lower() in combined_text:
+    if rules["black_re"] is None or not rules["black_re"].search(combined_text):
+        return False, None
+    # 命中时按配置顺序返回第一个黑名单词，与逐词判断的结果一致
+    for lower, w in rules["black_keywords"]:
+        if lower in combined_text:
             return True, w
     return False, None
 
+def classify_job(title, salary, location, rules=None):
+    """
+    单条岗位的前置规则判定。返回 (reject_reason, reason_key)，放行时均为 None。
+    整表循环时可传入 filter_rules() 的结果，省去逐行取缓存。
+    """
+    rules = rules or filter_rules()
+    # 1. 查名字和薪资标签黑名单
+    has_black_kw, kw = contains_black_keyword(title or "", salary, rules=rules)
+    if has_black_kw:
+        return f"[FILTERED: KEYWORD] Rule Pre-filtered: Trivial keyword ({kw})", "KEYWORD"
+
+    # 2. 查薪资是否极其离谱
+    if is_low_salary(salary, rules=rules):
+        return f"[FILTERED: LOW_SALARY] Rule Pre-filtered: Salary too low ({salary})", "LOW_SALARY"
+
+    # 3. 查工作地点是否明确不在目标城市列表
+    if location and not any(k in location for k in rules["target_cities"]):
+        return f"[FILTERED: LOCATION] Rule Pre-filtered: Excluded Location ({location})", "LOCATION"
+
+    return None, None
+
+def mark_filtered(cur, table_name, job_id, reject_reason):
+    cur.execute(f"""
+        UPDATE {table_name}
+        SET job_description = %s, 
+            match_score = 0, rationale = '前置规则过滤',
+            match_score_qwen3_8b = 0, rationale_qwen3_8b = '前置规则过滤',
+            match_score_glm5 = 0, rationale_glm5 = '前置规则过滤'
+        WHERE id = %s
+    """, (reject_reason, job_id))
+
+def restore_filtered(cur, table_name, job_id):
+    cur.execute(f"""
+        UPDATE {table_name}
+        SET job_description = NULL, 
+            match_score = NULL, rationale = NULL,
+            match_score_qwen3_8b = NULL, rationale_qwen3_8b = NULL,
+            match_score_glm5 = NULL, rationale_glm5 = NULL
+        WHERE id = %s
+    """, (job_id,))
+
+def filter_table(conn, table_name, dry_run=False):
+    """
+    对整表做一次前置规则回溯过滤。返回各类命中计数。
+    """
+    cur = conn.cursor()
+    
+    # 捞出全库所有岗位进行统一回溯过滤
+    with profiling.stage("query"):
+        cur.execute(f"""
+            SELECT id, title, company, salary, job_description, location 
+            FROM {table_name}
+        """)
+    with profiling.stage("fetch"):
+        jobs = cur.fetchall()
+    print(f"找到 {len(jobs)} 个岗位，开始全局极速前置过滤(包含已抓取记录)..." + (" [DRY RUN]" if dry_run else ""))
+    
+    counts = {"total": len(jobs), "filtered": 0, "LOW_SALARY": 0, "KEYWORD": 0, "LOCATION": 0, "restored": 0}
+    
+    # 逐行循环整体计入 compute，嵌套的写入单独计入 write，避免逐行计时的开销
+    rules = filter_rules()
+    with profiling.stage("compute"):
+        for j_id, title, company, salary, job_desc, location in jobs:
+            reject_reason, reason_key = classify_job(title, salary, location, rules=rules)
+
+            # 执行拦截
+            if reject_reason:
+                counts[reason_key] += 1
+                if not dry_run:
+                    with profiling.stage("write"):
+                        mark_filtered(cur, table_name, j_id, reject_reason)
+                print(f"[-] 过滤: [{j_id}] {title} | {salary} -> {reject_reason}")
+                counts["filtered"] += 1
+            else:
+                # 放行：但如果之前被标记为 [FILTERED:]，则需要洗白重置为 NULL，以便后续正常爬取或打分
+                if job_desc and str(job_desc).startswith("[FILTERED:"):
+                    if not dry_run:
+                        with profiling.stage("write"):
+                            restore_filtered(cur, table_name, j_id)
+                    counts["restored"] += 1
+                    print(f"[+] 豁免洗白: [{j_id}] {title} 脱离黑名单，已重置为空白状态。")
+    cur.close()
+    return counts
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description="Filter jobs based on blocklist and target cities")
     parser.add_argument("--dry-run", action="store_true", help="Run without writing to database")
     parser.add_argument("--dataset", type=str, choices=["liepin", "boss"], default="liepin", help="Select which job dataset to process")
+    profiling.add_profile_args(parser)
     args = parser.parse_args()
 
+    with profiling.session(args):
+        run_filter(args)
+
+def run_filter(args):
     dry_run = args.dry_run
     table_name = f"{args.dataset}_jobs"
 
-    conn = psycopg2.connect(**DB_CONFIG)
+    conn = psycopg2.connect(**settings.db_config())
     conn.autocommit = True
-    cur = conn.cursor()
-    
-    # 捞出全库所有岗位进行统一回溯过滤
-    cur.execute(f"""
-        SELECT id, title, company, salary, job_description, location 
-        FROM {table_name}
-    """)
-    jobs = cur.fetchall()
-    print(f"找到 {len(jobs)} 个岗位，开始全局极速前置过滤(包含已抓取记录)..." + (" [DRY RUN]" if dry_run else ""))
-    
-    filtered_count = 0
-    salary_filtered = 0
-    keyword_filtered = 0
-    location_filtered = 0
-    restored_count = 0
-    
-    for j_id, title, company, salary, job_desc, location in jobs:
-        reject_reason = None
-        
-        # 1. 查名字和薪资标签黑名单
-        has_black_kw, kw = contains_black_keyword(title, salary)
-        if has_black_kw:
-            reject_reason = f"[FILTERED: KEYWORD] Rule Pre-filtered: Trivial keyword ({kw})"
-            keyword_filtered += 1
-            
-        # 2. 查薪资是否极其离谱
-        elif is_low_salary(salary):
-            reject_reason = f"[FILTERED: LOW_SALARY] Rule Pre-filtered: Salary too low ({salary})"
-            salary_filtered += 1
-            
-        # 3. 查工作地点是否明确不在目标城市列表
-        elif location and not any(k in location for k in TARGET_CITIES):
-            reject_reason = f"[FILTERED: LOCATION] Rule Pre-filtered: Excluded Location ({location})"
-            location_filtered += 1
-            
-        # 执行拦截
-        if reject_reason:
-            if not dry_run:
-                cur.execute(f"""
-                    UPDATE {table_name}
-                    SET job_description = %s, 
-                        match_score = 0, rationale = '前置规则过滤',
-                        match_score_qwen3_8b = 0, rationale_qwen3_8b = '前置规则过滤',
-                        match_score_glm5 = 0, rationale_glm5 = '前置规则过滤'
-                    WHERE id = %s
-                """, (reject_reason, j_id))
-            print(f"[-] 过滤: [{j_id}] {title} | {salary} -> {reject_reason}")
-            filtered_count += 1
-        else:
-            # 放行：但如果之前被标记为 [FILTERED:]，则需要洗白重置为 NULL，以便后续正常爬取或打分
-            if job_desc and str(job_desc).startswith("[FILTERED:"):
-                if not dry_run:
-                    cur.execute(f"""
-                        UPDATE {table_name}
-                        SET job_description = NULL, 
-                            match_score = NULL, rationale = NULL,
-                            match_score_qwen3_8b = NULL, rationale_qwen3_8b = NULL,
-                            match_score_glm5 = NULL, rationale_glm5 = NULL
-                        WHERE id = %s
-                    """, (j_id,))
-                restored_count += 1
-                print(f"[+] 豁免洗白: [{j_id}] {title} 脱离黑名单，已重置为空白状态。")
+
+    counts = filter_table(conn, table_name, dry_run=dry_run)
             
     print("=" * 40)
-    print(f"过滤完成！{' (模拟)' if dry_run else ''}共判定 {filtered_count} 个无效岗位。清洗恢复了 {restored_count} 个脱离黑名单的岗位。")
-    print(f" -> 因薪资过低命中: {salary_filtered}")
-    print(f" -> 因违禁词命中: {keyword_filtered}")
-    print(f" -> 因非北京地区命中: {location_filtered}")
-    
-    cur.execute(f"SELECT COUNT(*) FROM {table_name} WHERE job_description IS NULL")
-    remaining_count = cur.fetchone()[0]
+    print(f"过滤完成！{' (模拟)' if dry_run else ''}共判定 {counts['filtered']} 个无效岗位。清洗恢复了 {counts['restored']} 个脱离黑名单的岗位。")
+    print(f" -> 因薪资过低命中: {counts['LOW_SALARY']}")
+    print(f" -> 因违禁词命中: {counts['KEYWORD']}")
+    print(f" -> 因非北京地区命中: {counts['LOCATION']}")
     
-    cur.execute(f"SELECT COUNT(*) FROM {table_name} WHERE job_description IS NOT NULL AND job_description NOT LIKE '[FILTERED:%%'")
-    fetched_count = cur.fetchone()[0]
+    cur = conn.cursor()
+    with profiling.stage("query"):
+        cur.execute(f"SELECT COUNT(*) FROM {table_name} WHERE job_description IS NULL")
+        remaining_count = cur.fetchone()[0]
+        
+        cur.execute(f"SELECT COUNT(*) FROM {table_name} WHERE job_description IS NOT NULL AND job_description NOT LIKE '[FILTERED:%%'")
+        fetched_count = cur.fetchone()[0]
     
     print(f"\n✅ 进度报告: 当前数据库中还有 {remaining_count} 个优质岗位等待爬取正文。")
     print(f"✅ 进度报告: 当前数据库中已有 {fetched_count} 个优质岗位成功获取正文。")
     
     cur.close()
+    if not dry_run:
+        from .job_stats import refresh_quietly
+        with profiling.stage("write"):
+            refresh_quietly(conn, table_name)
     conn.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+岗位统计汇总表 job_stats。
+
+一次扫描整表，把状态、前置过滤原因、活跃度、聚类 × 活跃度、各模型分数直方图
+与模型间分差写成 (table_name, metric, bucket, value) 行。仪表盘的 /api/stats 与
+各 CLI 的运行报告直接读这张小表，不再扫原始岗位。
+job_filter / job_evaluator / pipeline_runner 在写入后调用 refresh_stats() 重算。
+"""
+import argparse
+import itertools
+
+from . import job_evaluator
+from . import obsidian_exporter
+
+STATS_TABLE = "job_stats"
+ACTIVITY_TIERS = ["1_HIGHLY_ACTIVE", "2_RECENTLY_ACTIVE", "3_UNKNOWN", "4_LONG_INACTIVE"]
+
+# 与 obsidian_exporter.categorize_activity 相同的分档
+ACTIVITY_SQL = r"""CASE
+    WHEN update_time IS NULL OR update_time = '' THEN '3_UNKNOWN'
+    WHEN update_time ~ '今日|本周|刚刚|小时' THEN '1_HIGHLY_ACTIVE'
+    WHEN update_time ~ '\d+天前' THEN CASE
+        WHEN substring(update_time from '(\d+)天前')::int <= 15 THEN '1_HIGHLY_ACTIVE'
+        WHEN substring(update_time from '(\d+)天前')::int <= 30 THEN '2_RECENTLY_ACTIVE'
+        ELSE '4_LONG_INACTIVE' END
+    WHEN update_time ~ '\d+月\d+日' THEN '2_RECENTLY_ACTIVE'
+    ELSE '3_UNKNOWN' END"""
+
+STATUS_SQL = """CASE
+    WHEN job_description IS NULL THEN 'pending_jd'
+    WHEN job_description LIKE '[FILTERED:%%' THEN 'filtered'
+    WHEN job_description LIKE '[UNAVAILABLE%%' OR job_description LIKE '[JD_UNAVAILABLE%%' THEN 'unavailable'
+    ELSE 'live' END"""
+
+def ensure_stats_table(conn):
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+            table_name   TEXT        NOT NULL,
+            metric       TEXT        NOT NULL,
+            bucket       TEXT        NOT NULL,
+            value        BIGINT      NOT NULL,
+            refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (table_name, metric, bucket)
+        )
+    """)
+    conn.commit()
+    cur.close()
+
+def cluster_sql(params):
+    """把 ui.categorization_rules 译成 CASE (首个命中的规则生效，同 smart_categorize)。"""
+    text = "lower(coalesce(title, '') || ' ' || coalesce(job_description, ''))"
+    branches = []
+    for i, (cluster_id, keywords) in enumerate(obsidian_exporter.categorization_rules()):
+        if not keywords:
+            continue
+        conds = []
+        for j, keyword in enumerate(keywords):
+            params[f"kw_{i}_{j}"] = keyword
+            conds.append(f"position(%(kw_{i}_{j})s in {text}) > 0")
+        params[f"cluster_{i}"] = cluster_id
+        branches.append(f"WHEN {' OR '.join(conds)} THEN %(cluster_{i})s")
+    if not branches:
+        return "'5_OTHER'"
+    return f"CASE {' '.join(branches)} ELSE '5_OTHER' END"
+
+def score_bucket_sql(config, params):
+    """live 岗位的分数分档：unscored / rule (规则分数) / 00..90 (每 10 分一档，100 计入 90)。"""
+    rules = []
+    for i, pattern in enumerate(job_evaluator.RULE_RATIONALE_PATTERNS):
+        params[f"rule_{i}"] = pattern
+        rules.append(f"{config['rationale_col']} LIKE %(rule_{i})s")
+    score = config["score_col"]
+    return f"""CASE
+        WHEN {score} IS NULL THEN 'unscored'
+        WHEN {' OR '.join(rules)} THEN 'rule'
+        ELSE lpad((least(floor({score} / 10.0), 9) * 10)::int::text, 2, '0') END"""
+
+def refresh_stats(conn, table_name):
+    """
+    单次扫描重算 table_name 的全部统计并整体替换，在一个事务内完成 (与连接的 autocommit 设置无关)。
+    返回写入的行数。
+    """
+    ensure_stats_table(conn)
+    params = {"table": table_name}
+    models = list(job_evaluator.MODEL_COLUMNS.items())
+    score_cols = ",\n                       ".join(
+        f"CASE WHEN status = 'live' THEN {score_bucket_sql(config, params)} END AS s_{key}, {config['score_col']} AS v_{key}"
+        for key, config in models
+    )
+
+    metrics = [
+        "('total', 'all')",
+        "('status', status)",
+        "('filter_reason', CASE WHEN status = 'filtered' THEN coalesce(substring(job_description from '^\\[FILTERED: *([A-Z_]+)'), 'OTHER') END)",
+        "('activity', CASE WHEN status = 'live' THEN activity END)",
+        "('cluster', CASE WHEN status = 'live' THEN cluster END)",
+        "('cluster_activity', CASE WHEN status = 'live' THEN cluster || '/' || activity END)",
+    ]
+    metrics += [f"('score:{key}', s_{key})" for key, _ in models]
+    # 两个模型都给出 LLM 分数时的分差分布
+    for (a, _), (b, _) in itertools.combinations(models, 2):
+        both = f"s_{a} NOT IN ('unscored', 'rule') AND s_{b} NOT IN ('unscored', 'rule')"
+        diff = f"abs(v_{a} - v_{b})"
+        metrics.append(f"""('agreement:{a}~{b}', CASE WHEN {both} THEN CASE
+            WHEN {diff} < 5 THEN '0-4' WHEN {diff} < 10 THEN '5-9' WHEN {diff} < 20 THEN '10-19' ELSE '20+' END END)""")
+
+    # 不依赖调用方的连接模式：autocommit 下 advisory_xact_lock 会立即释放，DELETE 与 INSERT 也会
+    # 分别提交 (读者可能看到空表)，因此临时关闭 autocommit，完成后恢复。
+    # 非 autocommit 连接不切换模式 (事务进行中时 psycopg2 不允许切换)，直接沿用当前事务
+    autocommit = conn.autocommit
+    if autocommit:
+        conn.autocommit = False
+    cur = conn.cursor()
+    try:
+        # 同一张表的并发刷新排队执行，避免删除与插入交错导致主键冲突
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (f"{STATS_TABLE}:{table_name}",))
+        cur.execute(f"DELETE FROM {STATS_TABLE} WHERE table_name = %(table)s", params)
+        cur.execute(f"""
+            WITH jobs AS (
+                SELECT t.*, {STATUS_SQL} AS status FROM {table_name} t
+            ), base AS (
+                SELECT job_description, status,
+                       {ACTIVITY_SQL} AS activity,
+                       {cluster_sql(params)} AS cluster,
+                       {score_cols}
+                FROM jobs
+            )
+            INSERT INTO {STATS_TABLE} (table_name, metric, bucket, value)
+            SELECT %(table)s, m.metric, m.bucket, count(*)
+            FROM base
+            CROSS JOIN LATERAL (VALUES {", ".join(metrics)}) AS m(metric, bucket)
+            WHERE m.bucket IS NOT NULL
+            GROUP BY m.metric, m.bucket
+        """, params)
+        written = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        if autocommit:
+            conn.autocommit = True
+    return written
+
+def refresh_quietly(conn, table_name):
+    """供各 CLI 写入后调用：统计刷新失败不影响主流程。"""
+    try:
+        refresh_stats(conn, table_name)
+        return True
+    except Exception as e:
+        print(f"⚠️  统计汇总表刷新失败: {e}")
+        return False
+
+def load_stats(conn, table_name):
+    """返回 ({metric: {bucket: value}}, refreshed_at)。"""
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT metric, bucket, value, refreshed_at FROM {STATS_TABLE}
+        WHERE table_name = %s ORDER BY metric, bucket
+    """, (table_name,))
+    stats, refreshed_at = {}, None
+    for metric, bucket, value, ts in cur.fetchall():
+        stats.setdefault(metric, {})[bucket] = value
+        refreshed_at = ts if refreshed_at is None else max(refreshed_at, ts)
+    cur.close()
+    return stats, refreshed_at
+
+def print_stats(table_name, stats, refreshed_at):
+    print(f"\n================= 统计汇总 ({table_name}, 刷新于 {refreshed_at}) ==================")
+    status = stats.get("status", {})
+    print(f"总数 {stats.get('total', {}).get('all', 0)} | 有效 {status.get('live', 0)} | 待抓正文 {status.get('pending_jd', 0)} | "
+          f"前置过滤 {status.get('filtered', 0)} | 已下架 {status.get('unavailable', 0)}")
+    if stats.get("filter_reason"):
+        print("过滤原因: " + ", ".join(f"{k} {v}" for k, v in stats["filter_reason"].items()))
+    if stats.get("activity"):
+        print("活跃度: " + ", ".join(f"{k} {stats['activity'].get(k, 0)}" for k in ACTIVITY_TIERS))
+    if stats.get("cluster"):
+        print("聚类: " + ", ".join(f"{k} {v}" for k, v in stats["cluster"].items()))
+    for key in job_evaluator.MODEL_COLUMNS:
+        hist = stats.get(f"score:{key}", {})
+        if not hist:
+            continue
+        bars = " ".join(f"{b}:{hist[b]}" for b in sorted(k for k in hist if k.isdigit()))
+        print(f"[{key}] 未评 {hist.get('unscored', 0)} | 规则 {hist.get('rule', 0)} | {bars}")
+    for metric, buckets in stats.items():
+        if metric.startswith("agreement:"):
+            total = sum(buckets.values())
+            close = buckets.get("0-4", 0) + buckets.get("5-9", 0)
+            print(f"{metric.split(':', 1)[1]}: {total} 对，分差 <10 占 {close / total * 100:.1f}%")
+    print("=" * 70 + "\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh and print the job_stats rollup")
+    parser.add_argument("--dataset", type=str, choices=["liepin", "boss"], default="liepin", help="Select which job dataset to process")
+    parser.add_argument("--no-refresh", action="store_true", help="Only print the last stored rollup")
+    args = parser.parse_args()
+
+    table_name = f"{args.dataset}_jobs"
+    conn = job_evaluator.get_db_connection()
+    try:
+        if not args.no_refresh:
+            written = refresh_stats(conn, table_name)
+            print(f"✅ 已重算 {table_name} 的统计汇总 ({written} 行)。")
+        print_stats(table_name, *load_stats(conn, table_name))
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
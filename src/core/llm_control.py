@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+LLM 端点的客户端侧流控。
+
+- AdaptiveLimiter: AIMD 调整在途请求上限，429/5xx/超时减半，正常返回缓慢加一。
+- CircuitBreaker: 连续失败后熔断，冷却期满用探针 (check_model_availability) 半开探测。
+- ControlledClient: 与 OpenAI 客户端同形的包装 (client.chat.completions.create)，
+  请求超过 p95 延迟仍未返回时向备用端点发出对冲请求，取先返回者。
+"""
+import collections
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+
+_OVERLOAD_ERRORS = None
+
+def overload_errors():
+    """
+    说明端点过载或不可用的异常：触发降速与熔断计数。
+    openai 导入较慢，推迟到第一次需要判断异常时 (此时 SDK 已被客户端加载)。
+    """
+    global _OVERLOAD_ERRORS
+    if _OVERLOAD_ERRORS is None:
+        import openai
+        _OVERLOAD_ERRORS = (openai.RateLimitError, openai.InternalServerError,
+                            openai.APITimeoutError, openai.APIConnectionError)
+    return _OVERLOAD_ERRORS
+
+class CircuitOpenError(Exception):
+    pass
+
+class LatencyTracker:
+    def __init__(self, window=200):
+        self.samples = collections.deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def percentile(self, pct, min_samples=20):
+        with self.lock:
+            if len(self.samples) < min_samples:
+                return None
+            ordered = sorted(self.samples)
+        idx = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[idx]
+
+class AdaptiveLimiter:
+    def __init__(self, initial=1, min_limit=1, max_limit=8, latency_target=None):
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.inflight = 0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.inflight >= int(self.limit):
+                self.cond.wait()
+            self.inflight += 1
+
+    def release(self, latency, overloaded):
+        with self.cond:
+            self.inflight -= 1
+            if overloaded:
+                self.limit = max(self.min_limit, self.limit / 2)
+            elif self.latency_target is not None and latency > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * 0.9)
+            else:
+                # 每个"窗口"的请求都成功才累计 +1
+                self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+            self.cond.notify_all()
+
+class CircuitBreaker:
+    def __init__(self, probe=None, failure_threshold=5, cooldown=30.0):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.open_until = 0.0
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        with self.lock:
+            return self.failures >= self.failure_threshold and time.monotonic() < self.open_until
+
+    def before_call(self):
+        with self.lock:
+            if self.failures < self.failure_threshold:
+                return
+            if time.monotonic() < self.open_until:
+                raise CircuitOpenError("端点已熔断")
+            # 半开：冷却期满先用探针确认端点恢复
+            healthy = True
+            if self.probe is not None:
+                try:
+                    healthy = bool(self.probe())
+                except Exception:
+                    healthy = False
+            if not healthy:
+                self.open_until = time.monotonic() + self.cooldown
+                raise CircuitOpenError("端点探测失败，继续熔断")
+            self.failures = 0
+
+    def trip(self):
+        """外部预检已确认端点不可用时直接进入熔断。"""
+        with self.lock:
+            self.failures = max(self.failures, self.failure_threshold)
+            self.open_until = time.monotonic() + self.cooldown
+            self.trips += 1
+
+    def on_success(self):
+        with self.lock:
+            self.failures = 0
+
+    def on_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures == self.failure_threshold:
+                self.trips += 1
+            if self.failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown
+
+class Endpoint:
+    def __init__(self, name, client, model_name, probe=None, failure_threshold=5, cooldown=30.0):
+        self.name = name
+        self.client = client
+        self.model_name = model_name
+        self.breaker = CircuitBreaker(probe, failure_threshold=failure_threshold, cooldown=cooldown)
+        self.latency = LatencyTracker()
+
+class ControlledClient:
+    def __init__(self, primary, secondary=None, max_concurrency=8, initial_concurrency=1,
+                 latency_target=None, hedge_percentile=95):
+        self.primary = primary
+        self.secondary = secondary
+        self.limiter = AdaptiveLimiter(initial=initial_concurrency, max_limit=max_concurrency,
+                                       latency_target=latency_target)
+        self.hedge_percentile = hedge_percentile
+        # 对冲请求与原请求各占一个线程
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency * 2 + 2, thread_name_prefix="llm")
+        self.stats = {"calls": 0, "overloaded": 0, "hedged": 0, "hedge_wins": 0, "short_circuited": 0}
+        self.stats_lock = threading.Lock()
+
+        # 与 OpenAI 客户端同形，调用方无需改动
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.models = primary.client.models
+
+    def bump(self, key):
+        with self.stats_lock:
+            self.stats[key] += 1
+
+    def _call(self, endpoint, kwargs):
+        started = time.monotonic()
+        try:
+            result = endpoint.client.chat.completions.create(**{**kwargs, "model": endpoint.model_name})
+        except overload_errors():
+            endpoint.breaker.on_failure()
+            raise
+        endpoint.latency.add(time.monotonic() - started)
+        endpoint.breaker.on_success()
+        return result
+
+    def create(self, **kwargs):
+        self.bump("calls")
+        endpoints = [e for e in (self.primary, self.secondary) if e is not None]
+        usable = []
+        for e in endpoints:
+            try:
+                e.breaker.before_call()
+                usable.append(e)
+            except CircuitOpenError:
+                continue
+        if not usable:
+            self.bump("short_circuited")
+            raise CircuitOpenError(f"所有端点均已熔断: {', '.join(e.name for e in endpoints)}")
+
+        self.limiter.acquire()
+        started = time.monotonic()
+        overloaded = False
+        try:
+            return self._dispatch(usable, kwargs)
+        except overload_errors():
+            overloaded = True
+            self.bump("overloaded")
+            raise
+        finally:
+            self.limiter.release(time.monotonic() - started, overloaded)
+
+    def _dispatch(self, usable, kwargs):
+        first = usable[0]
+        backup = usable[1] if len(usable) > 1 else None
+        primary_future = self.executor.submit(self._call, first, kwargs)
+        hedge_after = first.latency.percentile(self.hedge_percentile) if backup else None
+        if hedge_after is None:
+            return primary_future.result()
+
+        done, _ = wait([primary_future], timeout=hedge_after)
+        if done:
+            return primary_future.result()
+
+        # 超过 p95 仍未返回：向备用端点发对冲请求，谁先成功用谁
+        self.bump("hedged")
+        hedge_future = self.executor.submit(self._call, backup, kwargs)
+        pending = {primary_future, hedge_future}
+        last_error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                if future is hedge_future:
+                    self.bump("hedge_wins")
+                return result
+        raise last_error
+
+    def report(self):
+        s = self.stats
+        line = (f"🚦 流控: 调用 {s['calls']} 次，最终并发上限 {int(self.limiter.limit)}，"
+                f"过载/超时 {s['overloaded']} 次，熔断跳过 {s['short_circuited']} 次")
+        trips = self.primary.breaker.trips + (self.secondary.breaker.trips if self.secondary else 0)
+        if trips:
+            line += f"，熔断触发 {trips} 次"
+        if self.secondary:
+            line += f"，对冲 {s['hedged']} 次 (备用端点胜出 {s['hedge_wins']} 次)"
+        return line
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+LLM 调用遥测。
+
+评估器与简历定制的每一次 chat.completions 调用都会记一行到 llm_calls：
+模型、岗位、第几次尝试、temperature、usage 中的 token 数、耗时与结果。
+写入由后台线程攒批完成，不占用调用方的数据库连接与事务。
+直接运行本文件可按模型汇总某个时间窗口内的吞吐与延迟分位数。
+"""
+import argparse
+import os
+import queue
+import threading
+
+import psycopg2
+import psycopg2.extras
+
+from .llm_control import CircuitOpenError, overload_errors
+
+CALLS_TABLE = "llm_calls"
+
+# 调用结果取值
+OUTCOMES = ["ok", "parse_error", "bad_request", "overloaded", "circuit_open", "error"]
+
+_RECORDER = None
+
+def error_outcome(e):
+    """把调用异常映射为 outcome 取值。"""
+    import openai
+    if isinstance(e, CircuitOpenError):
+        return "circuit_open"
+    if isinstance(e, openai.BadRequestError):
+        return "bad_request"
+    if isinstance(e, overload_errors()):
+        return "overloaded"
+    return "error"
+
+def ensure_calls_table(conn):
+    cur = conn.cursor()
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {CALLS_TABLE} (
+            id                BIGSERIAL PRIMARY KEY,
+            created_at        TIMESTAMPTZ NOT NULL DEFAULT now(),
+            source            TEXT        NOT NULL,
+            model             TEXT        NOT NULL,
+            table_name        TEXT,
+            job_id            INTEGER,
+            attempt           SMALLINT    NOT NULL DEFAULT 0,
+            temperature       REAL,
+            prompt_tokens     INTEGER,
+            completion_tokens INTEGER,
+            cached_tokens     INTEGER,
+            latency_ms        INTEGER     NOT NULL,
+            outcome           TEXT        NOT NULL,
+            error             TEXT
+        )
+    """)
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {CALLS_TABLE}_created_idx ON {CALLS_TABLE} (created_at)")
+    conn.commit()
+    cur.close()
+
+class CallRecorder:
+    def __init__(self, db_config, source, batch_size=200, flush_interval=5.0):
+        self.db_config = db_config
+        self.source = source
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue()
+        self.written = 0
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            ensure_calls_table(conn)
+        finally:
+            conn.close()
+        self._thread = threading.Thread(target=self._loop, name="llm-telemetry", daemon=True)
+        self._thread.start()
+
+    def record(self, model, latency, outcome, job_id=None, table_name=None, attempt=0,
+               temperature=None, response=None, error=None):
+        usage = getattr(response, "usage", None)
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.queue.put((
+            self.source, model, table_name, job_id, attempt, temperature,
+            getattr(usage, "prompt_tokens", None),
+            getattr(usage, "completion_tokens", None),
+            getattr(details, "cached_tokens", None) if details is not None else None,
+            int(latency * 1000), outcome,
+            str(error)[:500] if error is not None else None
+        ))
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def _drain(self):
+        rows = []
+        while len(rows) < self.batch_size:
+            try:
+                rows.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _loop(self):
+        # psycopg2 连接不宜跨线程共用，写入单独开一条
+        conn = psycopg2.connect(**self.db_config)
+        try:
+            while True:
+                stopping = self._stop.wait(self.flush_interval)
+                while True:
+                    rows = self._drain()
+                    if not rows:
+                        break
+                    self._flush(conn, rows)
+                if stopping:
+                    break
+        finally:
+            conn.close()
+
+    def _flush(self, conn, rows):
+        cur = conn.cursor()
+        try:
+            psycopg2.extras.execute_values(cur, f"""
+                INSERT INTO {CALLS_TABLE} (source, model, table_name, job_id, attempt, temperature,
+                                           prompt_tokens, completion_tokens, cached_tokens,
+                                           latency_ms, outcome, error)
+                VALUES %s
+            """, rows, page_size=self.batch_size)
+            conn.commit()
+            self.written += len(rows)
+        except psycopg2.Error as e:
+            # 遥测失败不影响评估本身
+            conn.rollback()
+            self.dropped += len(rows)
+            print(f"  [Telemetry] 写入 {len(rows)} 条调用记录失败: {e}")
+        finally:
+            cur.close()
+
+# ---------------- 进程级开关 ----------------
+
+def start_recording(db_config, source):
+    """开启本进程的调用记录。LLM_TELEMETRY=0 或建表失败时保持关闭。"""
+    global _RECORDER
+    if os.getenv("LLM_TELEMETRY", "1") == "0":
+        return None
+    recorder = CallRecorder(db_config, source)
+    try:
+        recorder.start()
+    except psycopg2.Error as e:
+        print(f"[Telemetry] 无法初始化 {CALLS_TABLE}，本次不记录调用: {e}")
+        return None
+    _RECORDER = recorder
+    return recorder
+
+def stop_recording():
+    global _RECORDER
+    recorder, _RECORDER = _RECORDER, None
+    if recorder is not None:
+        recorder.close()
+    return recorder
+
+def record_call(model, latency, outcome, **fields):
+    if _RECORDER is not None:
+        _RECORDER.record(model, latency, outcome, **fields)
+
+# ---------------- 汇总 ----------------
+
+def summarize(conn, hours=24, since=None, until=None, source=None):
+    window = "created_at >= now() - %(hours)s * interval '1 hour'"
+    if since:
+        window = "created_at >= %(since)s"
+    if until:
+        window += " AND created_at < %(until)s"
+    if source:
+        window += " AND source = %(source)s"
+
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT source, model,
+               count(*) AS calls,
+               count(DISTINCT (table_name, job_id)) FILTER (WHERE outcome = 'ok') AS jobs_ok,
+               count(*) FILTER (WHERE attempt > 0) AS retries,
+               count(*) FILTER (WHERE outcome = 'parse_error') AS parse_errors,
+               count(*) FILTER (WHERE outcome NOT IN ('ok', 'parse_error')) AS failures,
+               percentile_cont(ARRAY[0.5, 0.95, 0.99]) WITHIN GROUP (ORDER BY latency_ms),
+               coalesce(sum(prompt_tokens), 0), coalesce(sum(completion_tokens), 0),
+               sum(cached_tokens),
+               sum(latency_ms) FILTER (WHERE completion_tokens IS NOT NULL),
+               extract(epoch FROM max(created_at) - min(created_at))
+        FROM {CALLS_TABLE}
+        WHERE {window}
+        GROUP BY source, model
+        ORDER BY source, model
+    """, {"hours": hours, "since": since, "until": until, "source": source})
+    rows = cur.fetchall()
+    cur.close()
+
+    label = f"{since or f'最近 {hours:g} 小时'}{f' ~ {until}' if until else ''}"
+    print(f"\n================= LLM 调用统计 ({label}) ==================")
+    if not rows:
+        print("窗口内没有调用记录。")
+    for (src, model, calls, jobs_ok, retries, parse_errors, failures, pcts,
+         prompt_tokens, completion_tokens, cached_tokens, gen_ms, span) in rows:
+        p50, p95, p99 = pcts
+        minutes = max(float(span or 0), 1.0) / 60
+        print(f"[{src}] {model}: 调用 {calls} 次，成功岗位 {jobs_ok}，吞吐 {jobs_ok / minutes:.1f} 岗位/分钟")
+        print(f"   延迟 p50 {p50 / 1000:.1f}s | p95 {p95 / 1000:.1f}s | p99 {p99 / 1000:.1f}s")
+        print(f"   重试 {retries} 次 ({retries / calls * 100:.1f}%)，JSON 解析失败 {parse_errors} 次，其它失败 {failures} 次")
+        if jobs_ok:
+            print(f"   Tokens/岗位: prompt {prompt_tokens / jobs_ok:.0f} | completion {completion_tokens / jobs_ok:.0f}")
+        if gen_ms:
+            print(f"   生成速度: {completion_tokens / (gen_ms / 1000):.1f} tokens/s (单请求平均)")
+        if cached_tokens is not None and prompt_tokens:
+            print(f"   前缀缓存命中率: {cached_tokens / prompt_tokens * 100:.1f}%")
+    print("=========================================================\n")
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize LLM call telemetry from the llm_calls table")
+    parser.add_argument("--hours", type=float, default=24, help="Window size ending now (ignored with --since)")
+    parser.add_argument("--since", type=str, default=None, help="Window start, e.g. '2026-10-01 08:00'")
+    parser.add_argument("--until", type=str, default=None, help="Window end, to compare before/after a server change")
+    parser.add_argument("--source", type=str, choices=["evaluator", "daemon", "runner", "tailor"], default=None, help="Only count calls from one caller")
+    args = parser.parse_args()
+
+    from . import job_evaluator
+    conn = job_evaluator.get_db_connection()
+    try:
+        ensure_calls_table(conn)
+        summarize(conn, hours=args.hours, since=args.since, until=args.until, source=args.source)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
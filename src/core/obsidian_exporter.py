@@ -1,32 +1,18 @@
 #!/usr/bin/env python3
+from . import profiling
+from . import settings
 import psycopg2
 import os
 import argparse
-import json
 from datetime import datetime
 import re
 from collections import defaultdict
 
-# Load environment variables if available
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
-
-def get_env_strict(key):
-    val = os.getenv(key)
-    if val is None:
-        raise EnvironmentError(f"Missing required environment variable: {key}")
-    return val
-
-# DB CONFIG from environment (Strict)
-DB_CONFIG = {
-    'dbname': get_env_strict('DB_NAME'),
-    'user': get_env_strict('DB_USER'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'host': get_env_strict('DB_HOST'),
-    'port': get_env_strict('DB_PORT')
+ACTIVITY_TITLES = {
+    "1_HIGHLY_ACTIVE": "🚀 高度活跃",
+    "2_RECENTLY_ACTIVE": "✨ 近期活跃",
+    "3_UNKNOWN": "❓ 更新未知",
+    "4_LONG_INACTIVE": "💤 长期不活跃"
 }
 
 def categorize_activity(update_time):
@@ -47,15 +33,25 @@ def categorize_activity(update_time):
         return '2_RECENTLY_ACTIVE'
     return '3_UNKNOWN'
 
-def smart_categorize(title, jd_text):
+def _compile_categorization_rules(config):
+    rules = config.get("ui", {}).get("categorization_rules", [])
+    return [(rule["id"], [k.lower() for k in rule.get("keywords", []) if k]) for rule in rules]
+
+def categorization_rules():
+    """[(cluster_id, 小写关键词列表)]，按 config.json 中的顺序，首个命中的规则生效。"""
+    return settings.compiled(_compile_categorization_rules)
+
+def smart_categorize(title, jd_text, rules=None):
     """Dynamic categorization based on config.json"""
     text = f"{title} {jd_text}".lower()
-    rules = USER_CONFIG.get("ui", {}).get("categorization_rules", [])
-    for rule in rules:
-        if any(k.lower() in text for k in rule.get("keywords", [])):
-            return rule["id"]
+    for cluster_id, keywords in rules or categorization_rules():
+        if any(k in text for k in keywords):
+            return cluster_id
     return "5_OTHER"
 
+def notes_dir():
+    return os.path.expanduser(settings.user_config().get("storage", {}).get("notes_dir", "~/Documents/notes/jobs"))
+
 def parse_rationale_scores(rationale):
     """Extract dimension scores from rationale string"""
     if not rationale: return {}, ""
@@ -126,29 +122,45 @@ def render_job_block(f, job, include_jd=False):
     
     f.write("\n---\n\n")
 
+def append_job_to_digest(job, include_jd=False, dry_run=False):
+    """增量模式：把单个新达标岗位追加到当天的速递笔记中，无需重建整份报告。"""
+    output_dir = notes_dir()
+    filepath = os.path.join(output_dir, f"新增高分岗位_{datetime.now().strftime('%Y-%m-%d')}.md")
+
+    if dry_run:
+        print(f"[DRY RUN] Would append [{job[0]}] {job[1]} to {filepath}")
+        return filepath
+
+    os.makedirs(output_dir, exist_ok=True)
+    is_new = not os.path.exists(filepath)
+    with open(filepath, 'a', encoding='utf-8') as f:
+        if is_new:
+            f.write("# 新增高分岗位速递\n\n")
+        render_job_block(f, job, include_jd=include_jd)
+    return filepath
+
 def export_top_jobs(threshold=80, include_jd=False, model="glm5", dry_run=False, table_name="liepin_jobs"):
     try:
-        model_map = {
-            "gemma3": ("match_score", "rationale"),
-            "qwen3_8b": ("match_score_qwen3_8b", "rationale_qwen3_8b"),
-            "glm5": ("match_score_glm5", "rationale_glm5")
-        }
-        score_col, rationale_col = model_map.get(model, model_map["glm5"])
+        columns = settings.MODEL_COLUMNS.get(model, settings.MODEL_COLUMNS["glm5"])
+        score_col, rationale_col = columns["score_col"], columns["rationale_col"]
         
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = psycopg2.connect(**settings.db_config())
         cur = conn.cursor()
         
-        cur.execute(f"""
-            SELECT id, title, company, salary, location, 
-                   {score_col}, {rationale_col},
-                   link, update_time, job_description
-            FROM {table_name}
-            WHERE {score_col} >= %s
-              AND job_description NOT LIKE '[UNAVAILABLE%%'
-            ORDER BY {score_col} DESC, fetched_at DESC
-        """, (threshold,))
+        with profiling.stage("query"):
+            cur.execute(f"""
+                SELECT id, title, company, salary, location, 
+                       {score_col}, {rationale_col},
+                       link, update_time, job_description
+                FROM {table_name}
+                WHERE {score_col} >= %s
+                  AND job_description NOT LIKE '[UNAVAILABLE%%'
+                  AND {settings.own_score_sql(columns)}
+                ORDER BY {score_col} DESC, fetched_at DESC
+            """, (threshold,))
         
-        jobs = cur.fetchall()
+        with profiling.stage("fetch"):
+            jobs = cur.fetchall()
         
         if not jobs:
             print(f"没有找到 match_score >= {threshold} 且活跃的岗位。")
@@ -158,16 +170,19 @@ def export_top_jobs(threshold=80, include_jd=False, model="glm5", dry_run=False,
 
         print(f"已锁定 {len(jobs)} 个顶级高分岗位。正在执行深维战略聚类...")
         
-        clusters_info = USER_CONFIG.get("ui", {}).get("clusters", {})
-        insights = USER_CONFIG.get("insights", {})
+        user_config = settings.user_config()
+        clusters_info = user_config.get("ui", {}).get("clusters", {})
+        insights = user_config.get("insights", {})
         
         clusters_data = defaultdict(list)
-        for job in jobs:
-            cat = smart_categorize(job[1], job[9]) 
-            clusters_data[cat].append(job)
+        rules = categorization_rules()
+        with profiling.stage("compute"):
+            for job in jobs:
+                cat = smart_categorize(job[1], job[9], rules=rules) 
+                clusters_data[cat].append(job)
             
         # Path and Settings from config.json (storage.notes_dir)
-        output_dir = os.path.expanduser(USER_CONFIG.get("storage", {}).get("notes_dir", "~/Documents/notes/jobs"))
+        output_dir = notes_dir()
         os.makedirs(output_dir, exist_ok=True)
 
         # Determine filename based on current time
@@ -179,7 +194,7 @@ def export_top_jobs(threshold=80, include_jd=False, model="glm5", dry_run=False,
             print(f"[DRY RUN] Target file: {filepath}")
             return
 
-        with open(filepath, 'w', encoding='utf-8') as f:
+        with profiling.stage("render"), open(filepath, 'w', encoding='utf-8') as f:
             f.write("# 职位深度分析与决策指南\n\n")
             f.write("本报告采用单一模型评分体系，基于 `config.json` 的动态规则生成。\n\n---\n\n")
             
@@ -200,14 +215,6 @@ def export_top_jobs(threshold=80, include_jd=False, model="glm5", dry_run=False,
                     act = categorize_activity(jb[8]) 
                     activity_groups[act].append(jb)
                 
-                # Define ACTIVITY_TITLES here or ensure it's globally available
-                ACTIVITY_TITLES = {
-                    "1_HIGHLY_ACTIVE": "🚀 高度活跃",
-                    "2_RECENTLY_ACTIVE": "✨ 近期活跃",
-                    "3_UNKNOWN": "❓ 更新未知",
-                    "4_LONG_INACTIVE": "💤 长期不活跃"
-                }
-
                 for act_key in ["1_HIGHLY_ACTIVE", "2_RECENTLY_ACTIVE", "3_UNKNOWN", "4_LONG_INACTIVE"]:
                     act_jobs = activity_groups.get(act_key, [])
                     if not act_jobs: continue
@@ -228,20 +235,25 @@ def export_top_jobs(threshold=80, include_jd=False, model="glm5", dry_run=False,
         if 'cur' in locals(): cur.close()
         if 'conn' in locals(): conn.close()
 
-if __name__ == "__main__":
-    # Load user config for defaults
-    CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "config.json")
-    with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-        USER_CONFIG = json.load(f)
+def default_threshold():
+    """config.json 中 tools.obsidian.threshold，未配置时 80。CLI 在解析参数之后才调用，--help 不读配置。"""
+    return settings.user_config().get("tools", {}).get("obsidian", {}).get("threshold", 80)
 
-    default_threshold = USER_CONFIG.get("tools", {}).get("obsidian", {}).get("threshold", 80)
+def main():
     parser = argparse.ArgumentParser(description="Export deeply analyzed job reports.")
-    parser.add_argument("--threshold", type=int, default=default_threshold, help=f"最低分数阈值, 默认 {default_threshold}")
+    parser.add_argument("--threshold", type=int, default=None, help="最低分数阈值, 默认取 config.json 的 tools.obsidian.threshold (未配置时 80)")
     parser.add_argument("--include-jd", "-j", action="store_true", help="是否包含岗位描述")
     parser.add_argument("--model", type=str, default="glm5", help="评分模型 (gemma3, qwen3_8b, glm5)")
     parser.add_argument("--dry-run", action="store_true", help="Run without writing files")
     parser.add_argument("--dataset", type=str, choices=["liepin", "boss"], default="liepin", help="Select which job dataset to process")
+    profiling.add_profile_args(parser)
     args = parser.parse_args()
+    if args.threshold is None:
+        args.threshold = default_threshold()
     
     table_name = f"{args.dataset}_jobs"
-    export_top_jobs(args.threshold, args.include_jd, model=args.model, dry_run=args.dry_run, table_name=table_name)
+    with profiling.session(args):
+        export_top_jobs(args.threshold, args.include_jd, model=args.model, dry_run=args.dry_run, table_name=table_name)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+常驻流水线守护进程。
+
+订阅 *_jobs 表触发器发出的 NOTIFY 事件，把每个新入库/更新的岗位
+增量地推过 filter -> evaluate -> export，数据库连接与 LLM 客户端常驻复用。
+开启 --rescore-stale 时，队列空闲期间按优先级小批量重评 prompt 版本过期的分数。
+"""
+import argparse
+import json
+import queue
+import select
+import signal
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from . import job_evaluator
+from . import llm_telemetry
+from . import obsidian_exporter
+from . import pipeline_stages
+from . import settings
+
+NOTIFY_CHANNEL = "jobs_changed"
+DATASETS = ["liepin", "boss"]
+# 没有过期分数时，最多隔这么久再查一次 (不超过补扫周期)
+RESCORE_IDLE_WAIT = 60.0
+
+NOTIFY_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_job_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{NOTIFY_CHANNEL}', json_build_object(
+        'table', TG_TABLE_NAME, 'id', NEW.id, 'op', TG_OP
+    )::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+def install_triggers(conn, tables):
+    """
+    为每张岗位表安装 NOTIFY 触发器。UPDATE 仅在爬虫关心的字段真正变化时通知，
+    评估器写分数不会回灌事件。
+    """
+    cur = conn.cursor()
+    cur.execute(NOTIFY_FUNCTION_SQL)
+    for table_name in tables:
+        cur.execute(f"DROP TRIGGER IF EXISTS {table_name}_notify_insert ON {table_name}")
+        cur.execute(f"DROP TRIGGER IF EXISTS {table_name}_notify_update ON {table_name}")
+        cur.execute(f"""
+            CREATE TRIGGER {table_name}_notify_insert
+            AFTER INSERT ON {table_name}
+            FOR EACH ROW EXECUTE FUNCTION notify_job_change()
+        """)
+        cur.execute(f"""
+            CREATE TRIGGER {table_name}_notify_update
+            AFTER UPDATE OF title, salary, location, job_description ON {table_name}
+            FOR EACH ROW
+            WHEN (OLD.title IS DISTINCT FROM NEW.title
+               OR OLD.salary IS DISTINCT FROM NEW.salary
+               OR OLD.location IS DISTINCT FROM NEW.location
+               OR OLD.job_description IS DISTINCT FROM NEW.job_description)
+            EXECUTE FUNCTION notify_job_change()
+        """)
+    conn.commit()
+    cur.close()
+
+class PipelineDaemon:
+    def __init__(self, args):
+        self.args = args
+        self.tables = [f"{d}_jobs" for d in args.datasets]
+        self.config = job_evaluator.MODEL_CONFIGS[args.model]
+        self.dry_run = args.dry_run
+
+        self.stop_event = threading.Event()
+        self.pending = queue.Queue(maxsize=args.max_pending)
+        self.queued = set()
+        self.queued_lock = threading.Lock()
+        self.export_lock = threading.Lock()
+        self.needs_catchup = True
+        self.last_catchup = 0.0
+        self.rescoring = set()
+        self.rescore_idle_until = 0.0
+
+        # LLM 背压：限制在途请求数，连续失败时指数退避
+        self.llm_slots = threading.BoundedSemaphore(args.max_inflight)
+        self.backoff_lock = threading.Lock()
+        self.backoff_until = 0.0
+        self.backoff_seconds = 0.0
+
+        self.stats_lock = threading.Lock()
+        self.stats = {"received": 0, "dropped": 0, "filtered": 0, "restored": 0,
+                      "static": 0, "evaluated": 0, "failed": 0, "exported": 0, "rescored": 0}
+        self.prompt_stats = job_evaluator.new_run_stats()
+
+        self.profile_text = ""
+        self.version = None
+        self.client = None
+        self.db_pool = None
+        self.listen_conn = None
+
+    def bump(self, key, n=1):
+        with self.stats_lock:
+            self.stats[key] += n
+
+    # ---------------- 生命周期 ----------------
+
+    def start(self):
+        self.profile_text = job_evaluator.collect_profile_text()
+        if not self.profile_text.strip():
+            print("没有找到简历文件。")
+            return
+
+        self.version = job_evaluator.prompt_version(self.config, self.profile_text)
+        self.client = job_evaluator.get_llm_client(self.args.model, max_concurrency=self.args.max_inflight)
+        # 端点或模型名配置错误时在启动阶段退出，而不是接收事件后逐个岗位重试直至熔断
+        if not job_evaluator.preflight_llm_client(self.client, self.config, action="启动守护进程"):
+            return
+        self.db_pool = settings.get_pool(self.args.workers + 1)
+        conn = self.db_pool.getconn()
+        try:
+            for table_name in self.tables:
+                job_evaluator.ensure_version_columns(conn, table_name)
+        finally:
+            self.db_pool.putconn(conn)
+
+        if not self.dry_run:
+            llm_telemetry.start_recording(settings.db_config(), "daemon")
+
+        self.listen_conn = psycopg2.connect(**settings.db_config())
+        self.listen_conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        if self.args.install_triggers:
+            install_triggers(self.listen_conn, self.tables)
+            print(f"已为 {', '.join(self.tables)} 安装 NOTIFY 触发器。")
+        cur = self.listen_conn.cursor()
+        cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+        cur.close()
+
+        signal.signal(signal.SIGINT, self.request_stop)
+        signal.signal(signal.SIGTERM, self.request_stop)
+
+        workers = [threading.Thread(target=self.worker_loop, name=f"worker-{i}", daemon=True)
+                   for i in range(self.args.workers)]
+        for w in workers:
+            w.start()
+
+        print(f"守护进程已启动: 监听 {NOTIFY_CHANNEL} | 模型 {self.args.model} ({self.config['model_name']}) | "
+              f"{self.args.workers} workers" + (" [DRY RUN]" if self.dry_run else ""))
+        try:
+            self.listen_loop()
+        finally:
+            print("正在优雅退出，等待在途岗位处理完毕...")
+            for _ in workers:
+                self.pending.put((None, None))
+            for w in workers:
+                w.join()
+            self.listen_conn.close()
+            self.db_pool.closeall()
+            llm_telemetry.stop_recording()
+            self.print_report()
+
+    def request_stop(self, signum, frame):
+        self.stop_event.set()
+
+    # ---------------- 事件接收 ----------------
+
+    def enqueue(self, table_name, job_id):
+        with self.queued_lock:
+            if (table_name, job_id) in self.queued:
+                return True
+            try:
+                self.pending.put_nowait((table_name, job_id))
+            except queue.Full:
+                return False
+            self.queued.add((table_name, job_id))
+        return True
+
+    def listen_loop(self):
+        while not self.stop_event.is_set():
+            due = time.monotonic() - self.last_catchup > self.args.catchup_interval
+            if (self.needs_catchup or due) and self.pending.qsize() < self.args.max_pending // 2:
+                self.catch_up()
+            elif self.args.rescore_stale and self.pending.empty() and time.monotonic() >= self.rescore_idle_until:
+                self.rescore_idle()
+
+            if select.select([self.listen_conn], [], [], 1.0) == ([], [], []):
+                continue
+            self.listen_conn.poll()
+            while self.listen_conn.notifies:
+                notify = self.listen_conn.notifies.pop(0)
+                try:
+                    payload = json.loads(notify.payload)
+                except ValueError:
+                    continue
+                if payload.get("table") not in self.tables:
+                    continue
+                self.bump("received")
+                if not self.enqueue(payload["table"], payload["id"]):
+                    # 队列已满：丢弃事件，稍后通过补扫从数据库重新捞回
+                    self.bump("dropped")
+                    self.needs_catchup = True
+
+    def catch_up(self):
+        """
+        补扫：启动时以及队列溢出后，从表中捞回尚未被所选模型评估的岗位。
+        """
+        self.needs_catchup = False
+        self.last_catchup = time.monotonic()
+        free = self.args.max_pending - self.pending.qsize()
+        conn = self.db_pool.getconn()
+        try:
+            cur = conn.cursor()
+            for table_name in self.tables:
+                if free <= 0:
+                    self.needs_catchup = True
+                    break
+                cur.execute(f"""
+                    SELECT id FROM {table_name}
+                    WHERE job_description IS NOT NULL AND {self.config['score_col']} IS NULL
+                    ORDER BY fetched_at DESC LIMIT %s
+                """, (free,))
+                for (job_id,) in cur.fetchall():
+                    if not self.enqueue(table_name, job_id):
+                        self.needs_catchup = True
+                        break
+                    free -= 1
+            cur.close()
+            conn.commit()
+        finally:
+            self.db_pool.putconn(conn)
+
+    def rescore_idle(self):
+        """
+        队列为空时补充一小批过期分数。每次最多 --rescore-batch 个，
+        新事件最多排在这一小批之后，不会被重评阻塞。
+        """
+        conn = self.db_pool.getconn()
+        try:
+            added = 0
+            for table_name in self.tables:
+                for (job_id, *_) in job_evaluator.fetch_stale_jobs(conn, table_name, self.config, self.version,
+                                                                   self.args.rescore_batch - added):
+                    if (table_name, job_id) in self.rescoring:
+                        continue
+                    with self.queued_lock:
+                        self.rescoring.add((table_name, job_id))
+                    if not self.enqueue(table_name, job_id):
+                        with self.queued_lock:
+                            self.rescoring.discard((table_name, job_id))
+                        break
+                    added += 1
+                if added >= self.args.rescore_batch:
+                    break
+            conn.commit()
+        finally:
+            self.db_pool.putconn(conn)
+        if not added:
+            # 没有过期分数了：稍后再查，间隔封顶，改了 prompt 或简历后不必等满一个补扫周期
+            self.rescore_idle_until = time.monotonic() + min(self.args.catchup_interval, RESCORE_IDLE_WAIT)
+
+    # ---------------- 处理 ----------------
+
+    def wait_for_llm(self):
+        while not self.stop_event.is_set():
+            with self.backoff_lock:
+                delay = self.backoff_until - time.monotonic()
+            if delay <= 0:
+                return True
+            self.stop_event.wait(min(delay, 1.0))
+        return False
+
+    def record_llm_result(self, ok):
+        with self.backoff_lock:
+            if ok:
+                self.backoff_seconds = 0.0
+            else:
+                self.backoff_seconds = min(max(self.backoff_seconds * 2, 2.0), self.args.max_backoff)
+                self.backoff_until = time.monotonic() + self.backoff_seconds
+                print(f"  [背压] LLM 调用失败，暂停 {self.backoff_seconds:.0f}s 后再派发。")
+
+    def worker_loop(self):
+        while True:
+            table_name, job_id = self.pending.get()
+            if table_name is None:
+                return
+            if not self.stop_event.is_set():
+                self.run_one(table_name, job_id)
+            # 处理完才出队去重集合，补扫不会把在途岗位再派发一次
+            with self.queued_lock:
+                self.queued.discard((table_name, job_id))
+                self.rescoring.discard((table_name, job_id))
+
+    def run_one(self, table_name, job_id):
+        conn = self.db_pool.getconn()
+        try:
+            self.process(conn, table_name, job_id)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            print(f"[{table_name}:{job_id}] 处理失败: {e}")
+        finally:
+            self.db_pool.putconn(conn)
+
+    def process(self, conn, table_name, job_id):
+        cur = conn.cursor()
+        job = pipeline_stages.fetch_job(cur, table_name, job_id, self.config)
+        if job is None:
+            cur.close()
+            return
+
+        outcome = pipeline_stages.filter_stage(cur, table_name, job, dry_run=self.dry_run)
+        if outcome != "passed":
+            self.bump(outcome)
+            cur.close()
+            return
+
+        rescore = (table_name, job_id) in self.rescoring and job["score"] is not None
+        scored = False
+        if job["job_description"] and (job["score"] is None or rescore):
+            if pipeline_stages.static_stage(cur, table_name, job, dry_run=self.dry_run):
+                self.bump("static")
+            elif self.wait_for_llm():
+                # 先提交前置阶段的写入，避免长时间 LLM 调用期间持有行锁
+                conn.commit()
+                with self.llm_slots:
+                    print(f"正在评估 [{table_name}:{job_id}] {job['company']} - {job['title']} ...")
+                    score = pipeline_stages.evaluate_stage(
+                        cur, table_name, job, self.client, self.config, self.profile_text,
+                        dry_run=self.dry_run, stats=self.prompt_stats, rescore=rescore
+                    )
+                self.record_llm_result(score is not None)
+                self.bump(("rescored" if rescore else "evaluated") if score is not None else "failed")
+                if score is not None:
+                    print(f" -> [{table_name}:{job_id}] 分数: {score}")
+                    scored = True
+
+        # 只导出本次刚评出分数的岗位：已评过的岗位再次收到事件 (如正文更新) 或重评时，
+        # 此前已追加过速递笔记，不再重复追加
+        if not scored or rescore:
+            cur.close()
+            return
+        with self.export_lock:
+            if pipeline_stages.export_stage(job, self.args.threshold, include_jd=self.args.include_jd, dry_run=self.dry_run):
+                self.bump("exported")
+        cur.close()
+
+    def print_report(self):
+        s = self.stats
+        print("\n================= 守护进程报告 ==================")
+        print(f"收到事件 {s['received']} 个 (队列溢出丢弃 {s['dropped']} 个，已由补扫兜底)")
+        print(f"前置过滤 {s['filtered']} | 洗白恢复 {s['restored']} | 后置静态过滤 {s['static']}")
+        print(f"[{self.args.model}] 评估成功 {s['evaluated']} | 重评过期 {s['rescored']} | 失败 {s['failed']} | 增量导出 {s['exported']}")
+        job_evaluator.print_llm_report(self.prompt_stats)
+        print(self.client.report())
+        print("=================================================\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-running pipeline daemon driven by Postgres LISTEN/NOTIFY")
+    parser.add_argument("--model", type=str, default="glm5", choices=list(job_evaluator.MODEL_CONFIGS.keys()), help="Select evaluation model")
+    parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=DATASETS, help="Datasets to subscribe to")
+    parser.add_argument("--workers", type=int, default=2, help="Number of worker threads")
+    parser.add_argument("--max-inflight", type=int, default=2, help="Max concurrent LLM requests")
+    parser.add_argument("--max-pending", type=int, default=200, help="Max queued jobs before events are deferred to catch-up")
+    parser.add_argument("--max-backoff", type=float, default=60.0, help="Max seconds to pause dispatch when the LLM keeps failing")
+    parser.add_argument("--catchup-interval", type=float, default=600.0, help="Seconds between periodic catch-up scans")
+    parser.add_argument("--threshold", type=int, default=None, help="Export threshold (default: tools.obsidian.threshold in config.json, else 80)")
+    parser.add_argument("--include-jd", "-j", action="store_true", help="Include job description in exported notes")
+    parser.add_argument("--install-triggers", action="store_true", help="Create/refresh the NOTIFY triggers before listening")
+    parser.add_argument("--rescore-stale", action="store_true", help="While the queue is idle, re-score rows whose prompt/profile/model version changed")
+    parser.add_argument("--rescore-batch", type=int, default=5, help="Stale rows queued per idle tick with --rescore-stale")
+    parser.add_argument("--dry-run", action="store_true", help="Run without writing to database or notes")
+    args = parser.parse_args()
+    if args.rescore_stale and args.dry_run:
+        parser.error("--rescore-stale 需要写回版本号，不支持 --dry-run (否则同一批岗位会被反复重评)")
+    if args.threshold is None:
+        args.threshold = obsidian_exporter.default_threshold()
+
+    PipelineDaemon(args).start()
+
+if __name__ == "__main__":
+    main()
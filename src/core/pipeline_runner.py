@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+多数据集流水线调度器。
+
+- 每个数据集一个子进程，liepin 与 boss 并行处理
+- 进程内 filter -> evaluate 由线程 + 有界队列串成流水线：扫描线程按批读出岗位，
+  过滤完一批就交给评估线程，不必等整表过滤结束；队列写满时上游自然阻塞
+- evaluate 排空后再执行 export、tailor 这两个整表汇总阶段
+- 各阶段线程数可单独设置，--llm-slots 限制所有数据集合计的在途 LLM 请求
+- 结束时汇总所有数据集的统计，输出一份报告
+"""
+from . import profiling
+import argparse
+import multiprocessing
+import queue
+import threading
+import time
+from collections import Counter
+
+import psycopg2
+
+from . import job_evaluator
+from . import job_stats
+from . import obsidian_exporter
+from . import pipeline_stages
+from . import resume_tailor
+from . import settings
+from .llm_telemetry import start_recording, stop_recording
+
+DATASETS = ["liepin", "boss"]
+STAGES = ["filter", "evaluate", "export", "tailor"]
+DONE = None
+
+JOB_KEYS = ["id", "title", "company", "salary", "location", "job_description",
+            "update_time", "link", "score", "rationale"]
+
+class StageStats:
+    """各阶段处理条数、首次开始与最后结束时间，用于计算吞吐与阶段重叠。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+        self.spans = {}
+
+    def bump(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def mark(self, stage, started, finished):
+        with self.lock:
+            first, last = self.spans.get(stage, (started, finished))
+            self.spans[stage] = (min(first, started), max(last, finished))
+
+class DatasetPipeline:
+    def __init__(self, dataset, args, llm_slots):
+        self.dataset = dataset
+        self.table_name = f"{dataset}_jobs"
+        self.args = args
+        self.stages = set(args.stages)
+        # 只跑 filter 时不需要模型端点，evaluate 开始前再换成完整配置
+        self.config = job_evaluator.MODEL_COLUMNS[args.model]
+        self.llm_slots = llm_slots
+
+        self.batches = queue.Queue(maxsize=args.queue_batches)
+        self.to_evaluate = queue.Queue(maxsize=args.queue_batches * args.batch_size)
+        self.stats = StageStats()
+        self.prompt_stats = job_evaluator.new_run_stats()
+        self.started = time.monotonic()
+
+        self.client = None
+        self.profile_text = ""
+        self.db_pool = None
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    # ---------------- 扫描 ----------------
+
+    def scan(self):
+        """服务端游标按 id 顺序分批读出整表，每批作为一个工作单元交给过滤线程。"""
+        conn = psycopg2.connect(**settings.db_config())
+        started = self.elapsed()
+        try:
+            cur = conn.cursor(name=f"{self.table_name}_runner_scan")
+            cur.itersize = self.args.batch_size
+            limit = "LIMIT %s" if self.args.limit else ""
+            cur.execute(f"""
+                SELECT id, title, company, salary, location, job_description,
+                       update_time, link, {self.config['score_col']}, {self.config['rationale_col']}
+                FROM {self.table_name}
+                ORDER BY id
+                {limit}
+            """, (self.args.limit,) if self.args.limit else None)
+            while True:
+                with profiling.stage("fetch"):
+                    rows = cur.fetchmany(self.args.batch_size)
+                if not rows:
+                    break
+                self.stats.bump("scanned", len(rows))
+                self.batches.put([dict(zip(JOB_KEYS, row)) for row in rows])
+            cur.close()
+        finally:
+            conn.close()
+            for _ in range(self.args.filter_workers):
+                self.batches.put(DONE)
+            self.stats.mark("scan", started, self.elapsed())
+
+    # ---------------- filter ----------------
+
+    def filter_worker(self):
+        while True:
+            batch = self.batches.get()
+            if batch is DONE:
+                return
+            started = self.elapsed()
+            conn = self.db_pool.getconn()
+            try:
+                cur = conn.cursor()
+                ready = self.filter_batch(cur, batch)
+                conn.commit()
+                cur.close()
+            except Exception as e:
+                conn.rollback()
+                ready = []
+                self.stats.bump("errors")
+                print(f"[{self.table_name}] 过滤批次失败 (id {batch[0]['id']}-{batch[-1]['id']}): {e}")
+            finally:
+                self.db_pool.putconn(conn)
+            self.stats.mark("filter", started, self.elapsed())
+            # 提交之后再交给评估线程，评估看到的一定是已落库的过滤结果
+            for job in ready:
+                self.to_evaluate.put(job)
+
+    def filter_batch(self, cur, batch):
+        ready = []
+        for job in batch:
+            if "filter" in self.stages:
+                outcome = pipeline_stages.filter_stage(cur, self.table_name, job, dry_run=self.args.dry_run)
+                self.stats.bump(outcome)
+                if outcome == "filtered":
+                    continue
+            elif str(job["job_description"] or "").startswith("[FILTERED:"):
+                continue
+
+            if "evaluate" not in self.stages or not job["job_description"] or job["score"] is not None:
+                continue
+            if pipeline_stages.static_stage(cur, self.table_name, job, dry_run=self.args.dry_run):
+                self.stats.bump("static")
+            else:
+                ready.append(job)
+        return ready
+
+    # ---------------- evaluate ----------------
+
+    def evaluate_worker(self):
+        while True:
+            job = self.to_evaluate.get()
+            if job is DONE:
+                return
+            started = self.elapsed()
+            conn = self.db_pool.getconn()
+            try:
+                cur = conn.cursor()
+                print(f"正在评估 [{self.table_name}:{job['id']}] {job['company']} - {job['title']} ...")
+                with self.llm_slots:
+                    score = pipeline_stages.evaluate_stage(
+                        cur, self.table_name, job, self.client, self.config, self.profile_text,
+                        dry_run=self.args.dry_run, stats=self.prompt_stats
+                    )
+                conn.commit()
+                cur.close()
+                self.stats.bump("evaluated" if score is not None else "failed")
+                if score is not None:
+                    print(f" -> [{self.table_name}:{job['id']}] 分数: {score}")
+            except Exception as e:
+                conn.rollback()
+                self.stats.bump("errors")
+                print(f"[{self.table_name}:{job['id']}] 评估失败: {e}")
+            finally:
+                self.db_pool.putconn(conn)
+            self.stats.mark("evaluate", started, self.elapsed())
+
+    # ---------------- 调度 ----------------
+
+    def run(self):
+        evaluate = "evaluate" in self.stages
+        if evaluate:
+            self.profile_text = job_evaluator.collect_profile_text()
+            if not self.profile_text.strip():
+                print(f"[{self.table_name}] 没有找到简历文件，跳过 evaluate 阶段。")
+                self.stages.discard("evaluate")
+                evaluate = False
+        if evaluate:
+            self.config = job_evaluator.MODEL_CONFIGS[self.args.model]
+            self.client = job_evaluator.get_llm_client(self.args.model, max_concurrency=self.args.evaluate_workers)
+            # 扫描与过滤线程启动前先探测端点，不可用时整个数据集进程直接失败，而不是过滤完再逐个评估失败
+            if not job_evaluator.preflight_llm_client(self.client, self.config, action=f"{self.table_name} 流水线"):
+                raise RuntimeError(f"模型端点 {self.config['api_base']} 不可用")
+            if not self.args.dry_run:
+                start_recording(settings.db_config(), "runner")
+
+        workers = self.args.filter_workers + (self.args.evaluate_workers if evaluate else 0)
+        self.db_pool = settings.get_pool(workers)
+        try:
+            if evaluate:
+                conn = self.db_pool.getconn()
+                try:
+                    job_evaluator.ensure_version_columns(conn, self.table_name)
+                finally:
+                    self.db_pool.putconn(conn)
+            if "filter" in self.stages or evaluate:
+                self.run_stream(evaluate)
+            if not self.args.dry_run:
+                conn = self.db_pool.getconn()
+                try:
+                    job_stats.refresh_quietly(conn, self.table_name)
+                finally:
+                    self.db_pool.putconn(conn)
+        finally:
+            self.db_pool.closeall()
+            if evaluate:
+                stop_recording()
+
+        # 汇总阶段依赖 evaluate 的全部结果；tailor 自带调用记录，与 export 依次执行
+        threshold = self.args.threshold
+        if "export" in self.stages:
+            started = self.elapsed()
+            obsidian_exporter.export_top_jobs(threshold=threshold, include_jd=self.args.include_jd, model=self.args.model,
+                                              dry_run=self.args.dry_run, table_name=self.table_name)
+            self.stats.mark("export", started, self.elapsed())
+        if "tailor" in self.stages:
+            started = self.elapsed()
+            resume_tailor.create_job_doc(model=self.args.model, threshold=threshold,
+                                         dry_run=self.args.dry_run, table_name=self.table_name)
+            self.stats.mark("tailor", started, self.elapsed())
+
+        return self.report()
+
+    def run_stream(self, evaluate):
+        scanner = threading.Thread(target=self.scan, name=f"{self.dataset}-scan", daemon=True)
+        filters = [threading.Thread(target=self.filter_worker, name=f"{self.dataset}-filter-{i}", daemon=True)
+                   for i in range(self.args.filter_workers)]
+        evaluators = [threading.Thread(target=self.evaluate_worker, name=f"{self.dataset}-evaluate-{i}", daemon=True)
+                      for i in range(self.args.evaluate_workers if evaluate else 0)]
+        for t in [scanner, *filters, *evaluators]:
+            t.start()
+
+        scanner.join()
+        for t in filters:
+            t.join()
+        for _ in evaluators:
+            self.to_evaluate.put(DONE)
+        for t in evaluators:
+            t.join()
+
+    def report(self):
+        return {
+            "dataset": self.dataset,
+            "wall": self.elapsed(),
+            "counts": dict(self.stats.counts),
+            "spans": self.stats.spans,
+            "prompt_stats": self.prompt_stats,
+            "client": self.client.report() if self.client else None,
+        }
+
+def run_dataset(dataset, args, llm_slots, results):
+    """子进程入口：剖析输出文件按数据集加后缀，避免互相覆盖。"""
+    if args.profile_out:
+        args.profile_out = f"{args.profile_out}.{dataset}"
+    if args.flamegraph:
+        args.flamegraph = f"{args.flamegraph}.{dataset}"
+    try:
+        with profiling.session(args):
+            results.put(DatasetPipeline(dataset, args, llm_slots).run())
+    except Exception as e:
+        print(f"[{dataset}] 流水线异常退出: {e}")
+        results.put({"dataset": dataset, "error": str(e)})
+
+def print_report(reports, wall):
+    print("\n================= 流水线报告 ==================")
+    for r in reports:
+        if "error" in r:
+            print(f"[{r['dataset']}] ❌ 失败: {r['error']}")
+            continue
+        c = Counter(r["counts"])
+        print(f"[{r['dataset']}] 用时 {r['wall']:.1f}s | 扫描 {c['scanned']} | 前置过滤 {c['filtered']} | 洗白恢复 {c['restored']} | "
+              f"后置静态过滤 {c['static']} | 评估成功 {c['evaluated']} | 失败 {c['failed']} | 异常 {c['errors']}")
+        for stage in ["scan", "filter", "evaluate", "export", "tailor"]:
+            if stage in r["spans"]:
+                first, last = r["spans"][stage]
+                print(f"    {stage:<9} {first:>8.1f}s -> {last:>8.1f}s")
+        if "filter" in r["spans"] and "evaluate" in r["spans"]:
+            overlap = r["spans"]["filter"][1] - r["spans"]["evaluate"][0]
+            if overlap > 0:
+                print(f"    filter 与 evaluate 重叠 {overlap:.1f}s")
+        job_evaluator.print_llm_report(r["prompt_stats"], prefix="    ")
+        if r["client"]:
+            print(f"    {r['client']}")
+    total = Counter()
+    for r in reports:
+        total.update(r.get("counts", {}))
+    print(f"合计: {len(reports)} 个数据集 | 总用时 {wall:.1f}s | 评估成功 {total['evaluated']} | 失败 {total['failed']}")
+    print("==============================================\n")
+
+def main():
+    parser = argparse.ArgumentParser(description="Run filter -> evaluate -> export -> tailor for several datasets in parallel")
+    parser.add_argument("--datasets", nargs="+", choices=DATASETS, default=DATASETS, help="Datasets to process, one worker process each")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=["filter", "evaluate", "export"], help="Stages to run")
+    parser.add_argument("--model", type=str, default="glm5", choices=list(job_evaluator.MODEL_CONFIGS.keys()), help="Select evaluation model")
+    parser.add_argument("--batch-size", type=int, default=200, help="Rows per scan batch handed from filter to evaluate")
+    parser.add_argument("--queue-batches", type=int, default=4, help="Batches buffered between stages before upstream blocks")
+    parser.add_argument("--filter-workers", type=int, default=1, help="Filter threads per dataset")
+    parser.add_argument("--evaluate-workers", type=int, default=2, help="Evaluate threads (and client concurrency) per dataset")
+    parser.add_argument("--llm-slots", type=int, default=None, help="Max in-flight LLM requests across all datasets (default: no global cap)")
+    parser.add_argument("--limit", type=int, default=None, help="Only scan the first N rows of each dataset")
+    parser.add_argument("--threshold", type=int, default=None, help="Export/tailor threshold (default: tools.obsidian.threshold in config.json, else 80)")
+    parser.add_argument("--include-jd", "-j", action="store_true", help="Include job description in exported notes")
+    parser.add_argument("--dry-run", action="store_true", help="Run without writing to database or notes")
+    profiling.add_profile_args(parser)
+    args = parser.parse_args()
+    if args.threshold is None:
+        args.threshold = obsidian_exporter.default_threshold()
+
+    ctx = multiprocessing.get_context("spawn")
+    slots = args.llm_slots or args.evaluate_workers * len(args.datasets)
+    llm_slots = ctx.BoundedSemaphore(slots)
+    results = ctx.Queue()
+
+    print(f"流水线启动: {', '.join(args.datasets)} | 阶段 {' -> '.join(s for s in STAGES if s in args.stages)} | "
+          f"模型 {args.model} | filter x{args.filter_workers} evaluate x{args.evaluate_workers} | LLM 总并发 {slots}"
+          + (" [DRY RUN]" if args.dry_run else ""))
+    started = time.monotonic()
+    procs = [ctx.Process(target=run_dataset, args=(d, args, llm_slots, results), name=f"pipeline-{d}") for d in args.datasets]
+    for p in procs:
+        p.start()
+
+    # 先收结果再 join，避免子进程阻塞在写满的结果管道上
+    reports = []
+    while len(reports) < len(procs):
+        try:
+            reports.append(results.get(timeout=1.0))
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs) and results.empty():
+                break
+    for p in procs:
+        p.join()
+    finished = {r["dataset"] for r in reports}
+    for p, d in zip(procs, args.datasets):
+        if d not in finished:
+            reports.append({"dataset": d, "error": f"进程退出码 {p.exitcode}"})
+
+    reports.sort(key=lambda r: args.datasets.index(r["dataset"]))
+    print_report(reports, time.monotonic() - started)
+
+if __name__ == "__main__":
+    main()
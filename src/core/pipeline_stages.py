@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+单岗位粒度的流水线阶段 (filter -> evaluate -> export)。
+
+job_filter / job_evaluator / obsidian_exporter 的 CLI 都是整表扫描，
+这里把同样的规则拆成按行调用的函数，供常驻守护进程等增量场景复用。
+"""
+from . import job_filter
+from . import job_evaluator
+from . import obsidian_exporter
+
+def fetch_job(cur, table_name, job_id, config):
+    cur.execute(f"""
+        SELECT id, title, company, salary, location, job_description,
+               update_time, link, {config['score_col']}, {config['rationale_col']}
+        FROM {table_name}
+        WHERE id = %s
+    """, (job_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    keys = ["id", "title", "company", "salary", "location", "job_description",
+            "update_time", "link", "score", "rationale"]
+    return dict(zip(keys, row))
+
+def filter_stage(cur, table_name, job, dry_run=False):
+    """
+    前置规则过滤。返回 "filtered" / "restored" / "passed"，并就地更新 job。
+    """
+    reject_reason, _ = job_filter.classify_job(job["title"], job["salary"], job["location"])
+    desc = job["job_description"]
+
+    if reject_reason:
+        # 已是同一条过滤标记时不再重复写入，避免触发器回环
+        if desc != reject_reason and not dry_run:
+            job_filter.mark_filtered(cur, table_name, job["id"], reject_reason)
+        job["job_description"] = reject_reason
+        return "filtered"
+
+    if desc and str(desc).startswith("[FILTERED:"):
+        if not dry_run:
+            job_filter.restore_filtered(cur, table_name, job["id"])
+        job["job_description"] = None
+        job["score"] = None
+        return "restored"
+
+    return "passed"
+
+def static_stage(cur, table_name, job, dry_run=False):
+    """
+    后置静态过滤。命中时同步写入全部模型列并返回 True。
+    """
+    score, rationale = job_evaluator.static_filter_decision(job["title"], job["job_description"])
+    if score is None:
+        return False
+    if not dry_run:
+        for config in job_evaluator.MODEL_COLUMNS.values():
+            job_evaluator.save_evaluation(cur, table_name, config, job["id"], score, rationale)
+    job["score"], job["rationale"] = score, rationale
+    return True
+
+def evaluate_stage(cur, table_name, job, client, config, profile_text, dry_run=False, stats=None, rescore=False):
+    """
+    对尚未被所选模型打分的岗位调用 LLM (rescore=True 时重评已有的过期分数)。
+    返回分数，失败或无需评估时返回 None；重评失败保留旧分数。
+    """
+    if not job["job_description"] or (job["score"] is not None and not rescore):
+        return None
+
+    score, reason = job_evaluator.evaluate_job(
+        client, config["model_name"], profile_text,
+        job["title"], job["company"], job["salary"], job["job_description"], stats=stats,
+        job_id=job["id"], table_name=table_name
+    )
+    if score is None or reason is None:
+        return None
+    if not dry_run:
+        job_evaluator.save_evaluation(cur, table_name, config, job["id"], score, reason,
+                                      version=job_evaluator.prompt_version(config, profile_text))
+    job["score"], job["rationale"] = score, reason
+    return score
+
+def export_stage(job, threshold, include_jd=False, dry_run=False):
+    """
+    达到阈值的岗位追加进当天的 Obsidian 速递笔记。只应对本次刚评出分数的岗位调用，
+    追加不去重。
+    """
+    if job["score"] is None or job["score"] < threshold:
+        return None
+    if str(job["job_description"] or "").startswith("[UNAVAILABLE"):
+        return None
+    row = (job["id"], job["title"], job["company"], job["salary"], job["location"],
+           job["score"], job["rationale"], job["link"], job["update_time"], job["job_description"])
+    return obsidian_exporter.append_job_to_digest(row, include_jd=include_jd, dry_run=dry_run)
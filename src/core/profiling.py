@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+src/core 各 CLI 共用的性能剖析开关。
+
+- --profile: 运行结束时打印分阶段墙钟耗时 (启动与配置、SQL、拉取、计算、渲染、LLM 等待、写入)
+- --profile-out FILE: 同时写出 cProfile 的 pstats 文件 (python -m pstats FILE 查看)
+- --flamegraph FILE: 后台线程按间隔采样所有线程的调用栈，写出 folded 格式，
+  可直接交给 flamegraph.pl 或 speedscope
+
+未开启时 stage() 返回同一个空上下文，不计时、不加锁。
+"""
+import contextlib
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+
+# 尽量早地被导入，用于估算模块导入与配置加载的耗时
+PROCESS_START = time.perf_counter()
+
+STAGE_LABELS = {
+    "config": "启动与配置加载",
+    "query": "SQL 执行",
+    "fetch": "结果拉取",
+    "compute": "规则/计算",
+    "render": "渲染",
+    "llm": "LLM 等待",
+    "write": "写入",
+}
+
+_NULL_STAGE = contextlib.nullcontext()
+
+class _Span:
+    """计入的是阶段自身耗时：嵌套在内的子阶段时间从外层扣除，避免重复统计。"""
+    __slots__ = ("timer", "name", "started", "child_time")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.child_time = 0.0
+        self.timer.stack().append(self)
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.started
+        stack = self.timer.stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_time += elapsed
+        self.timer.add(self.name, elapsed - self.child_time)
+        return False
+
+class StageTimer:
+    def __init__(self):
+        self.enabled = False
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def stack(self):
+        stack = getattr(self.local, "spans", None)
+        if stack is None:
+            stack = self.local.spans = []
+        return stack
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.totals[name] += seconds
+            self.counts[name] += 1
+
+_TIMER = StageTimer()
+
+def stage(name):
+    """`with stage("query"): ...` 计入对应阶段；未开启剖析时几乎零开销。"""
+    if not _TIMER.enabled:
+        return _NULL_STAGE
+    return _Span(_TIMER, name)
+
+class StackSampler:
+    """sys._current_frames() 定时采样，按线程名 + 调用栈累计样本数。"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = defaultdict(int)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.samples.items()):
+                f.write(f"{stack} {count}\n")
+        return sum(self.samples.values())
+
+def add_profile_args(parser):
+    group = parser.add_argument_group("profiling")
+    group.add_argument("--profile", action="store_true", help="Print a per-stage wall-time breakdown at exit")
+    group.add_argument("--profile-out", type=str, default=None, metavar="FILE.pstats", help="Also write cProfile stats (implies --profile)")
+    group.add_argument("--flamegraph", type=str, default=None, metavar="FILE.folded", help="Also write sampled stacks in folded format (implies --profile)")
+    group.add_argument("--sample-interval", type=float, default=5.0, metavar="MS", help="Stack sampling interval for --flamegraph")
+
+def print_breakdown(wall):
+    print("\n================= 阶段耗时 ==================")
+    attributed = 0.0
+    ordered = [k for k in STAGE_LABELS if k in _TIMER.totals] + sorted(k for k in _TIMER.totals if k not in STAGE_LABELS)
+    for name in ordered:
+        seconds = _TIMER.totals[name]
+        attributed += seconds
+        print(f"{STAGE_LABELS.get(name, name):<10} {seconds:>9.3f}s {seconds / wall * 100 if wall else 0:>6.1f}%  ({_TIMER.counts[name]} 次)")
+    print(f"{'未归类':<10} {max(wall - attributed, 0.0):>9.3f}s")
+    print(f"{'总墙钟':<10} {wall:>9.3f}s")
+    if attributed > wall:
+        print("注: 并发线程中的阶段 (如 LLM 等待) 按累计耗时统计，合计可能超过墙钟。")
+    print("=============================================\n")
+
+@contextlib.contextmanager
+def session(args):
+    """包住 CLI 的主体：按参数开启计时、cProfile 与栈采样，退出时输出报告。"""
+    enabled = args.profile or args.profile_out or args.flamegraph
+    if not enabled:
+        yield
+        return
+
+    _TIMER.enabled = True
+    _TIMER.add("config", time.perf_counter() - PROCESS_START)
+    profiler = cProfile.Profile() if args.profile_out else None
+    sampler = StackSampler(args.sample_interval / 1000) if args.flamegraph else None
+    if sampler:
+        sampler.start()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile_out)
+        if sampler:
+            sampler.stop()
+        print_breakdown(time.perf_counter() - PROCESS_START)
+        if profiler:
+            print(f"📈 cProfile 已写入 {args.profile_out} (python -m pstats {args.profile_out})")
+        if sampler:
+            n = sampler.write(args.flamegraph)
+            print(f"🔥 {n} 个栈样本已写入 {args.flamegraph} (flamegraph.pl {args.flamegraph} > flame.svg)")
+        _TIMER.enabled = False
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+按 token 预算构建评估 prompt。
+
+系统消息 + 候选人档案组成所有岗位完全一致的前缀，便于 vLLM/Ollama 复用 KV cache；
+剩余上下文预算留给 JD，在 token 边界截断后再退回到最近的句末，避免半句话。
+本地有模型 tokenizer 时精确计数，否则按中英文字符比例估算。
+"""
+import hashlib
+import re
+import threading
+
+SYSTEM_PROMPT = "你是一个只输出 JSON 格式的高级 HR 匹配评估引擎。"
+PROFILE_HEADER = "\n\n# 候选人档案\n"
+PROFILE_REFERENCE = "（候选人档案见系统消息）"
+TRUNCATION_MARKER = "\n…(已按 token 预算截断)"
+
+# chat template 的角色标记等额外开销
+CHAT_OVERHEAD_TOKENS = 32
+
+_CJK_RE = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+_SENTENCE_END_RE = re.compile(r"[。！？；!?;\n]")
+
+_STATS_LOCK = threading.Lock()
+_BUILDERS = {}
+
+class TokenCounter:
+    def __init__(self, tokenizer_path=None):
+        self.tokenizer = None
+        self.source = "estimate"
+        if tokenizer_path:
+            try:
+                from transformers import AutoTokenizer
+                self.tokenizer = AutoTokenizer.from_pretrained(tokenizer_path, local_files_only=True)
+                self.source = tokenizer_path
+            except Exception as e:
+                print(f"[Prompt] 无法加载本地 tokenizer ({tokenizer_path}): {e}，改用估算。")
+
+    def count(self, text):
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False))
+        # 估算：CJK 约 1 字 1 token，其余约 3.5 字符 1 token (偏保守)
+        cjk = len(_CJK_RE.findall(text))
+        return cjk + int((len(text) - cjk) / 3.5 + 0.5)
+
+    def truncate(self, text, max_tokens):
+        """
+        截断到 max_tokens 以内 (含末尾的截断标记)，并尽量退回到句末。返回 (text, truncated)。
+        """
+        if not text or max_tokens <= 0:
+            return "", bool(text)
+        if self.count(text) <= max_tokens:
+            return text, False
+
+        budget = max_tokens - self.count(TRUNCATION_MARKER)
+        while budget > 0:
+            result = self._cut(text, budget) + TRUNCATION_MARKER
+            # 拼接处的 token 合并/估算取整可能多出一两个，超出多少就再收紧多少
+            over = self.count(result) - max_tokens
+            if over <= 0:
+                return result, True
+            budget -= over
+        return "", True
+
+    def _cut(self, text, max_tokens):
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)[:max_tokens]
+            cut = self.tokenizer.decode(ids)
+        else:
+            # 估算计数随长度单调，二分找最长前缀
+            lo, hi = 0, len(text)
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self.count(text[:mid]) <= max_tokens:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            cut = text[:lo]
+
+        # 只在损失不超过 20% 时退回句末，避免把整段砍掉
+        ends = [m.end() for m in _SENTENCE_END_RE.finditer(cut)]
+        if ends and ends[-1] >= len(cut) * 0.8:
+            cut = cut[:ends[-1]]
+        return cut.rstrip()
+
+class PromptBuilder:
+    def __init__(self, template, profile_text, counter, context_tokens, max_output_tokens=2000,
+                 profile_max_tokens=6000):
+        self.template = template
+        self.counter = counter
+        self.context_tokens = context_tokens
+        self.max_output_tokens = max_output_tokens
+
+        profile, self.profile_truncated = counter.truncate(profile_text.strip(), profile_max_tokens)
+        # 所有岗位共享的前缀：system 消息逐字节一致，服务端才能命中前缀缓存
+        self.system_message = f"{SYSTEM_PROMPT}{PROFILE_HEADER}{profile}"
+        self.prefix_tokens = counter.count(self.system_message)
+
+    def render_user(self, job_title, job_company, job_salary, job_desc):
+        return self.template.format(
+            profile_text=PROFILE_REFERENCE,
+            job_title=job_title,
+            job_company=job_company,
+            job_salary=job_salary,
+            job_desc=job_desc
+        )
+
+    def build(self, job_title, job_company, job_salary, job_desc):
+        """
+        返回 (messages, meta)。meta 含估算的 prompt_tokens 以及 JD 是否被截断。
+        """
+        skeleton_tokens = self.counter.count(self.render_user(job_title, job_company, job_salary, ""))
+        jd_budget = (self.context_tokens - self.max_output_tokens - self.prefix_tokens
+                     - skeleton_tokens - CHAT_OVERHEAD_TOKENS)
+        desc, jd_truncated = self.counter.truncate(job_desc or "", jd_budget)
+        user_message = self.render_user(job_title, job_company, job_salary, desc)
+
+        messages = [
+            {"role": "system", "content": self.system_message},
+            {"role": "user", "content": user_message}
+        ]
+        meta = {
+            "prompt_tokens": self.prefix_tokens + self.counter.count(user_message) + CHAT_OVERHEAD_TOKENS,
+            "jd_truncated": jd_truncated
+        }
+        return messages, meta
+
+def get_prompt_builder(template, profile_text, tokenizer_path=None, context_tokens=16384,
+                       max_output_tokens=2000, profile_max_tokens=6000):
+    """按 (模板, 画像, tokenizer, 预算) 缓存 builder，整次运行复用同一个前缀。"""
+    key = hashlib.sha1("|".join(map(str, [
+        template, profile_text, tokenizer_path, context_tokens, max_output_tokens, profile_max_tokens
+    ])).encode("utf-8")).hexdigest()
+    builder = _BUILDERS.get(key)
+    if builder is None:
+        counter = TokenCounter(tokenizer_path)
+        builder = PromptBuilder(template, profile_text, counter, context_tokens,
+                                max_output_tokens=max_output_tokens, profile_max_tokens=profile_max_tokens)
+        _BUILDERS[key] = builder
+    return builder
+
+# ---------------- 运行统计 ----------------
+
+def new_prompt_stats():
+    return {"jobs": 0, "calls": 0, "prompt_tokens": 0, "max_prompt_tokens": 0,
+            "cached_tokens": 0, "cache_reported": 0, "completion_tokens": 0, "jd_truncated": 0}
+
+def record_usage(stats, response, meta):
+    """把一次调用的 usage 计入 stats。服务端未返回 usage 时使用本地估算值。"""
+    if stats is None:
+        return
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or meta["prompt_tokens"]
+    completion_tokens = getattr(usage, "completion_tokens", None) or 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+
+    with _STATS_LOCK:
+        stats["calls"] += 1
+        stats["prompt_tokens"] += prompt_tokens
+        stats["max_prompt_tokens"] = max(stats["max_prompt_tokens"], prompt_tokens)
+        stats["completion_tokens"] += completion_tokens
+        if cached is not None:
+            stats["cache_reported"] += 1
+            stats["cached_tokens"] += cached
+
+def record_job(stats, meta):
+    if stats is None:
+        return
+    with _STATS_LOCK:
+        stats["jobs"] += 1
+        if meta["jd_truncated"]:
+            stats["jd_truncated"] += 1
+
+def format_prompt_report(stats):
+    if not stats or not stats["calls"]:
+        return None
+    avg = stats["prompt_tokens"] / stats["calls"]
+    line = (f"📏 Prompt: 平均 {avg:.0f} tokens/次 (最大 {stats['max_prompt_tokens']})，"
+            f"JD 被截断 {stats['jd_truncated']}/{stats['jobs']} 个岗位")
+    if stats["cache_reported"]:
+        hit_rate = stats["cached_tokens"] / stats["prompt_tokens"] * 100 if stats["prompt_tokens"] else 0.0
+        line += f"，前缀缓存命中率 {hit_rate:.1f}%"
+    else:
+        line += "，前缀缓存命中率: 服务端未返回 cached_tokens"
+    return line
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+本地 CPU 相关度预排序。
+
+对画像文本与每条 JD 做字符 n-gram 的 TF-IDF 向量化 (哈希到固定维度的稀疏矩阵)，
+以余弦相似度作为 relevance_score 写回岗位表，供评估器排序 LLM 队列、剪掉明显无望的岗位。
+IDF 按画像版本拟合一次后存入 relevance_idf，新增岗位沿用同一套权重增量打分。
+"""
+import argparse
+import hashlib
+import re
+
+import numpy as np
+import psycopg2
+import psycopg2.extras
+from scipy import sparse
+
+from . import job_evaluator
+
+N_FEATURES = 1 << 18
+NGRAM_RANGE = (2, 3)
+HASH_PRIME = np.uint64(1_000_003)
+IDF_TABLE = "relevance_idf"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# 这些理由说明分数来自规则而非 LLM，基准对比时需排除
+RULE_RATIONALE_PATTERNS = job_evaluator.RULE_RATIONALE_PATTERNS
+
+def ranker_version(profile_text):
+    payload = f"{N_FEATURES}|{NGRAM_RANGE}|{profile_text}"
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+def ngram_hashes(text):
+    """把文本的字符 n-gram 用多项式滚动哈希映射到 [0, N_FEATURES)。全程 NumPy 向量化。"""
+    text = _WHITESPACE_RE.sub(" ", (text or "").lower())
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    parts = []
+    for n in range(NGRAM_RANGE[0], NGRAM_RANGE[1] + 1):
+        width = len(codes) - n + 1
+        if width <= 0:
+            continue
+        h = np.full(width, n, dtype=np.uint64)
+        for k in range(n):
+            h = h * HASH_PRIME + codes[k:k + width]
+        parts.append(h % np.uint64(N_FEATURES))
+    if not parts:
+        return np.empty(0, dtype=np.int64)
+    return np.concatenate(parts).astype(np.int64)
+
+def term_frequency_matrix(texts):
+    """返回次线性 TF (1 + log tf) 的 CSR 矩阵，每行一篇文本。"""
+    indptr = [0]
+    indices = []
+    data = []
+    for text in texts:
+        cols, counts = np.unique(ngram_hashes(text), return_counts=True)
+        indices.append(cols)
+        data.append(1.0 + np.log(counts))
+        indptr.append(indptr[-1] + len(cols))
+    if indices:
+        indices = np.concatenate(indices)
+        data = np.concatenate(data).astype(np.float32)
+    else:
+        indices = np.empty(0, dtype=np.int64)
+        data = np.empty(0, dtype=np.float32)
+    return sparse.csr_matrix((data, indices, np.asarray(indptr)), shape=(len(texts), N_FEATURES))
+
+def fit_idf(tf):
+    n_docs = tf.shape[0]
+    df = np.bincount(tf.indices, minlength=N_FEATURES)
+    return (np.log((1.0 + n_docs) / (1.0 + df)) + 1.0).astype(np.float32)
+
+def tfidf_normalized(tf, idf):
+    x = tf.multiply(idf).tocsr()
+    norms = np.sqrt(np.asarray(x.multiply(x).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sparse.diags(1.0 / norms) @ x
+
+def relevance_scores(profile_text, texts, idf):
+    """批量计算每条文本与画像的余弦相似度 (0~1)。"""
+    profile_vec = tfidf_normalized(term_frequency_matrix([profile_text]), idf)
+    docs = tfidf_normalized(term_frequency_matrix(texts), idf)
+    return np.asarray((docs @ profile_vec.T).todense()).ravel()
+
+# ---------------- 数据库读写 ----------------
+
+def ensure_relevance_columns(conn, table_name):
+    cur = conn.cursor()
+    cur.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS relevance_score REAL")
+    cur.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS relevance_version TEXT")
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {IDF_TABLE} (
+            table_name TEXT NOT NULL,
+            version    TEXT NOT NULL,
+            n_docs     INTEGER NOT NULL,
+            idf        BYTEA NOT NULL,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+            PRIMARY KEY (table_name, version)
+        )
+    """)
+    conn.commit()
+    cur.close()
+
+def relevance_schema_ready(cur, table_name):
+    """相关度列与 IDF 表是否都已建好 (dry-run 不建表，只能先查)。"""
+    cur.execute("""
+        SELECT to_regclass(%s) IS NOT NULL AND EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = %s AND column_name = 'relevance_version'
+        )
+    """, (IDF_TABLE, table_name))
+    return cur.fetchone()[0]
+
+def load_stored_idf(cur, table_name, version):
+    cur.execute(f"SELECT idf FROM {IDF_TABLE} WHERE table_name = %s AND version = %s", (table_name, version))
+    row = cur.fetchone()
+    return np.frombuffer(bytes(row[0]), dtype=np.float32) if row else None
+
+def load_or_fit_idf(conn, table_name, version, dry_run=False, stored=True):
+    """
+    取该画像版本的 IDF，没有则用当前全部有效 JD 拟合。dry_run 时只在内存中拟合不落库；
+    stored=False 表示 IDF 表尚不存在，跳过查询。
+    """
+    cur = conn.cursor()
+    idf = load_stored_idf(cur, table_name, version) if stored else None
+    if idf is not None:
+        cur.close()
+        return idf
+
+    # 首次使用该画像版本：用当前全部有效 JD 拟合 IDF
+    cur.execute(f"""
+        SELECT job_description FROM {table_name}
+        WHERE job_description IS NOT NULL AND job_description NOT LIKE '[FILTERED:%%'
+    """)
+    corpus = [r[0] for r in cur.fetchall()]
+    idf = fit_idf(term_frequency_matrix(corpus)) if corpus else np.ones(N_FEATURES, dtype=np.float32)
+    if dry_run:
+        cur.close()
+        print(f"[DRY RUN] 基于 {len(corpus)} 条 JD 在内存中拟合了 IDF (版本 {version})，未写入 {IDF_TABLE}。")
+        return idf
+
+    # 多个进程可能同时拟合同一版本：先到者写入，其余进程改用已存的那份，保证权重一致
+    cur.execute(
+        f"INSERT INTO {IDF_TABLE} (table_name, version, n_docs, idf) VALUES (%s, %s, %s, %s) "
+        f"ON CONFLICT (table_name, version) DO NOTHING",
+        (table_name, version, len(corpus), psycopg2.Binary(idf.tobytes()))
+    )
+    inserted = cur.rowcount == 1
+    conn.commit()
+    idf = load_stored_idf(cur, table_name, version)
+    cur.close()
+    if inserted:
+        print(f"[Ranker] 基于 {len(corpus)} 条 JD 拟合了新的 IDF (版本 {version})。")
+    else:
+        print(f"[Ranker] IDF (版本 {version}) 已由其它进程写入，沿用已存权重。")
+    return idf
+
+def refresh_relevance(conn, table_name, profile_text, dry_run=False):
+    """
+    为缺少当前版本相关度的岗位批量补算 relevance_score。返回更新的行数。
+    dry_run 时不建列、不写 IDF，只报告将要更新的数量。
+    """
+    version = ranker_version(profile_text)
+    if dry_run:
+        cur = conn.cursor()
+        ready = relevance_schema_ready(cur, table_name)
+        cur.close()
+    else:
+        ensure_relevance_columns(conn, table_name)
+        ready = True
+    idf = load_or_fit_idf(conn, table_name, version, dry_run=dry_run, stored=ready)
+
+    cur = conn.cursor()
+    # 列还不存在时 (仅 dry-run) 全部有效岗位都需要补算
+    stale = "AND relevance_version IS DISTINCT FROM %s" if ready else ""
+    cur.execute(f"""
+        SELECT id, title, job_description FROM {table_name}
+        WHERE job_description IS NOT NULL AND job_description NOT LIKE '[FILTERED:%%'
+          {stale}
+    """, (version,) if ready else ())
+    rows = cur.fetchall()
+    if not rows:
+        cur.close()
+        return 0
+
+    texts = [f"{title or ''} {desc}" for _, title, desc in rows]
+    scores = relevance_scores(profile_text, texts, idf)
+
+    if dry_run:
+        print(f"[DRY RUN] Would update relevance for {len(rows)} jobs.")
+    else:
+        psycopg2.extras.execute_values(cur, f"""
+            UPDATE {table_name} AS t
+            SET relevance_score = v.score, relevance_version = v.version
+            FROM (VALUES %s) AS v(id, score, version)
+            WHERE t.id = v.id
+        """, [(job_id, float(score), version) for (job_id, _, _), score in zip(rows, scores)], page_size=1000)
+        conn.commit()
+    cur.close()
+    return len(rows)
+
+# ---------------- 基准 ----------------
+
+def rank_array(values):
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[order] = np.arange(len(values), dtype=np.float64)
+    # 并列值取平均名次
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return sums[inverse] / counts[inverse]
+
+def benchmark(conn, table_name, high_score=70):
+    """
+    对比预排序分与已有 LLM 分数：Spearman/Pearson 相关系数，以及按相关度剪枝时的高分岗位召回。
+    """
+    cur = conn.cursor()
+    excluded = " AND ".join(["{rationale_col} NOT LIKE %s" for _ in RULE_RATIONALE_PATTERNS])
+    print(f"\n================= 预排序基准 ({table_name}) ==================")
+    for model_key, config in job_evaluator.MODEL_COLUMNS.items():
+        cur.execute(f"""
+            SELECT relevance_score, {config['score_col']}
+            FROM {table_name}
+            WHERE relevance_score IS NOT NULL AND {config['score_col']} IS NOT NULL
+              AND {excluded.format(rationale_col=config['rationale_col'])}
+        """, RULE_RATIONALE_PATTERNS)
+        rows = cur.fetchall()
+        if len(rows) < 3:
+            print(f"[{model_key}] 样本不足 ({len(rows)} 条)，跳过。")
+            continue
+
+        rel = np.array([r[0] for r in rows], dtype=np.float64)
+        llm = np.array([float(r[1]) for r in rows], dtype=np.float64)
+        pearson = float(np.corrcoef(rel, llm)[0, 1])
+        spearman = float(np.corrcoef(rank_array(rel), rank_array(llm))[0, 1])
+        n_high = int((llm >= high_score).sum())
+        print(f"[{model_key}] n={len(rows)} | Spearman={spearman:.3f} | Pearson={pearson:.3f} | ≥{high_score} 分: {n_high}")
+
+        for pct in (10, 25, 50):
+            floor = float(np.percentile(rel, pct))
+            kept = rel >= floor
+            recall = (kept & (llm >= high_score)).sum() / n_high if n_high else 1.0
+            print(f"   剪掉相关度最低 {pct}% (floor={floor:.4f}): 节省 {(~kept).sum()} 次 LLM 调用，高分岗位召回 {recall * 100:.1f}%")
+    print("==============================================================\n")
+    cur.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Local TF-IDF relevance pre-ranker for the evaluation queue")
+    parser.add_argument("--dataset", type=str, choices=["liepin", "boss"], default="liepin", help="Select which job dataset to process")
+    parser.add_argument("--benchmark", action="store_true", help="Report how well relevance correlates with existing LLM scores")
+    parser.add_argument("--high-score", type=int, default=70, help="LLM score counted as a strong match in --benchmark")
+    parser.add_argument("--dry-run", action="store_true", help="Run without writing to database")
+    args = parser.parse_args()
+
+    table_name = f"{args.dataset}_jobs"
+    profile_text = job_evaluator.collect_profile_text()
+    if not profile_text.strip():
+        print("没有找到简历文件。")
+        return
+
+    conn = job_evaluator.get_db_connection()
+    try:
+        updated = refresh_relevance(conn, table_name, profile_text, dry_run=args.dry_run)
+        print(f"✅ 相关度预排序: {'(模拟)' if args.dry_run else ''}更新了 {updated} 个岗位。")
+        if args.benchmark:
+            benchmark(conn, table_name, high_score=args.high_score)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,48 +1,23 @@
 #!/usr/bin/env python3
+from . import profiling
+from . import settings
 import os
 import psycopg2
 import re
-import json
-from openai import OpenAI
+from . import job_evaluator
+from .llm_telemetry import error_outcome, record_call, start_recording, stop_recording
+import time
 from collections import defaultdict
 from datetime import datetime
 
-# Load environment variables if available
-try:
-    from dotenv import load_dotenv
-    load_dotenv()
-except ImportError:
-    pass
+# 简历定制固定使用 GEMMA_* 端点；客户端与评估器同一套构建 (AIMD、熔断、GEMMA_HEDGE_* 对冲)
+TAILOR_MODEL = "gemma3"
 
-def get_env_strict(key):
-    val = os.getenv(key)
-    if val is None:
-        raise EnvironmentError(f"Missing required environment variable: {key}")
-    return val
+def tailor_config():
+    return settings.model_config(TAILOR_MODEL)
 
-# Load user config
-CONFIG_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "config.json")
-with open(CONFIG_PATH, "r", encoding="utf-8") as f:
-    USER_CONFIG = json.load(f)
-
-# DB CONFIG
-DB_CONFIG = {
-    'dbname': get_env_strict('DB_NAME'),
-    'user': get_env_strict('DB_USER'),
-    'password': os.getenv('DB_PASSWORD', ''),
-    'host': get_env_strict('DB_HOST'),
-    'port': get_env_strict('DB_PORT')
-}
-
-# Connection Config from .env (Higher priority for infrastructure)
-API_BASE = get_env_strict("GEMMA_API_BASE")
-API_KEY = get_env_strict("GEMMA_API_KEY")
-MODEL_NAME = get_env_strict("GEMMA_MODEL_NAME")
-
-# Logic Config from config.json (strategy.evaluator)
-TAILOR_LOGIC = USER_CONFIG.get("strategy", {}).get("evaluator", {})
-TAILOR_TOOLS = USER_CONFIG.get("tools", {}).get("resume_tailor", {})
-PROMPT_TEMPLATE = TAILOR_TOOLS.get("prompt_template", "")
+def prompt_template():
+    return settings.user_config().get("tools", {}).get("resume_tailor", {}).get("prompt_template", "")
 
 def categorize_activity(update_time):
     if not update_time: return '3_UNKNOWN'
@@ -59,7 +34,7 @@ def categorize_activity(update_time):
 
 def load_profile():
     # 1. From config.json (identity.profiles)
-    config_paths = USER_CONFIG.get("identity", {}).get("profiles", [])
+    config_paths = settings.user_config().get("identity", {}).get("profiles", [])
     
     # Combine (deduplicate while preserving order)
     all_paths = []
@@ -79,11 +54,12 @@ def load_profile():
     
     return combined_profile if combined_profile.strip() else "未找到候选人基础简历模板。"
 
-def generate_tailored_resume(client, profile_text, job_title, job_company, job_desc, rationale):
-    if not PROMPT_TEMPLATE:
+def generate_tailored_resume(client, profile_text, job_title, job_company, job_desc, rationale, job_id=None, table_name=None):
+    template = prompt_template()
+    if not template:
         return "ERROR: No prompt template found in config."
         
-    prompt = PROMPT_TEMPLATE.format(
+    prompt = template.format(
         profile_text=profile_text,
         job_title=job_title,
         job_company=job_company,
@@ -91,41 +67,46 @@ def generate_tailored_resume(client, profile_text, job_title, job_company, job_d
         rationale=rationale
     )
     
+    model_name = tailor_config()["model_name"]
+    call = {"job_id": job_id, "table_name": table_name, "temperature": 0.3}
+    started = time.monotonic()
     try:
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": "你是一个只输出 Markdown 的顶级高级猎头与简历改写专家。"},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3
-        )
+        with profiling.stage("llm"):
+            response = client.chat.completions.create(
+                model=model_name,
+                messages=[
+                    {"role": "system", "content": "你是一个只输出 Markdown 的顶级高级猎头与简历改写专家。"},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3
+            )
+        record_call(model_name, time.monotonic() - started, "ok", response=response, **call)
         return response.choices[0].message.content.strip()
     except Exception as e:
+        record_call(model_name, time.monotonic() - started, error_outcome(e), error=e, **call)
         return f"AI 生成简历失败: {e}"
 
 def create_job_doc(model="glm5", threshold=80, dry_run=False, table_name="liepin_jobs"):
     try:
-        model_map = {
-            "gemma3": ("match_score", "rationale"),
-            "qwen3_8b": ("match_score_qwen3_8b", "rationale_qwen3_8b"),
-            "glm5": ("match_score_glm5", "rationale_glm5")
-        }
-        score_col, rationale_col = model_map.get(model, model_map["glm5"])
+        columns = settings.MODEL_COLUMNS.get(model, settings.MODEL_COLUMNS["glm5"])
+        score_col, rationale_col = columns["score_col"], columns["rationale_col"]
         
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = psycopg2.connect(**settings.db_config())
         cur = conn.cursor()
         
-        cur.execute(f"""
-            SELECT id, title, company, salary, location, 
-                   {score_col}, {rationale_col}, 
-                   link, update_time, job_description
-            FROM {table_name}
-            WHERE {score_col} >= %s
-              AND job_description NOT LIKE '[UNAVAILABLE%%'
-            ORDER BY {score_col} DESC, fetched_at DESC
-        """, (threshold,))
-        jobs = cur.fetchall()
+        with profiling.stage("query"):
+            cur.execute(f"""
+                SELECT id, title, company, salary, location, 
+                       {score_col}, {rationale_col}, 
+                       link, update_time, job_description
+                FROM {table_name}
+                WHERE {score_col} >= %s
+                  AND job_description NOT LIKE '[UNAVAILABLE%%'
+                  AND {settings.own_score_sql(columns)}
+                ORDER BY {score_col} DESC, fetched_at DESC
+            """, (threshold,))
+        with profiling.stage("fetch"):
+            jobs = cur.fetchall()
         
         activity_groups = defaultdict(list)
         for jb in jobs:
@@ -140,17 +121,20 @@ def create_job_doc(model="glm5", threshold=80, dry_run=False, table_name="liepin
         sorted_jobs = sorted(act_jobs, key=lambda x: x[5] or 0, reverse=True)
         top_5 = sorted_jobs[:5]
         
-        client = OpenAI(api_key=API_KEY, base_url=API_BASE)
+        client = job_evaluator.get_llm_client(TAILOR_MODEL)
+        if not dry_run and not job_evaluator.preflight_llm_client(client, tailor_config(), action="简历生成"):
+            return
         profile_text = load_profile()
         
         # Path from config.json (storage.notes_dir)
-        output_dir = os.path.expanduser(USER_CONFIG.get("storage", {}).get("notes_dir", "~/Documents/notes/jobs"))
+        output_dir = os.path.expanduser(settings.user_config().get("storage", {}).get("notes_dir", "~/Documents/notes/jobs"))
         
         if dry_run:
             print(f"[DRY RUN] Would generate tailored resumes for {len(top_5)} highly active jobs.")
             print(f"[DRY RUN] Output directory: {output_dir}")
         else:
             os.makedirs(output_dir, exist_ok=True)
+            start_recording(settings.db_config(), "tailor")
         
         print(f"找到 {len(top_5)} 个极度活跃岗位，开始生成定制简历...")
         
@@ -169,7 +153,7 @@ def create_job_doc(model="glm5", threshold=80, dry_run=False, table_name="liepin
             
             # 1. 写 JD 解析文件
             jd_file = os.path.join(folder_path, "岗位分析.md")
-            with open(jd_file, 'w', encoding='utf-8') as f:
+            with profiling.stage("render"), open(jd_file, 'w', encoding='utf-8') as f:
                 f.write(f"# {title} @ {company_str}\n\n")
                 f.write(f"> 薪资：{salary} | 地点：{location} | 活跃度：{update_time}\n")
                 f.write(f"> 链接：{link}\n\n---\n\n")
@@ -178,28 +162,38 @@ def create_job_doc(model="glm5", threshold=80, dry_run=False, table_name="liepin
                 
             print(f"[{idx}/5] 正在生成专属简历: {company_str}...")
             
-            tailored_resume = generate_tailored_resume(client, profile_text, title, company_str, jd, rationale)
+            tailored_resume = generate_tailored_resume(client, profile_text, title, company_str, jd, rationale,
+                                                       job_id=jid, table_name=table_name)
             
             resume_file = os.path.join(folder_path, "定制简历.md")
-            with open(resume_file, 'w', encoding='utf-8') as f:
+            with profiling.stage("write"), open(resume_file, 'w', encoding='utf-8') as f:
                 f.write(tailored_resume)
                 
             print(f"      ✅ 完毕！")
+
+        if not dry_run:
+            print(client.report())
             
     except Exception as e:
         print(f"生成失败: {e}")
     finally:
         if 'cur' in locals(): cur.close()
         if 'conn' in locals(): conn.close()
+        stop_recording()
 
-if __name__ == "__main__":
+def main():
     import argparse
     parser = argparse.ArgumentParser(description="Generate tailored resumes for high-score jobs.")
     parser.add_argument("--model", type=str, default="glm5", help="Model to use for scoring (gemma3, qwen3_8b, glm5)")
     parser.add_argument("--threshold", type=int, default=80, help="Minimum score threshold (default 80)")
     parser.add_argument("--dry-run", action="store_true", help="Run without writing to disk or DB")
     parser.add_argument("--dataset", type=str, choices=["liepin", "boss"], default="liepin", help="Select which job dataset to process")
+    profiling.add_profile_args(parser)
     args = parser.parse_args()
     
     table_name = f"{args.dataset}_jobs"
-    create_job_doc(model=args.model, threshold=args.threshold, dry_run=args.dry_run, table_name=table_name)
+    with profiling.session(args):
+        create_job_doc(model=args.model, threshold=args.threshold, dry_run=args.dry_run, table_name=table_name)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+src/core 共用的惰性配置。
+
+导入本模块不读文件、不校验环境变量、不连数据库，各对象在第一次使用时构建并缓存：
+- user_config(): config.json，文件 mtime 变化后重读 (每秒最多检查一次)
+- compiled(build): 由 config 派生的预编译规则 (黑名单、聚类关键词等)，随 config 重读一起失效
+- db_config() / model_config(key): 只校验实际用到的那一组环境变量
+- get_pool(): 进程内共享的 ThreadedConnectionPool
+MODEL_COLUMNS 是各模型的分数/理由/版本列名，只需要列名时不必配置模型端点。
+"""
+import collections.abc
+import json
+import os
+import threading
+import time
+
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config.json")
+CONFIG_CHECK_INTERVAL = 1.0
+
+MODEL_ENV_PREFIXES = {"gemma3": "GEMMA", "qwen3_8b": "QWEN", "glm5": "GLM"}
+MODEL_COLUMNS = {
+    "gemma3": {"score_col": "match_score", "rationale_col": "rationale", "version_col": "prompt_version"},
+    "qwen3_8b": {"score_col": "match_score_qwen3_8b", "rationale_col": "rationale_qwen3_8b", "version_col": "prompt_version_qwen3_8b"},
+    "glm5": {"score_col": "match_score_glm5", "rationale_col": "rationale_glm5", "version_col": "prompt_version_glm5"},
+}
+# 级联模式下未升级给强模型的岗位，强模型列里存的是快模型分数，理由列以此前缀标记
+CASCADE_SKIP_PREFIX = "级联初筛，"
+
+_LOCK = threading.RLock()
+_env_loaded = False
+_config = None          # (mtime_ns, dict)
+_config_checked = 0.0
+_compiled = {}          # build -> (config, value)
+_db_config = None
+_model_configs = {}
+_pool = None
+
+def load_env():
+    """加载 .env (若安装了 python-dotenv)，只执行一次。"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _LOCK:
+        if not _env_loaded:
+            try:
+                from dotenv import load_dotenv
+                load_dotenv()
+            except ImportError:
+                pass
+            _env_loaded = True
+
+def get_env(key, default=None):
+    load_env()
+    return os.getenv(key, default)
+
+def get_env_strict(key):
+    load_env()
+    val = os.getenv(key)
+    if val is None:
+        raise EnvironmentError(f"Missing required environment variable: {key}")
+    return val
+
+def user_config():
+    """config.json 的内容。返回的是缓存对象，原地修改在文件变化前一直有效。"""
+    global _config, _config_checked
+    now = time.monotonic()
+    if _config is not None and now - _config_checked < CONFIG_CHECK_INTERVAL:
+        return _config[1]
+    with _LOCK:
+        mtime = os.stat(CONFIG_PATH).st_mtime_ns
+        if _config is None or _config[0] != mtime:
+            with open(CONFIG_PATH, "r", encoding="utf-8") as f:
+                _config = (mtime, json.load(f))
+        _config_checked = now
+        return _config[1]
+
+def compiled(build):
+    """build(user_config()) 的缓存结果；config.json 重读后下次调用时重新构建。"""
+    config = user_config()
+    entry = _compiled.get(build)
+    if entry is not None and entry[0] is config:
+        return entry[1]
+    with _LOCK:
+        entry = _compiled.get(build)
+        if entry is None or entry[0] is not config:
+            entry = _compiled[build] = (config, build(config))
+        return entry[1]
+
+def db_config():
+    global _db_config
+    if _db_config is None:
+        with _LOCK:
+            if _db_config is None:
+                _db_config = {
+                    "dbname": get_env_strict("DB_NAME"),
+                    "user": get_env_strict("DB_USER"),
+                    "password": get_env("DB_PASSWORD", ""),
+                    "host": get_env_strict("DB_HOST"),
+                    "port": get_env_strict("DB_PORT")
+                }
+    return _db_config
+
+def model_config(key):
+    """单个模型的端点配置 + 列名，只校验该模型的 *_API_BASE / *_API_KEY / *_MODEL_NAME。"""
+    config = _model_configs.get(key)
+    if config is not None:
+        return config
+    prefix = MODEL_ENV_PREFIXES[key]
+    with _LOCK:
+        if key not in _model_configs:
+            latency_target = get_env(f"{prefix}_LATENCY_TARGET")
+            _model_configs[key] = {
+                "api_base": get_env_strict(f"{prefix}_API_BASE"),
+                "api_key": get_env_strict(f"{prefix}_API_KEY"),
+                "model_name": get_env_strict(f"{prefix}_MODEL_NAME"),
+                "tokenizer": get_env(f"{prefix}_TOKENIZER"),
+                "context_tokens": int(get_env(f"{prefix}_CONTEXT_TOKENS", "16384")),
+                "structured_output": get_env(f"{prefix}_STRUCTURED_OUTPUT", "auto"),
+                "latency_target": float(latency_target) if latency_target else None,
+                "hedge_api_base": get_env(f"{prefix}_HEDGE_API_BASE"),
+                "hedge_api_key": get_env(f"{prefix}_HEDGE_API_KEY"),
+                "hedge_model_name": get_env(f"{prefix}_HEDGE_MODEL_NAME"),
+                **MODEL_COLUMNS[key]
+            }
+        return _model_configs[key]
+
+def model_key_for_name(model_name):
+    """按 *_MODEL_NAME 反查模型 key，不触发其它模型的校验。"""
+    for key, prefix in MODEL_ENV_PREFIXES.items():
+        if get_env(f"{prefix}_MODEL_NAME") == model_name:
+            return key
+    return None
+
+def own_score_sql(columns):
+    """
+    SQL 条件：分数列是该模型自己打出的 (排除级联初筛写入的快模型分数)。
+    阈值导出、仪表盘、归档等按分数读取的地方都应带上；含 %%，需配合参数化 execute 使用。
+    """
+    return f"(coalesce({columns['rationale_col']}, '') NOT LIKE '{CASCADE_SKIP_PREFIX}%%')"
+
+class _ModelConfigs(collections.abc.Mapping):
+    """MODEL_CONFIGS[key] 时才校验该模型的环境变量；遍历 key 与 `in` 判断不校验。"""
+
+    def __getitem__(self, key):
+        if key not in MODEL_COLUMNS:
+            raise KeyError(key)
+        return model_config(key)
+
+    def __contains__(self, key):
+        return key in MODEL_COLUMNS
+
+    def __iter__(self):
+        return iter(MODEL_COLUMNS)
+
+    def __len__(self):
+        return len(MODEL_COLUMNS)
+
+MODEL_CONFIGS = _ModelConfigs()
+
+def llm_timeout():
+    return float(get_env("LLM_TIMEOUT", "120"))
+
+def get_pool(maxconn=10):
+    """进程内共享的线程安全连接池，首次调用决定上限；closeall() 之后再调用会重建。"""
+    global _pool
+    with _LOCK:
+        if _pool is None or _pool.closed:
+            from psycopg2 import pool
+            _pool = pool.ThreadedConnectionPool(1, maxconn, **db_config())
+        return _pool